@@ -0,0 +1,385 @@
+import sys
+import time
+import random
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from metricas_vectorizadas import metricas
+
+# ====================
+# IMPLEMENTACIÓN ANTERIOR (FILA POR FILA)
+# ====================
+# Copia de las funciones que usaban los tableros con DataFrame.apply; son la
+# referencia contra la que se comparan las métricas vectorizadas.
+KEYWORD_CATEGORIES = {
+    "Accidente Cerebrovascular": ["accidente cerebrovascular", "acv", "ictus", "stroke"],
+    "Alzheimer": ["alzheimer", "demencia", "enfermedad neurodegenerativa"],
+}
+
+def indice_calidad_revista(journal_abbrev, jcr_group):
+    if pd.isna(journal_abbrev):
+        return 0.3
+    journal_abbrev = str(journal_abbrev).strip()
+    revistas_tier1 = ['Nature', 'Science', 'Cell', 'Lancet', 'NEJM']
+    revistas_tier2 = ['JAMA', 'BMJ', 'Circulation', 'JACC']
+    revistas_tier3 = ['PLoS One', 'Scientific Reports']
+    if pd.notna(jcr_group):
+        try:
+            jcr_num = float(jcr_group.split()[-1])
+            if jcr_num >= 4.0:
+                return 1.0
+            elif jcr_num >= 2.0:
+                return 0.7
+            elif jcr_num >= 1.0:
+                return 0.5
+        except:
+            pass
+    if journal_abbrev in revistas_tier1:
+        return 1.0
+    elif journal_abbrev in revistas_tier2:
+        return 0.7
+    elif journal_abbrev in revistas_tier3:
+        return 0.5
+    else:
+        return 0.3
+
+def coeficiente_colaboracion_articulos(coauthors):
+    if pd.isna(coauthors):
+        return 0.0
+    try:
+        autores = [a.strip() for a in str(coauthors).split(";") if a.strip()]
+        num_autores = len(autores)
+        if num_autores == 1:
+            return 0.0
+        elif num_autores <= 3:
+            return 0.5
+        elif num_autores <= 6:
+            return 0.7
+        else:
+            return 1.0
+    except:
+        return 0.0
+
+def _lista_keywords(keywords):
+    keywords_str = keywords.strip()
+    if keywords_str.startswith('[') and keywords_str.endswith(']'):
+        keywords_str = keywords_str[1:-1]
+        return [k.strip().strip("'\"") for k in keywords_str.split(",") if k.strip()]
+    return [k.strip() for k in keywords_str.split(",") if k.strip()]
+
+def indice_relevancia_articulos(keywords):
+    if pd.isna(keywords):
+        return 0.0
+    try:
+        if isinstance(keywords, str):
+            kw_list = _lista_keywords(keywords)
+            matches = 0
+            for kw in kw_list:
+                for category, terms in KEYWORD_CATEGORIES.items():
+                    if any(term in kw.lower() for term in terms):
+                        matches += 1
+                        break
+            return matches / len(kw_list) if kw_list else 0.0
+        return 0.0
+    except:
+        return 0.0
+
+def _relevancia_por_palabra(keywords, terminos):
+    if pd.isna(keywords):
+        return 0.0
+    try:
+        if isinstance(keywords, str):
+            kw_list = _lista_keywords(keywords)
+            matches = sum(1 for kw in kw_list if any(t in kw.lower() for t in terminos))
+            return matches / len(kw_list) if kw_list else 0.0
+        return 0.0
+    except:
+        return 0.0
+
+TERMINOS_CARDIO = [
+    "cardíaco", "miocardio", "arritmia", "isquemia",
+    "hipertensión", "ECG", "insuficiencia cardíaca",
+    "coronario", "válvula", "aterosclerosis", "angina"
+]
+TERMINOS_CAPITULOS = [
+    "hipertensión", "cardíaco", "miocardio", "arritmia",
+    "isquemia", "ECG", "insuficiencia cardíaca",
+    "coronario", "válvula", "aterosclerosis", "angina"
+]
+TERMINOS_TESIS = [
+    "sistemas biológicos", "celular", "molecular", "energía",
+    "genómica", "biotecnología", "investigación aplicada"
+]
+
+def indice_calidad_tesis(tipo_tesis):
+    if pd.isna(tipo_tesis):
+        return 0.3
+    tipo_tesis = str(tipo_tesis).strip().lower()
+    if "doctorado" in tipo_tesis:
+        return 1.0
+    elif "maestría" in tipo_tesis:
+        return 0.7
+    elif "licenciatura" in tipo_tesis:
+        return 0.5
+    else:
+        return 0.3
+
+def coeficiente_colaboracion_tesis(directores, coautores):
+    try:
+        directores_list = [d.strip() for d in str(directores).split(",") if d.strip()] if pd.notna(directores) else []
+        coautores_list = [c.strip() for c in str(coautores).split(";") if c.strip()] if pd.notna(coautores) else []
+        total_colaboradores = len(directores_list) + len(coautores_list)
+        return min(total_colaboradores / 5, 1.0)
+    except:
+        return 0.0
+
+def indice_calidad_editorial(editorial):
+    if pd.isna(editorial):
+        return 0.3
+    editorial = str(editorial).strip()
+    editoriales_tier1 = ['Springer', 'Elsevier', 'Wiley', 'Nature', 'Oxford University Press']
+    editoriales_tier2 = ['Taylor & Francis', 'Cambridge University Press', 'Academic Press', 'Bentham Science Publishers']
+    editoriales_tier3 = ['Acta Biochimica Polonica', 'CRC Press']
+    if editorial in editoriales_tier1:
+        return 1.0
+    elif editorial in editoriales_tier2:
+        return 0.7
+    elif editorial in editoriales_tier3:
+        return 0.5
+    else:
+        return 0.3
+
+def coeficiente_colaboracion_capitulos(coautores):
+    if pd.isna(coautores):
+        return 0.0
+    try:
+        coautores_list = [c.strip() for c in str(coautores).split(";") if c.strip()]
+        return min(len(coautores_list), 5) / 5
+    except:
+        return 0.0
+
+def indice_prestigio_congreso(titulo_congreso, tipo_congreso):
+    if pd.isna(titulo_congreso) or pd.isna(tipo_congreso):
+        return 0.3
+    titulo_congreso = str(titulo_congreso).lower()
+    tipo_congreso = str(tipo_congreso).lower()
+    congresos_tier1 = ['american heart', 'european society of cardiology',
+                       'world congress of cardiology', 'international congress']
+    congresos_tier2 = ['congreso nacional', 'sociedad mexicana', 'reunión anual', 'simposio nacional']
+    if tipo_congreso == 'internacional':
+        if any(keyword in titulo_congreso for keyword in congresos_tier1):
+            return 1.0
+        return 0.7
+    elif tipo_congreso == 'nacional':
+        if any(keyword in titulo_congreso for keyword in congresos_tier2):
+            return 0.6
+        return 0.4
+    else:
+        return 0.3
+
+def coeficiente_internacionalizacion_congresos(pais, tipo_congreso):
+    if pd.isna(pais) or pd.isna(tipo_congreso):
+        return 0.0
+    tipo_congreso = str(tipo_congreso).lower()
+    pais = str(pais).strip()
+    paises_tier1 = ['Estados Unidos', 'Reino Unido', 'Alemania', 'Japón', 'Canadá']
+    paises_tier2 = ['Francia', 'Italia', 'España', 'Australia', 'Suiza']
+    if tipo_congreso == 'internacional':
+        if pais in paises_tier1:
+            return 1.0
+        elif pais in paises_tier2:
+            return 0.8
+        else:
+            return 0.6
+    else:
+        return 0.3
+
+def indice_relevancia_congresos(linea_investigacion):
+    if pd.isna(linea_investigacion):
+        return 0.0
+    try:
+        if isinstance(linea_investigacion, str):
+            linea_investigacion = linea_investigacion.lower()
+            matches = sum(1 for kw in TERMINOS_CARDIO if kw in linea_investigacion)
+            return min(matches / len(TERMINOS_CARDIO), 1.0)
+        return 0.0
+    except:
+        return 0.0
+
+def metricas_fila_por_fila(tipo: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Las métricas como las calculaban los tableros antes de vectorizarlas"""
+    if tipo == 'articulos':
+        df = df.assign(
+            ICR=df.apply(lambda x: indice_calidad_revista(x['journal_abbrev'], x['jcr_group']), axis=1),
+            CC=df['coauthors'].apply(coeficiente_colaboracion_articulos),
+            IRT=df['selected_keywords'].apply(indice_relevancia_articulos)
+        )
+        return df.assign(PI=0.5 * df['ICR'] + 0.3 * df['CC'] + 0.2 * df['IRT'])
+    if tipo == 'tesis':
+        df = df.assign(
+            ICT=df['tipo_tesis'].apply(indice_calidad_tesis),
+            CC=df.apply(lambda x: coeficiente_colaboracion_tesis(x['directores'], x['coautores']), axis=1),
+            IRT=df['selected_keywords'].apply(lambda x: _relevancia_por_palabra(x, TERMINOS_TESIS))
+        )
+        return df.assign(PI=0.5 * df['ICT'] + 0.3 * df['CC'] + 0.2 * df['IRT'])
+    if tipo == 'libros':
+        df = df.assign(
+            ICE=df['editorial'].apply(indice_calidad_editorial),
+            CI=df['idiomas_disponibles'].apply(lambda x: min(len(str(x).split(",")), 2) / 2 if pd.notna(x) else 0.0),
+            IRT=df['selected_keywords'].apply(lambda x: _relevancia_por_palabra(x, TERMINOS_CARDIO))
+        )
+        return df.assign(PI=0.4 * df['ICE'] + 0.3 * df['CI'] + 0.3 * df['IRT'])
+    if tipo == 'capitulos':
+        df = df.assign(
+            ICE=df['editorial'].apply(indice_calidad_editorial),
+            CC=df['coautores_secundarios'].apply(coeficiente_colaboracion_capitulos),
+            IRT=df['selected_keywords'].apply(lambda x: _relevancia_por_palabra(x, TERMINOS_CAPITULOS))
+        )
+        return df.assign(PI=0.5 * df['ICE'] + 0.3 * df['CC'] + 0.2 * df['IRT'])
+    if tipo == 'congresos':
+        df = df.assign(
+            IPC=df.apply(lambda x: indice_prestigio_congreso(x['titulo_congreso'], x['tipo_congreso']), axis=1),
+            CI=df.apply(lambda x: coeficiente_internacionalizacion_congresos(x['pais'], x['tipo_congreso']), axis=1),
+            IRT=df['linea_investigacion'].apply(indice_relevancia_congresos)
+        )
+        return df.assign(PI=0.5 * df['IPC'] + 0.3 * df['CI'] + 0.2 * df['IRT'])
+    raise ValueError(f"Tipo de producto desconocido: {tipo}")
+
+# ====================
+# DATOS SINTÉTICOS
+# ====================
+REVISTAS = ['Nature', ' Science ', 'JAMA', 'PLoS One', 'Arch Cardiol Mex', 'Circulation', '', None]
+JCR = ['Q1 5.2', 'Q2 2.5', 'Q3 1.1', 'Q4 0.4', 'Q1', '', 'sin dato nan', 'Q2 1_5', None]
+NOMBRES = ['García J', 'López M', ' ', 'Smith A', 'Núñez I', '', 'Zhang W']
+PALABRAS = ['Hipertensión arterial', 'ictus', 'ECG', 'ecg', 'arritmia', 'Demencia senil', 'celular',
+            'Genómica', 'energía', 'válvula aórtica', 'otro tema', "'stroke'", '"Alzheimer"', ' ', '',
+            # Categorías con comas dentro de las comillas (se parten en cada coma para el IRT)
+            'Sistemas biológicos: celular, molecular y producción de energía', 'Nefropatías',
+            'Arritmia, isquemia, ictus']
+TIPOS_TESIS = ['Doctorado', ' maestría ', 'Licenciatura', 'Especialidad', '', None]
+EDITORIALES = ['Springer', 'Elsevier ', 'Taylor & Francis', 'CRC Press', 'Editorial local', '', None]
+IDIOMAS = ['Español', 'Español, Inglés', 'Inglés,', 'Español, Inglés, Francés', '', None]
+CONGRESOS = ['American Heart Association', 'Congreso Nacional de Cardiología', 'Reunión Anual SMC',
+             'International Congress of Hypertension', 'Jornadas locales', '', None]
+TIPOS_CONGRESO = ['Internacional', 'internacional', 'Nacional', 'Local', ' Nacional', None]
+PAISES = ['Estados Unidos', 'España', 'México', ' Japón ', '', None]
+LINEAS = ['Cardiopatía isquemia y arritmia', 'hipertensión', 'ECG de esfuerzo', 'Genética', '', None]
+
+def _separados(rng: random.Random, opciones: list, separador: str, maximo: int):
+    if rng.random() < 0.05:
+        return None
+    return separador.join(rng.choice(opciones) for _ in range(rng.randint(0, maximo)))
+
+def _keywords(rng: random.Random):
+    if rng.random() < 0.05:
+        return rng.choice([None, 12345])
+    palabras = [rng.choice(PALABRAS) for _ in range(rng.randint(0, 6))]
+    if rng.random() < 0.5:
+        return "[" + ", ".join(f"'{p}'" for p in palabras) + "]"
+    return ", ".join(palabras)
+
+def generar(tipo: str, n: int, semilla: int = 0) -> pd.DataFrame:
+    """n filas con las columnas que usan las métricas del tipo, incluidos nulos, vacíos y valores raros"""
+    rng = random.Random(semilla)
+    if tipo == 'articulos':
+        df = pd.DataFrame({
+            'journal_abbrev': [rng.choice(REVISTAS) for _ in range(n)],
+            'jcr_group': [rng.choice(JCR) for _ in range(n)],
+            'coauthors': [_separados(rng, NOMBRES, ';', 9) for _ in range(n)],
+            'selected_keywords': [_keywords(rng) for _ in range(n)],
+        })
+        return df.astype({'jcr_group': 'category'})
+    if tipo == 'tesis':
+        return pd.DataFrame({
+            'tipo_tesis': [rng.choice(TIPOS_TESIS) for _ in range(n)],
+            'directores': [_separados(rng, NOMBRES, ',', 3) for _ in range(n)],
+            'coautores': [_separados(rng, NOMBRES, ';', 5) for _ in range(n)],
+            'selected_keywords': [_keywords(rng) for _ in range(n)],
+        })
+    if tipo in ('libros', 'capitulos'):
+        return pd.DataFrame({
+            'editorial': [rng.choice(EDITORIALES) for _ in range(n)],
+            'idiomas_disponibles': [rng.choice(IDIOMAS) for _ in range(n)],
+            'coautores_secundarios': [_separados(rng, NOMBRES, ';', 7) for _ in range(n)],
+            'selected_keywords': [_keywords(rng) for _ in range(n)],
+        })
+    if tipo == 'congresos':
+        return pd.DataFrame({
+            'titulo_congreso': [rng.choice(CONGRESOS) for _ in range(n)],
+            'tipo_congreso': [rng.choice(TIPOS_CONGRESO) for _ in range(n)],
+            'pais': [rng.choice(PAISES) for _ in range(n)],
+            'linea_investigacion': [rng.choice(LINEAS) for _ in range(n)],
+        })
+    raise ValueError(f"Tipo de producto desconocido: {tipo}")
+
+# ====================
+# EQUIVALENCIA Y BENCHMARK
+# ====================
+TIPOS = ['articulos', 'tesis', 'libros', 'capitulos', 'congresos']
+
+def diferencias(tipo: str, n: int, semilla: int = 0) -> dict:
+    """Filas en que cada métrica vectorizada difiere de la anterior (debe ser 0 en todas)"""
+    df = generar(tipo, n, semilla)
+    anterior = metricas_fila_por_fila(tipo, df)
+    nueva = metricas(tipo, df, categorias=KEYWORD_CATEGORIES)
+    columnas_metricas = [c for c in anterior.columns if c not in df.columns]
+    distintas = {}
+    for columna in columnas_metricas:
+        a, b = anterior[columna].to_numpy(dtype=float), nueva[columna].to_numpy(dtype=float)
+        # Igualdad exacta, no aproximada
+        distintas[columna] = int((~((a == b) | (np.isnan(a) & np.isnan(b)))).sum())
+    return distintas
+
+def benchmark(tipo: str, n: int, semilla: int = 0, con_anterior: bool = True) -> dict:
+    """Segundos de cada implementación sobre n filas sintéticas"""
+    df = generar(tipo, n, semilla)
+    inicio = time.perf_counter()
+    metricas(tipo, df, categorias=KEYWORD_CATEGORIES)
+    vectorizada = time.perf_counter() - inicio
+    anterior = float('nan')
+    if con_anterior:
+        inicio = time.perf_counter()
+        metricas_fila_por_fila(tipo, df)
+        anterior = time.perf_counter() - inicio
+    return {'filas': n, 'anterior': anterior, 'vectorizada': vectorizada, 'aceleracion': anterior / vectorizada}
+
+def main():
+    parser = argparse.ArgumentParser(description="Equivalencia y benchmark de las métricas vectorizadas")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    p_equiv = subparsers.add_parser('equivalencia', help="Compara contra las funciones fila por fila")
+    p_equiv.add_argument('--filas', type=int, default=20000)
+    p_equiv.add_argument('--semillas', type=int, default=5)
+
+    p_bench = subparsers.add_parser('benchmark', help="Mide ambas implementaciones a varios tamaños")
+    p_bench.add_argument('--filas', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    p_bench.add_argument('--tipos', nargs='+', default=TIPOS)
+    p_bench.add_argument('--max-anterior', type=int, default=1_000_000,
+                         help="Tamaño máximo al que se mide también la implementación anterior")
+    p_bench.add_argument('--semilla', type=int, default=0)
+
+    args = parser.parse_args()
+
+    if args.comando == 'equivalencia':
+        fallas = 0
+        for tipo in TIPOS:
+            for semilla in range(args.semillas):
+                distintas = diferencias(tipo, args.filas, semilla)
+                fallas += sum(distintas.values())
+                if any(distintas.values()):
+                    print(f"[FALLA] {tipo} semilla {semilla}: {distintas}")
+            print(f"{tipo}: {args.semillas} x {args.filas} filas comparadas")
+        print(f"{fallas} diferencias")
+        sys.exit(1 if fallas else 0)
+
+    elif args.comando == 'benchmark':
+        print(f"{'tipo':>10} {'filas':>9} {'anterior s':>11} {'vector s':>9} {'x':>7}")
+        for tipo in args.tipos:
+            for n in args.filas:
+                r = benchmark(tipo, n, args.semilla, con_anterior=n <= args.max_anterior)
+                print(f"{tipo:>10} {r['filas']:>9} {r['anterior']:>11.3f} {r['vectorizada']:>9.3f} {r['aceleracion']:>7.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import sys
+import time
+import random
+import logging
+import argparse
+import tracemalloc
+from pathlib import Path
+
+from nbib_parser import REGISTRO_NBIB, decodificar_nbib, parsear_nbib, dividir_registros
+
+# ====================
+# GENERADOR SINTÉTICO DE REGISTROS .NBIB
+# ====================
+APELLIDOS = ["García", "Hernández", "López", "Martínez", "Pérez", "Sánchez", "Ramírez", "Núñez",
+             "Smith", "Johnson", "O'Brien", "Müller", "Zhang", "Kowalski", "Ibáñez"]
+NOMBRES = ["José", "María", "Juan Carlos", "Ana Sofía", "Luis", "Ángel", "John", "Wei", "Anna", "Iñaki"]
+PALABRAS = ["cardiac", "arrhythmia", "heart", "failure", "coronary", "hypertension", "pulmonary",
+            "inflammation", "atherosclerosis", "myocardial", "infarction", "metabolic", "syndrome",
+            "valve", "congenital", "outcomes", "cohort", "randomized", "trial", "patients", "mexican"]
+REVISTAS = [("Archivos de cardiologia de Mexico", "Arch Cardiol Mex"),
+            ("Journal of the American College of Cardiology", "J Am Coll Cardiol"),
+            ("European heart journal", "Eur Heart J"),
+            ("Circulation", "Circulation")]
+MESH = ["Humans", "Male", "Female", "*Heart Failure/therapy", "Hypertension, Pulmonary",
+        "*Coronary Artery Disease/diagnosis", "Mexico/epidemiology", "Atrial Fibrillation"]
+MESES = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+def _envolver(etiqueta: str, texto: str, ancho: int = 82) -> str:
+    """Formato MEDLINE: etiqueta de 4 columnas y continuaciones con 6 espacios"""
+    cabecera = f"{etiqueta:<4}- "
+    lineas, actual = [], cabecera
+    for palabra in texto.split():
+        if len(actual) + len(palabra) + 1 > ancho and actual.strip() != cabecera.strip():
+            lineas.append(actual.rstrip())
+            actual = " " * 6
+        actual += palabra + " "
+    lineas.append(actual.rstrip())
+    return "\n".join(lineas)
+
+def _fecha_dp(rng: random.Random, year: int) -> str:
+    """Variantes reales de DP: completa, mes, rango de meses, estación o solo año"""
+    return rng.choice([
+        f"{year} {rng.choice(MESES)} {rng.randint(1, 28)}",
+        f"{year} {rng.choice(MESES)}",
+        f"{year} {rng.choice(MESES)}-{rng.choice(MESES)}",
+        f"{year} {rng.choice(['Spring', 'Summer', 'Fall', 'Winter'])}",
+        f"{year}",
+    ])
+
+def generar_registro(rng: random.Random, pmid: int) -> str:
+    """Un registro .nbib sintético con la estructura de PubMed"""
+    year = rng.randint(1990, 2025)
+    revista, abreviatura = rng.choice(REVISTAS)
+    titulo = " ".join(rng.choice(PALABRAS) for _ in range(rng.randint(6, 30))).capitalize() + "."
+    resumen = " ".join(rng.choice(PALABRAS) for _ in range(rng.randint(80, 300)))
+    doi = f"10.{rng.randint(1000, 99999)}/{rng.randint(100000, 999999)}"
+
+    lineas = [f"PMID- {pmid}", "OWN - NLM", "STAT- MEDLINE"]
+    if rng.random() > 0.1:
+        lineas.append(f"DP  - {_fecha_dp(rng, year)}")
+    lineas.append(_envolver("TI", titulo))
+    lineas.append(f"PG  - {rng.randint(1, 900)}-{rng.randint(901, 999)}")
+    if rng.random() > 0.5:
+        lineas.append(f"LID - S{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}(20)3{rng.randint(0, 9)} [pii]")
+    lineas.append(f"LID - {doi} [doi]")
+    lineas.append(_envolver("AB", resumen))
+    for _ in range(rng.randint(1, 12)):
+        apellido, nombre = rng.choice(APELLIDOS), rng.choice(NOMBRES)
+        lineas.append(f"FAU - {apellido}, {nombre}")
+        lineas.append(f"AU  - {apellido} {nombre[0]}")
+    lineas.append(f"LA  - {rng.choice(['eng', 'spa'])}")
+    lineas.append("PT  - Journal Article")
+    if rng.random() > 0.7:
+        lineas.append(f"DEP - {year}{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}")
+    lineas.append(f"TA  - {abreviatura}")
+    lineas.append(f"JT  - {revista}")
+    if rng.random() > 0.3:
+        lineas.append(f"VI  - {rng.randint(1, 150)}")
+        lineas.append(f"IP  - {rng.randint(1, 12)}")
+    for termino in rng.sample(MESH, rng.randint(0, len(MESH))):
+        lineas.append(f"MH  - {termino}")
+    for _ in range(rng.randint(0, 5)):
+        lineas.append(f"OT  - {rng.choice(PALABRAS)}")
+    lineas.append(f"AID - {doi} [doi]")
+    return "\n".join(lineas) + "\n\n"
+
+def generar_archivo(n: int, semilla: int = 0) -> str:
+    """Texto con n registros concatenados, como una exportación masiva de PubMed"""
+    rng = random.Random(semilla)
+    return "".join(generar_registro(rng, 30000000 + i) for i in range(n))
+
+# ====================
+# CORPUS DE CASOS LÍMITE
+# ====================
+_BASE = generar_archivo(1, semilla=42)
+
+CORPUS = {
+    'completo.nbib': _BASE.encode('utf-8'),
+    'sin_dp.nbib': "\n".join(l for l in _BASE.splitlines() if not l.startswith("DP")).encode('utf-8'),
+    'dp_estacion.nbib': b"PMID- 1\nDP  - 2020 Spring\nTI  - Seasonal issue.\nFAU - Doe, Jane\n",
+    'dp_rango_meses.nbib': b"PMID- 2\nDP  - 2019 Nov-Dec\nTI  - Bimonthly issue.\n",
+    'dp_rango_dias.nbib': b"PMID- 3\nDP  - 2018 Mar 3-9\nTI  - Weekly issue.\n",
+    'dp_dia_invalido.nbib': b"PMID- 4\nDP  - 2021 Feb 30\nTI  - Impossible date.\n",
+    'dp_basura.nbib': b"PMID- 5\nDP  - n.d.\nDEP - 20210315\nTI  - No print date.\n",
+    'solo_pii.nbib': b"PMID- 6\nTI  - Only pii.\nLID - S0140-6736(20)30183-5 [pii]\n",
+    'doi_en_aid.nbib': b"PMID- 7\nTI  - DOI in AID.\nAID - S0002-9149(21)00001-1 [pii]\nAID - 10.1016/j.amjcard.2021.01.001 [doi]\n",
+    'latin1.nbib': "PMID- 8\nTI  - Cardiopatía congénita en niños.\nFAU - Núñez, José\n".encode('latin-1'),
+    'cp1252.nbib': "PMID- 9\nTI  - “Quoted” title – with dash.\n".encode('cp1252'),
+    'bom_crlf.nbib': "\ufeffPMID- 10\r\nTI  - Windows line\r\n      endings.\r\nDP  - 2022 Jan 5\r\n".encode('utf-8'),
+    'etiqueta_vacia.nbib': b"PMID- 11\nTI  -\nJT  - Journal only\nVI  -\nPG  - \n",
+    'truncado.nbib': _BASE.encode('utf-8')[:len(_BASE) // 3],
+    'vacio.nbib': b"",
+    'binario.nbib': bytes(range(256)) * 4,
+    'varios_registros.nbib': generar_archivo(5, semilla=7).encode('utf-8'),
+}
+
+def escribir_corpus(directorio: str) -> int:
+    """Escribe el corpus de casos límite en un directorio"""
+    ruta = Path(directorio)
+    ruta.mkdir(parents=True, exist_ok=True)
+    for nombre, contenido in CORPUS.items():
+        (ruta / nombre).write_bytes(contenido)
+    return len(CORPUS)
+
+# ====================
+# VERIFICACIÓN DE ESQUEMA
+# ====================
+def errores_esquema(data) -> list:
+    """Lista de problemas del registro: campos faltantes o de tipo incorrecto"""
+    if not isinstance(data, dict):
+        return [f"se esperaba dict y se obtuvo {type(data).__name__}"]
+    errores = [f"falta '{campo}'" for campo in REGISTRO_NBIB if campo not in data]
+    for campo, valor in REGISTRO_NBIB.items():
+        if campo in data and not isinstance(data[campo], type(valor)):
+            errores.append(f"'{campo}' es {type(data[campo]).__name__}")
+    extras = data.get('extras', {})
+    if isinstance(extras, dict):
+        for clave in ('abstract', 'mesh', 'keywords', 'publication_types'):
+            if clave not in extras:
+                errores.append(f"falta extras['{clave}']")
+    if data.get('year') and not data['year'].isdigit():
+        errores.append(f"year no numérico: {data['year']!r}")
+    return errores
+
+def verificar(datos: bytes) -> list:
+    """Decodifica y parsea cada registro; devuelve los errores encontrados (incluidas excepciones)"""
+    try:
+        texto = decodificar_nbib(datos)
+        errores = []
+        for registro in dividir_registros(texto):
+            errores.extend(errores_esquema(parsear_nbib(registro)))
+        errores.extend(errores_esquema(parsear_nbib(texto)))
+        return errores
+    except Exception as e:
+        return [f"excepción {type(e).__name__}: {str(e)}"]
+
+# ====================
+# PRUEBAS ALEATORIAS (FUZZ)
+# ====================
+ETIQUETAS = ["PMID-", "TI  -", "DP  -", "FAU -", "LID -", "AID -", "PG  -", "VI  -", "IP  -",
+             "JT  -", "TA  -", "AB  -", "MH  -", "OT  -", "PT  -", "DEP -", "      "]
+
+def mutar(rng: random.Random, datos: bytes) -> bytes:
+    """Aplica entre 1 y 5 mutaciones aleatorias sobre los bytes de un registro"""
+    datos = bytearray(datos)
+    for _ in range(rng.randint(1, 5)):
+        operacion = rng.randrange(7)
+        posicion = rng.randrange(len(datos) + 1)
+        if operacion == 0 and datos:
+            del datos[posicion:posicion + rng.randint(1, 64)]
+        elif operacion == 1:
+            datos[posicion:posicion] = bytes(rng.randrange(256) for _ in range(rng.randint(1, 16)))
+        elif operacion == 2:
+            datos[posicion:posicion] = ("\n" + rng.choice(ETIQUETAS) + " " +
+                                        rng.choice(["", "2020", "x" * rng.randint(0, 300), "10.1/ [doi]",
+                                                    "2021 Foo 99", "ñáé", "-", "\t"])).encode('utf-8')
+        elif operacion == 3:
+            datos = datos[:posicion]
+        elif operacion == 4:
+            lineas = bytes(datos).split(b"\n")
+            rng.shuffle(lineas)
+            datos = bytearray(b"\n".join(lineas))
+        elif operacion == 5 and datos:
+            fragmento = datos[posicion:posicion + rng.randint(1, 200)]
+            datos[posicion:posicion] = fragmento * rng.randint(1, 20)
+        else:
+            datos = bytearray(bytes(datos).replace(b"\n", rng.choice([b"\r\n", b"\r", b"\n\n", b"\n      "])))
+    return bytes(datos)
+
+def fuzz(iteraciones: int, semilla: int) -> int:
+    """Corre mutaciones reproducibles; imprime cada falla con su semilla y devuelve el número de fallas"""
+    semillas_base = list(CORPUS.values())
+    fallas = 0
+    for i in range(iteraciones):
+        semilla_caso = semilla * 1_000_003 + i
+        rng = random.Random(semilla_caso)
+        datos = mutar(rng, rng.choice(semillas_base) if rng.random() < 0.7 else generar_archivo(1, semilla_caso).encode('utf-8'))
+        errores = verificar(datos)
+        if errores:
+            fallas += 1
+            print(f"[FALLA] caso {semilla_caso}: {'; '.join(errores[:3])}")
+    return fallas
+
+# ====================
+# BENCHMARK
+# ====================
+def benchmark(registros: int, semilla: int = 0) -> dict:
+    """Registros por segundo y memoria pico al decodificar y parsear un archivo masivo"""
+    datos = generar_archivo(registros, semilla).encode('utf-8')
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    texto = decodificar_nbib(datos)
+    procesados = sum(1 for registro in dividir_registros(texto) if parsear_nbib(registro)['pmid'])
+    duracion = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'registros': procesados,
+        'megabytes': len(datos) / 1e6,
+        'segundos': duracion,
+        'registros_por_segundo': procesados / duracion if duracion else float('inf'),
+        'memoria_pico_mb': pico / 1e6,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark, corpus y pruebas aleatorias del parser .nbib")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    p_bench = subparsers.add_parser('benchmark', help="Mide registros/segundo y memoria pico")
+    p_bench.add_argument('--registros', type=int, nargs='+', default=[100, 1000, 10000])
+    p_bench.add_argument('--semilla', type=int, default=0)
+
+    p_fuzz = subparsers.add_parser('fuzz', help="Verifica que el parser nunca falle ni pierda campos")
+    p_fuzz.add_argument('--iteraciones', type=int, default=2000)
+    p_fuzz.add_argument('--semilla', type=int, default=0)
+
+    p_corpus = subparsers.add_parser('corpus', help="Escribe el corpus de casos límite y lo verifica")
+    p_corpus.add_argument('directorio', nargs='?', default='corpus_nbib')
+
+    args = parser.parse_args()
+    # Solo se muestran errores: un 'NBIB Parse Error' indica una excepción atrapada dentro del parser
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.comando == 'benchmark':
+        print(f"{'registros':>10} {'MB':>8} {'seg':>8} {'reg/s':>10} {'pico MB':>9}")
+        for n in args.registros:
+            r = benchmark(n, args.semilla)
+            print(f"{r['registros']:>10} {r['megabytes']:>8.2f} {r['segundos']:>8.3f} "
+                  f"{r['registros_por_segundo']:>10.0f} {r['memoria_pico_mb']:>9.2f}")
+
+    elif args.comando == 'fuzz':
+        fallas = fuzz(args.iteraciones, args.semilla)
+        print(f"{args.iteraciones} casos, {fallas} fallas")
+        sys.exit(1 if fallas else 0)
+
+    elif args.comando == 'corpus':
+        total = escribir_corpus(args.directorio)
+        fallas = 0
+        for archivo in sorted(Path(args.directorio).glob('*.nbib')):
+            errores = verificar(archivo.read_bytes())
+            fallas += bool(errores)
+            print(f"{'OK ' if not errores else 'ERR'} {archivo.name} {'; '.join(errores)}")
+        print(f"{total} archivos escritos en {args.directorio}, {fallas} con errores")
+        sys.exit(1 if fallas else 0)
+
+if __name__ == "__main__":
+    main()
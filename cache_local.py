@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import argparse
+import threading
+from pathlib import Path
+
+# ====================
+# CACHÉ LOCAL DIRECCIONADA POR CONTENIDO
+# ====================
+# Los PDF descargados del servidor y las copias de los PDF subidos ya no se
+# escriben en el directorio de trabajo (temp_<pdf>, ART.<ts>.<num>.pdf, ...):
+# se guardan una sola vez por contenido (objetos/ab/<sha256>) y un índice JSON
+# asocia cada nombre (la ruta remota) con su objeto, la versión remota (tamaño y
+# mtime) y el último acceso. Un objeto remoto se reutiliza entre sesiones
+# mientras el servidor no lo cambie. Al superar el límite de bytes se desalojan
+# los menos usados recientemente (LRU). Se configura con [cache] dir y max_mb en
+# secrets.toml.
+CACHE_DIR_DEFAULT = ".cache_productividad"
+CACHE_MAX_MB_DEFAULT = 500
+INDICE_CACHE = "indice.json"
+# Objetos sin entrada en el índice (otro proceso a medio registrar) se respetan este tiempo
+GRACIA_HUERFANOS = 3600
+
+def _hash_archivo(ruta: str) -> str:
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+class CacheLocal:
+    _instancias = {}
+    _candado = threading.Lock()
+
+    def __new__(cls, directorio: str = CACHE_DIR_DEFAULT, max_bytes: int = CACHE_MAX_MB_DEFAULT * 1024 * 1024):
+        # Una instancia por directorio de caché; el límite se actualiza si cambia la configuración
+        directorio = os.path.abspath(directorio)
+        with cls._candado:
+            if directorio not in cls._instancias:
+                instancia = super().__new__(cls)
+                instancia.directorio = directorio
+                instancia._escritura = threading.Lock()
+                os.makedirs(os.path.join(directorio, 'objetos'), exist_ok=True)
+                os.makedirs(os.path.join(directorio, 'tmp'), exist_ok=True)
+                cls._instancias[directorio] = instancia
+            instancia = cls._instancias[directorio]
+            instancia.max_bytes = int(max_bytes)
+            return instancia
+
+    # ====================
+    # ÍNDICE
+    # ====================
+    def _ruta_indice(self) -> str:
+        return os.path.join(self.directorio, INDICE_CACHE)
+
+    def _ruta_objeto(self, digest: str) -> str:
+        return os.path.join(self.directorio, 'objetos', digest[:2], digest)
+
+    def _leer_indice(self) -> dict:
+        try:
+            with open(self._ruta_indice(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _escribir_indice(self, indice: dict) -> None:
+        temporal = f"{self._ruta_indice()}.{uuid.uuid4().hex}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(indice, f, ensure_ascii=False)
+        os.replace(temporal, self._ruta_indice())
+
+    def _temporal(self) -> str:
+        return os.path.join(self.directorio, 'tmp', uuid.uuid4().hex)
+
+    # ====================
+    # ALTA Y CONSULTA
+    # ====================
+    def _registrar(self, nombre: str, temporal: str, remoto: dict = None) -> str:
+        """Mueve un archivo temporal a su objeto por contenido y lo asocia al nombre; devuelve la ruta del objeto"""
+        digest = _hash_archivo(temporal)
+        destino = self._ruta_objeto(digest)
+        with self._escritura:
+            if Path(destino).exists():
+                # Mismo contenido ya guardado: no se duplica
+                os.remove(temporal)
+            else:
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                os.replace(temporal, destino)
+            ahora = time.time()
+            indice = self._leer_indice()
+            anterior = indice.get(nombre, {})
+            indice[nombre] = {
+                'hash': digest,
+                'bytes': os.path.getsize(destino),
+                'remoto': remoto,
+                'creado': anterior.get('creado', ahora) if anterior.get('hash') == digest else ahora,
+                'ultimo_acceso': ahora,
+            }
+            self._escribir_indice(indice)
+            self._desalojar(indice, conservar=nombre)
+        return destino
+
+    def buscar(self, nombre: str, remoto: dict = None):
+        """Ruta del objeto asociado al nombre (y a esa versión remota, si se indica), o None; cuenta como acceso"""
+        with self._escritura:
+            indice = self._leer_indice()
+            entrada = indice.get(nombre)
+            if not entrada or (remoto is not None and entrada.get('remoto') != remoto):
+                return None
+            ruta = self._ruta_objeto(entrada['hash'])
+            if not Path(ruta).exists():
+                del indice[nombre]
+                self._escribir_indice(indice)
+                return None
+            entrada['ultimo_acceso'] = time.time()
+            self._escribir_indice(indice)
+            return ruta
+
+    def guardar_bytes(self, nombre: str, datos: bytes) -> str:
+        """Guarda contenido generado o subido por el usuario (p. ej. un PDF antes de enviarlo); devuelve su ruta"""
+        temporal = self._temporal()
+        with open(temporal, 'wb') as f:
+            f.write(datos)
+        return self._registrar(nombre, temporal)
+
+    def obtener(self, sftp, remote_path: str) -> str:
+        """Ruta local de un archivo remoto: la del caché si el remoto no cambió, si no lo descarga"""
+        atributos = sftp.stat(remote_path)
+        remoto = {'size': atributos.st_size, 'mtime': atributos.st_mtime}
+        ruta = self.buscar(remote_path, remoto)
+        if ruta:
+            logging.info(f"Caché: {remote_path} sin cambios en el servidor")
+            return ruta
+        temporal = self._temporal()
+        try:
+            sftp.get(remote_path, temporal)
+            if os.path.getsize(temporal) != atributos.st_size:
+                raise IOError(f"Descarga incompleta de {remote_path}")
+            return self._registrar(remote_path, temporal, remoto)
+        except Exception:
+            if Path(temporal).exists():
+                os.remove(temporal)
+            raise
+
+    def descargar(self, conectar, remote_path: str):
+        """obtener() con su propia conexión (conectar = SSHManager.get_connection); None si falla"""
+        ssh = conectar()
+        if not ssh:
+            return None
+        try:
+            with ssh.open_sftp() as sftp:
+                return self.obtener(sftp, remote_path)
+        except FileNotFoundError:
+            logging.error(f"Archivo remoto no encontrado: {remote_path}")
+            return None
+        except Exception as e:
+            logging.error(f"Error al descargar {remote_path} al caché: {str(e)}")
+            return None
+        finally:
+            ssh.close()
+
+    def leer_bytes(self, conectar, remote_path: str):
+        """Contenido de un archivo remoto pasando por el caché; None si no se pudo obtener"""
+        ruta = self.descargar(conectar, remote_path)
+        if not ruta:
+            return None
+        with open(ruta, 'rb') as f:
+            return f.read()
+
+    # ====================
+    # DESALOJO (LRU)
+    # ====================
+    def _desalojar(self, indice: dict, conservar: str = None) -> int:
+        """Quita las entradas usadas hace más tiempo hasta quedar bajo el límite; devuelve bytes liberados"""
+        tamanos = {e['hash']: e['bytes'] for e in indice.values()}
+        ocupado = sum(tamanos.values())
+        if ocupado <= self.max_bytes:
+            return 0
+        liberados = 0
+        for nombre, entrada in sorted(indice.items(), key=lambda par: par[1]['ultimo_acceso']):
+            if ocupado <= self.max_bytes:
+                break
+            if nombre == conservar:
+                continue
+            del indice[nombre]
+            # Un objeto puede estar asociado a varios nombres: solo se borra con el último
+            if not any(e['hash'] == entrada['hash'] for e in indice.values()):
+                try:
+                    os.remove(self._ruta_objeto(entrada['hash']))
+                except FileNotFoundError:
+                    pass
+                ocupado -= tamanos[entrada['hash']]
+                liberados += tamanos[entrada['hash']]
+        self._escribir_indice(indice)
+        logging.info(f"Caché: {liberados} bytes desalojados; ocupa {ocupado} de {self.max_bytes}")
+        return liberados
+
+    def limpiar(self) -> dict:
+        """Aplica el límite, borra objetos sin entrada en el índice y temporales abandonados"""
+        with self._escritura:
+            indice = self._leer_indice()
+            liberados = self._desalojar(indice)
+            vigentes = {e['hash'] for e in indice.values()}
+            limite = time.time() - GRACIA_HUERFANOS
+            huerfanos = 0
+            for carpeta in ('objetos', 'tmp'):
+                for ruta in Path(self.directorio, carpeta).rglob('*'):
+                    if ruta.is_file() and ruta.name not in vigentes and ruta.stat().st_mtime < limite:
+                        liberados += ruta.stat().st_size
+                        ruta.unlink()
+                        huerfanos += 1
+        return {'liberados': liberados, 'huerfanos': huerfanos, **self.estadisticas()}
+
+    def estadisticas(self) -> dict:
+        indice = self._leer_indice()
+        return {
+            'entradas': len(indice),
+            'objetos': len({e['hash'] for e in indice.values()}),
+            'bytes': sum({e['hash']: e['bytes'] for e in indice.values()}.values()),
+            'max_bytes': self.max_bytes,
+        }
+
+    def vaciar(self) -> None:
+        with self._escritura:
+            shutil.rmtree(os.path.join(self.directorio, 'objetos'), ignore_errors=True)
+            os.makedirs(os.path.join(self.directorio, 'objetos'), exist_ok=True)
+            self._escribir_indice({})
+
+def cache_desde_secrets(secrets) -> CacheLocal:
+    """CacheLocal con [cache] dir y max_mb de secrets.toml (o los valores por omisión)"""
+    try:
+        configuracion = secrets.get("cache", {})
+        return CacheLocal(
+            configuracion.get("dir", CACHE_DIR_DEFAULT),
+            int(configuracion.get("max_mb", CACHE_MAX_MB_DEFAULT)) * 1024 * 1024
+        )
+    except Exception as e:
+        logging.error(f"Configuración de caché inválida, se usan los valores por omisión: {str(e)}")
+        return CacheLocal()
+
+def main():
+    parser = argparse.ArgumentParser(description="Administración de la caché local de archivos remotos")
+    parser.add_argument('--dir', default=CACHE_DIR_DEFAULT, help="Directorio de la caché")
+    parser.add_argument('--max-mb', type=int, default=CACHE_MAX_MB_DEFAULT, help="Límite en MB")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    subparsers.add_parser('estado', help="Entradas, objetos y bytes ocupados")
+    subparsers.add_parser('limpiar', help="Aplica el límite y borra objetos huérfanos")
+    subparsers.add_parser('vaciar', help="Borra todo el contenido")
+    args = parser.parse_args()
+
+    cache = CacheLocal(args.dir, args.max_mb * 1024 * 1024)
+    if args.comando == 'estado':
+        print(cache.estadisticas())
+    elif args.comando == 'limpiar':
+        print(cache.limpiar())
+    elif args.comando == 'vaciar':
+        cache.vaciar()
+        print(f"Caché vaciada: {cache.directorio}")
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,11 @@ import time
 import os
 import logging
 from PIL import Image
+from cache_local import cache_desde_secrets
+from esquemas import COLUMNA_ID, columnas, df_vacio, leer_csv
+from transaccion_guardado import ids_registros, leer_csv_texto, quitar_bajas
+from diario_cambios import ESTADO_CONEXION, Reconciliador, cambios_pendientes, guardar_registros, sincronizar, dar_de_baja
+from importadores import importar_archivo, a_capitulo, ya_registrado
 
 # Configuración de logging mejorada
 logging.basicConfig(
@@ -99,6 +104,12 @@ class Config:
         self.HIGHLIGHT_COLOR = "#90EE90"
         self.LOGO_PATH = "escudo_COLOR.jpg"
 
+        # Caché local por contenido para PDF y temporales ([cache] dir y max_mb en secrets.toml)
+        self.CACHE = cache_desde_secrets(st.secrets)
+
+        # Modo sin conexión por omisión ([sincronizacion] sin_conexion = true en secrets.toml)
+        self.SIN_CONEXION = st.secrets.get("sincronizacion", {}).get("sin_conexion", False)
+
 CONFIG = Config()
 
 # ==================
@@ -110,7 +121,14 @@ class SSHManager:
 
     @staticmethod
     def get_connection():
-        """Establece conexión SSH segura con reintentos"""
+        """Conexión SSH, salvo en modo sin conexión o durante la espera tras un fallo (diario_cambios.py)"""
+        if st.session_state.get('sin_conexion', CONFIG.SIN_CONEXION):
+            return None
+        return ESTADO_CONEXION.conectar(SSHManager.conectar_servidor)
+
+    @staticmethod
+    def _intentar_conexion():
+        """(ssh, None) o (None, último error) tras los reintentos; no llama a Streamlit"""
         ssh = paramiko.SSHClient()
         ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
         
@@ -124,15 +142,27 @@ class SSHManager:
                     timeout=CONFIG.TIMEOUT_SECONDS
                 )
                 logging.info(f"Conexión SSH establecida (intento {attempt + 1})")
-                return ssh
+                return ssh, None
             except Exception as e:
                 logging.warning(f"Intento {attempt + 1} fallido: {str(e)}")
                 if attempt < SSHManager.MAX_RETRIES - 1:
                     time.sleep(SSHManager.RETRY_DELAY)
                 else:
                     logging.error("Fallo definitivo al conectar via SSH")
-                    st.error(f"Error de conexión SSH después de {SSHManager.MAX_RETRIES} intentos: {str(e)}")
-                    return None
+                    return None, e
+
+    @staticmethod
+    def conectar_servidor():
+        """Establece conexión SSH segura con reintentos"""
+        ssh, error = SSHManager._intentar_conexion()
+        if ssh is None:
+            st.error(f"Error de conexión SSH después de {SSHManager.MAX_RETRIES} intentos: {str(error)}")
+        return ssh
+
+    @staticmethod
+    def conectar_sin_aviso():
+        """Como conectar_servidor, sin mensajes en pantalla: la usa el reconciliador, que corre fuera de la sesión"""
+        return SSHManager._intentar_conexion()[0]
 
     @staticmethod
     def verify_file_integrity(local_path, remote_path, sftp):
@@ -159,13 +189,7 @@ class SSHManager:
                         sftp.stat(remote_path)
                     except FileNotFoundError:
                         # Crear archivo local con estructura correcta
-                        columns = [
-                            'economic_number', 'nombramiento', 'sni', 'sii', 'departamento', 'autor_principal', 'tipo_participacion', 
-                            'titulo_libro', 'titulo_capitulo', 'editorial', 'coautores_secundarios', 
-                            'year', 'pub_date', 'isbn_issn', 'numero_edicion', 'paginas', 
-                            'idiomas_disponibles', 'selected_keywords', 'pdf_filename', 'estado'
-                        ]
-                        pd.DataFrame(columns=columns).to_csv(local_path, index=False)
+                        df_vacio('capitulos').to_csv(local_path, index=False)
                         logging.info(f"Archivo remoto no encontrado, creado local con estructura: {local_path}")
                         return True
                         
@@ -244,46 +268,33 @@ def sync_with_remote(economic_number):
         remote_path = os.path.join(CONFIG.REMOTE['DIR'], remote_filename)
 
         # Intenta descargar el archivo remoto
-        download_success = SSHManager.download_remote_file(remote_path, csv_filename)
+        download_success = sincronizar(SSHManager.get_connection, remote_path, csv_filename)
 
         if not download_success:
             # Si no existe el archivo remoto, crea uno local con estructura correcta
-            columns = [
-                'economic_number', 'nombramiento', 'sni', 'sii', 'departamento', 'autor_principal', 'tipo_participacion', 
-                'titulo_libro', 'titulo_capitulo', 'editorial', 'coautores_secundarios', 
-                'year', 'pub_date', 'isbn_issn', 'numero_edicion', 'paginas', 
-                'idiomas_disponibles', 'selected_keywords', 'pdf_filename', 'estado'
-            ]
-
             # Verifica si el archivo local ya existe
             if not Path(csv_filename).exists():
-                pd.DataFrame(columns=columns).to_csv(csv_filename, index=False)
+                df_vacio('capitulos').to_csv(csv_filename, index=False)
                 st.info("ℹ️ No se encontró archivo remoto. Se creó uno nuevo localmente con la estructura correcta.")
             else:
                 # Si el archivo local existe pero está vacío o corrupto
                 try:
-                    df = pd.read_csv(csv_filename)
+                    df = leer_csv('capitulos', csv_filename, analitico=False)
                     if df.empty:
-                        pd.DataFrame(columns=columns).to_csv(csv_filename, index=False)
+                        df_vacio('capitulos').to_csv(csv_filename, index=False)
                 except:
-                    pd.DataFrame(columns=columns).to_csv(csv_filename, index=False)
+                    df_vacio('capitulos').to_csv(csv_filename, index=False)
 
             return False
 
         # Verifica que el archivo descargado no esté vacío
         try:
-            df = pd.read_csv(csv_filename)
+            df = leer_csv('capitulos', csv_filename, analitico=False)
             if df.empty:
                 st.warning("El archivo remoto está vacío")
         except pd.errors.EmptyDataError:
             st.warning("El archivo remoto está vacío o corrupto")
-            columns = [
-                'economic_number', 'nombramiento', 'sni', 'sii', 'departamento', 'autor_principal', 'tipo_participacion', 
-                'titulo_libro', 'titulo_capitulo', 'editorial', 'coautores_secundarios', 
-                'year', 'pub_date', 'isbn_issn', 'numero_edicion', 'paginas', 
-                'idiomas_disponibles', 'selected_keywords', 'pdf_filename', 'estado'
-            ]
-            pd.DataFrame(columns=columns).to_csv(csv_filename, index=False)
+            df_vacio('capitulos').to_csv(csv_filename, index=False)
             return False
 
         st.success("✅ Sincronización con servidor remoto completada")
@@ -294,80 +305,31 @@ def sync_with_remote(economic_number):
         logging.error(f"Sync Error: {str(e)}")
         return False
 
-def save_to_csv(data: dict):
-    """Guarda los datos en el CSV local y remoto, eliminando registros con estado 'X'"""
+def save_to_csv(data):
+    """Guarda uno o varios registros (dict o lista de dict) en una sola transacción, eliminando registros con estado 'X'"""
     try:
-        economic_number = data['economic_number']
+        registros = data if isinstance(data, list) else [data]
+        economic_number = registros[0]['economic_number']
         csv_filename = f"{CONFIG.CSV_PREFIX}{economic_number}.csv"
+        remote_filename = f"{CONFIG.CSV_PREFIX}{economic_number}.csv"
+        remote_path = os.path.join(CONFIG.REMOTE['DIR'], remote_filename)
 
-        with st.spinner("Sincronizando datos con el servidor..."):
-            if not sync_with_remote(economic_number):
-                st.warning("⚠️ Trabajando con copia local debido a problemas de conexión")
-
-        columns = [
-            'economic_number', 'nombramiento', 'sni', 'sii', 'departamento', 'autor_principal', 'tipo_participacion',
-            'titulo_libro', 'titulo_capitulo', 'editorial', 'coautores_secundarios',
-            'year', 'pub_date', 'isbn_issn', 'numero_edicion', 'paginas',
-            'idiomas_disponibles', 'selected_keywords', 'pdf_filename', 'estado'
-        ]
-
-        # Verificar si el archivo existe y tiene contenido válido
-        if not Path(csv_filename).exists():
-            df_existing = pd.DataFrame(columns=columns)
-        else:
-            try:
-                df_existing = pd.read_csv(
-                    csv_filename,
-                    encoding='utf-8-sig',
-                    dtype={'economic_number': str}
-                )
-                # Eliminar registros con estado 'X'
-                df_existing = df_existing[df_existing['estado'] != 'X'].copy()
-
-                # Verificar si el DataFrame está vacío
-                if df_existing.empty:
-                    df_existing = pd.DataFrame(columns=columns)
-                # Verificar si tiene todas las columnas necesarias
-                missing_cols = set(columns) - set(df_existing.columns)
-                if missing_cols:
-                    for col in missing_cols:
-                        df_existing[col] = ""
-            except (pd.errors.EmptyDataError, pd.errors.ParserError):
-                df_existing = pd.DataFrame(columns=columns)
-
-        # Preparar el nuevo registro
-        df_new = pd.DataFrame([data])
-
-        # Limpiar los datos del nuevo registro
-        for col in df_new.columns:
-            if df_new[col].dtype == object:
-                df_new[col] = df_new[col].astype(str).str.replace(r'\r\n|\n|\r', ' ', regex=True).str.strip()
-
-        # Combinar los datos existentes (sin los 'X') con los nuevos
-        df_combined = pd.concat([df_existing, df_new], ignore_index=True)
-
-        # Asegurar que todas las columnas estén presentes
-        for col in columns:
-            if col not in df_combined.columns:
-                df_combined[col] = ""
-
-        # Reordenar columnas
-        df_combined = df_combined[columns]
-
-        # Guardar localmente
-        df_combined.to_csv(csv_filename, index=False, encoding='utf-8-sig')
-
-        # Intentar subir al servidor remoto
-        with st.spinner("Subiendo datos al servidor remoto..."):
-            remote_filename = f"{CONFIG.CSV_PREFIX}{economic_number}.csv"
-            remote_path = os.path.join(CONFIG.REMOTE['DIR'], remote_filename)
-            if SSHManager.upload_remote_file(csv_filename, remote_path):
-                st.success("✅ Registro guardado exitosamente en el servidor remoto!")
-                return True
-            else:
-                st.error("❌ No se pudo subir el archivo al servidor remoto")
-                st.info("ℹ️ Los datos se guardaron localmente y se intentará subir en la próxima sincronización")
-                return False
+        columns = columnas('capitulos')
+
+        # Una conexión: consulta la versión remota, descarga solo si cambió, fusiona,
+        # escribe de forma atómica y sube una vez
+        with st.spinner("Guardando datos en el servidor..."):
+            resultado = guardar_registros(SSHManager.get_connection, csv_filename, remote_path, columns, registros)
+
+        if resultado['subido']:
+            st.success("✅ Registro guardado exitosamente en el servidor remoto!")
+            return True
+        if resultado['diario']:
+            # El alta quedó en el diario local; el reconciliador la envía al volver la conexión
+            st.warning("📝 Sin conexión: el registro se guardó localmente y se enviará al servidor al volver la conexión")
+            return True
+        st.error(f"❌ Error al guardar en CSV: {resultado['error']}")
+        return False
 
     except Exception as e:
         st.error(f"❌ Error al guardar en CSV: {str(e)}")
@@ -417,6 +379,16 @@ def main():
 
     st.title("📚 Captura Capítulos")
 
+    # Modo sin conexión: altas y bajas van al diario local y el reconciliador las envía al volver la conexión
+    Reconciliador().iniciar(SSHManager.conectar_sin_aviso)
+    st.sidebar.toggle("🔌 Trabajar sin conexión", value=CONFIG.SIN_CONEXION, key="sin_conexion")
+    ESTADO_CONEXION.fijar_sin_conexion(st.session_state.sin_conexion)
+    if st.session_state.sin_conexion or not ESTADO_CONEXION.disponible():
+        st.sidebar.warning("Sin conexión: los cambios se guardan en el diario local")
+    pendientes = cambios_pendientes()
+    if pendientes:
+        st.sidebar.info(f"📝 {pendientes} cambio(s) pendiente(s) de enviar al servidor")
+
     # Sección de información del investigador
     with st.container():
         st.subheader("Información del Investigador")
@@ -489,7 +461,12 @@ def main():
     # Cargar o inicializar el DataFrame
     if Path(csv_filename).exists():
         try:
-            capitulos_df = pd.read_csv(csv_filename, encoding='utf-8-sig', dtype={'economic_number': str})
+            capitulos_df = leer_csv('capitulos', csv_filename, analitico=False)
+            # Las filas dadas de baja (lápidas) no se muestran; el índice sigue siendo la posición en el CSV
+            capitulos_df = quitar_bajas(capitulos_df, csv_filename, columnas('capitulos'))
+            # record_id de cada fila (por su posición en el CSV); las capturadas antes de existir la columna usan la huella de su contenido
+            ids = ids_registros(leer_csv_texto(csv_filename, columnas('capitulos')), columnas('capitulos'))
+            capitulos_df[COLUMNA_ID] = [ids[posicion] for posicion in capitulos_df.index]
             capitulos_df['economic_number'] = capitulos_df['economic_number'].astype(str).str.strip()
 
             # Asegurar que los campos SNI, SII, Nombramiento y Departamento existan y tengan valores
@@ -521,19 +498,9 @@ def main():
                 capitulos_df['estado'] = capitulos_df['estado'].fillna('A').str.strip().replace('', 'A')
         except Exception as e:
             st.error(f"Error al leer el archivo: {str(e)}")
-            capitulos_df = pd.DataFrame(columns=[
-                'economic_number', 'nombramiento', 'sni', 'sii', 'departamento', 'autor_principal', 'tipo_participacion',
-                'titulo_libro', 'titulo_capitulo', 'editorial', 'coautores_secundarios',
-                'year', 'pub_date', 'isbn_issn', 'numero_edicion', 'paginas',
-                'idiomas_disponibles', 'selected_keywords', 'pdf_filename', 'estado'
-            ])
+            capitulos_df = df_vacio('capitulos')
     else:
-        capitulos_df = pd.DataFrame(columns=[
-            'economic_number', 'nombramiento', 'sni', 'sii', 'departamento', 'autor_principal', 'tipo_participacion',
-            'titulo_libro', 'titulo_capitulo', 'editorial', 'coautores_secundarios',
-            'year', 'pub_date', 'isbn_issn', 'numero_edicion', 'paginas',
-            'idiomas_disponibles', 'selected_keywords', 'pdf_filename', 'estado'
-        ])
+        capitulos_df = df_vacio('capitulos')
 
     # Mostrar registros existentes si los hay
     if not capitulos_df.empty:
@@ -571,8 +538,8 @@ def main():
             key="editor_tabla"
         )
 
-        # Verificar cambios en los estados
-        if not edited_df.equals(capitulos_df[columnas_mostrar]):
+        # Verificar cambios en los estados: solo las filas que el usuario tocó en el editor
+        if st.session_state.get("editor_tabla", {}).get("edited_rows"):
             # Actualizar el estado en el DataFrame original
             capitulos_df['estado'] = edited_df['estado']
 
@@ -583,17 +550,12 @@ def main():
                 st.warning(f"⚠️ Tiene {len(registros_a_borrar)} registro(s) marcado(s) para dar de baja")
 
                 if st.button("🗑️ Confirmar baja de registros", type="primary", key="confirm_delete"):
-                    # Filtrar solo los registros activos (estado 'A')
-                    capitulos_df = capitulos_df[capitulos_df['estado'] == 'A'].copy()
-
-                    # Guardar cambios en el archivo
-                    capitulos_df.to_csv(csv_filename, index=False, encoding='utf-8-sig')
-
-                    # Sincronizar con servidor remoto
+                    # Baja con lápidas: no se reescribe ni se vuelve a subir el CSV
+                    posiciones = list(capitulos_df.index[capitulos_df['estado'] == 'X'])
                     with st.spinner("Guardando cambios..."):
                         remote_filename = f"{CONFIG.CSV_PREFIX}{economic_number}.csv"
                         remote_path = os.path.join(CONFIG.REMOTE['DIR'], remote_filename)
-                        upload_success = SSHManager.upload_remote_file(csv_filename, remote_path)
+                        upload_success = dar_de_baja(SSHManager.get_connection, csv_filename, remote_path, posiciones, columnas('capitulos'))['aplicada']
 
                     if upload_success:
                         st.success("✅ Registros eliminados exitosamente del archivo!")
@@ -603,8 +565,79 @@ def main():
                     else:
                         st.error("❌ Error al sincronizar con el servidor remoto")
 
-    # Preguntar si desea añadir nuevo registro
+    # Importación por lote desde archivos exportados por gestores bibliográficos
     st.divider()
+    with st.expander("📥 Importar desde archivo (RIS, BibTeX o JSON de CrossRef)"):
+        archivo_importar = st.file_uploader(
+            "Suba el archivo exportado desde su gestor bibliográfico o desde CrossRef:",
+            type=["ris", "bib", "bibtex", "json", "jsonl", "txt"],
+            accept_multiple_files=False,
+            key="archivo_importar"
+        )
+        nombre_importar = st.text_input(
+            "👤 Su nombre como aparece en las publicaciones (ej. Pérez, Juan), para identificar si participó como editor:",
+            key="nombre_importar"
+        )
+
+        if archivo_importar is not None:
+            try:
+                importados = [
+                    a_capitulo(registro, nombre_importar, CONFIG.MAX_KEYWORDS)
+                    for registro in importar_archivo(archivo_importar.name, archivo_importar)
+                ]
+            except ValueError as e:
+                st.error(str(e))
+                importados = None
+            except Exception as e:
+                st.error(f"Error al leer el archivo: {str(e)}")
+                logging.error(f"Error al importar {archivo_importar.name}: {str(e)}")
+                importados = None
+
+            if importados:
+                vista_previa = pd.DataFrame(importados)
+                # Por omisión se excluyen los registros que ya existen
+                vista_previa.insert(0, 'importar', [
+                    not ya_registrado(registro, capitulos_df, 'titulo_capitulo')
+                    for registro in importados
+                ])
+                columnas_vista = ['importar', 'titulo_capitulo', 'titulo_libro', 'year', 'isbn_issn',
+                                  'autor_principal', 'tipo_participacion', 'selected_keywords']
+                vista_editada = st.data_editor(
+                    vista_previa[columnas_vista],
+                    column_config={
+                        "importar": st.column_config.CheckboxColumn("Importar", width="small")
+                    },
+                    disabled=columnas_vista[1:],
+                    hide_index=True,
+                    use_container_width=True,
+                    key="editor_importar"
+                )
+
+                seleccionados = [importados[i] for i in vista_editada.index[vista_editada['importar']]]
+
+                if seleccionados and st.button(f"💾 Guardar {len(seleccionados)} registro(s) importado(s)", type="primary"):
+                    nuevos_registros = [
+                        {
+                            'economic_number': economic_number,
+                            'nombramiento': nombramiento,
+                            'sni': sni,
+                            'sii': sii,
+                            'departamento': departamento,
+                            **registro,
+                            'pdf_filename': '',
+                            'estado': 'A'
+                        }
+                        for registro in seleccionados
+                    ]
+                    if save_to_csv(nuevos_registros):
+                        st.success(f"✅ {len(nuevos_registros)} registro(s) importado(s) exitosamente!")
+                        st.balloons()
+                        time.sleep(2)
+                        st.rerun()
+            elif importados is not None:
+                st.warning("No se encontraron registros en el archivo")
+
+    # Preguntar si desea añadir nuevo registro
     if st.radio("¿Desea registrar un nuevo capítulo?", ["No", "Sí"], index=0, key="nuevo_capitulo_radio") == "Sí":
         # Formulario para nuevo registro
         st.subheader("📝 Nuevo registro de capítulo")
@@ -675,13 +708,12 @@ def main():
                 pdf_uploaded_name = ""  # Inicializar como cadena vacía
                 if capitulo_pdf is not None:
                     try:
-                        # Guardar temporalmente el archivo localmente
-                        with open(pdf_filename, "wb") as f:
-                            f.write(capitulo_pdf.getbuffer())
+                        # Copia local en el caché (por contenido), no en el directorio de trabajo
+                        pdf_local = CONFIG.CACHE.guardar_bytes(pdf_remote_path, capitulo_pdf.getvalue())
 
                         # Subir al servidor remoto
                         with st.spinner("Subiendo PDF del capítulo..."):
-                            upload_success = SSHManager.upload_remote_file(pdf_filename, pdf_remote_path)
+                            upload_success = SSHManager.upload_remote_file(pdf_local, pdf_remote_path)
 
                         if upload_success:
                             pdf_uploaded_name = pdf_filename  # Guardar el nombre del archivo solo si se subió correctamente
@@ -0,0 +1,488 @@
+import io
+import os
+import json
+import time
+import uuid
+import logging
+import argparse
+from types import SimpleNamespace
+
+import pandas as pd
+
+from esquemas import columnas, encabezado_csv, nombres_completos
+from lapidas import LAPIDAS_SUFFIX, parsear_lapidas, posiciones_con_lapida
+from transaccion_guardado import claves_columnas
+
+# ====================
+# CONSOLIDADOR INCREMENTAL DE *_total.csv
+# ====================
+# Sustituye la reconstrucción completa de generador*.sh: un manifiesto junto al
+# total guarda, por archivo de investigador, su tamaño, mtime y el tramo de
+# bytes que ocupa en el total. En cada corrida solo se leen y se convierten los
+# archivos que cambiaron; hasta el primer tramo afectado el total se copia por
+# bloques tal cual. Los archivos modificados pasan al final, así los que casi no
+# cambian quedan al principio y nunca se vuelven a procesar. Las lápidas de cada archivo
+# (lapidas.py) forman parte de su firma y sus filas no pasan al total.
+# El total nuevo siempre se arma en un temporal y se publica con un rename, bajo
+# un candado (<total>.lock) que evita dos consolidaciones a la vez; si otro
+# proceso reescribió el total mientras tanto, la corrida se descarta.
+# Funciona con un paramiko.SFTPClient o con DirectorioLocal (en el servidor o
+# contra una copia local del directorio).
+CONSOLIDADOS = {
+    'articulos': {'prefijos': ['productos_', 'manual_'], 'total': 'pro_productos_total.csv'},
+    'tesis': {'prefijos': ['tesis_'], 'total': 'pro_tesis_total.csv'},
+    'libros': {'prefijos': ['libros_'], 'total': 'pro_libros_total.csv'},
+    'capitulos': {'prefijos': ['capitulos_'], 'total': 'pro_capitulos_total.csv'},
+    'congresos': {'prefijos': ['congresos_'], 'total': 'pro_congresos_total.csv'},
+}
+MANIFEST_SUFFIX = ".manifest.json"
+VERSION_MANIFIESTO = 3
+# Candado de consolidación; uno más viejo que esto se considera abandonado
+LOCK_SUFFIX = ".lock"
+LOCK_CADUCIDAD = 600
+BLOQUE_COPIA = 1 << 20
+# Versión remota de un total descargado cuya copia local se reescribió sin las filas con lápida
+DESCARGA_SUFFIX = ".remoto.json"
+# Sello del generador: mtime de la fuente más reciente que alcanzó a ver la última corrida
+SELLO_SUFFIX = ".sello.json"
+
+class DirectorioLocal:
+    """Los métodos de paramiko.SFTPClient que usa el consolidador, sobre el disco local"""
+    def listdir_attr(self, path):
+        return [
+            SimpleNamespace(filename=entrada.name, st_size=entrada.stat().st_size, st_mtime=entrada.stat().st_mtime)
+            for entrada in os.scandir(path) if entrada.is_file()
+        ]
+
+    def stat(self, path):
+        return os.stat(path)
+
+    def open(self, path, mode='r'):
+        # SFTP siempre es binario
+        return open(path, mode.replace('b', '') + 'b')
+
+    def posix_rename(self, origen, destino):
+        os.replace(origen, destino)
+
+    def rename(self, origen, destino):
+        os.rename(origen, destino)
+
+    def remove(self, path):
+        os.remove(path)
+
+def _renombrar(fs, origen: str, destino: str) -> None:
+    try:
+        fs.posix_rename(origen, destino)
+    except IOError:
+        # Servidores sin la extensión posix-rename
+        try:
+            fs.remove(destino)
+        except FileNotFoundError:
+            pass
+        fs.rename(origen, destino)
+
+def _unir(directorio: str, nombre: str) -> str:
+    # Rutas remotas siempre con '/', también desde Windows
+    return f"{directorio.rstrip('/')}/{nombre}" if directorio else nombre
+
+def _es_fuente(nombre: str, prefijos: list, total: str) -> bool:
+    return (
+        nombre != total
+        and nombre.endswith('.csv')
+        and not nombre.endswith('_total.csv')
+        and any(nombre.startswith(prefijo) for prefijo in prefijos)
+    )
+
+def _firma(atributos) -> dict:
+    return {'size': int(atributos.st_size), 'mtime': float(atributos.st_mtime)}
+
+def _firma_dudosa(firma: dict, limite: float) -> bool:
+    """Una fuente modificada en el mismo segundo en que se leyó puede cambiar otra vez sin que cambie su mtime"""
+    lapidas = firma.get('lapidas') or {}
+    return max(firma['mtime'], lapidas.get('mtime', 0)) >= limite
+
+def _tomar_candado(fs, ruta: str) -> bool:
+    """Crea el candado en modo exclusivo; si existe y caducó, lo reemplaza una vez"""
+    for intento in range(2):
+        try:
+            with fs.open(ruta, 'x') as f:
+                f.write(f"{os.getpid()} {time.time()}".encode('utf-8'))
+            return True
+        except (OSError, IOError):
+            if intento:
+                return False
+            try:
+                if time.time() - fs.stat(ruta).st_mtime < LOCK_CADUCIDAD:
+                    return False
+                logging.warning(f"Consolidador: se descarta el candado abandonado {ruta}")
+                fs.remove(ruta)
+            except (OSError, IOError):
+                # Otro proceso lo acaba de liberar o de tomar; se intenta una vez más
+                pass
+    return False
+
+def _soltar_candado(fs, ruta: str) -> None:
+    try:
+        fs.remove(ruta)
+    except (OSError, IOError):
+        pass
+
+def _estado(fs, ruta: str):
+    """(tamaño, mtime) del archivo, o None si no existe"""
+    try:
+        atributos = fs.stat(ruta)
+        return int(atributos.st_size), float(atributos.st_mtime)
+    except (OSError, IOError):
+        return None
+
+def _copiar_tramo(origen, destino, longitud: int) -> None:
+    """Copia los primeros longitud bytes por bloques, sin cargar el total en memoria"""
+    restante = longitud
+    while restante > 0:
+        datos = origen.read(min(BLOQUE_COPIA, restante))
+        if not datos:
+            raise IOError("El total es más corto que lo registrado en el manifiesto")
+        destino.write(datos)
+        restante -= len(datos)
+
+def leer_manifiesto(fs, ruta: str):
+    try:
+        with fs.open(ruta, 'r') as f:
+            manifiesto = json.loads(f.read().decode('utf-8'))
+        if manifiesto.get('version') == VERSION_MANIFIESTO:
+            return manifiesto
+    except (OSError, IOError, ValueError):
+        pass
+    return None
+
+def escribir_manifiesto(fs, ruta: str, manifiesto: dict) -> None:
+    """Se escribe al final: si la corrida se interrumpe, la siguiente detecta el desajuste y reconstruye"""
+    temporal = f"{ruta}.tmp"
+    with fs.open(temporal, 'w') as f:
+        f.write(json.dumps(manifiesto, ensure_ascii=False, indent=1).encode('utf-8'))
+    _renombrar(fs, temporal, ruta)
+
+def _bloque_fuente(fs, ruta: str, tipo: str, con_lapidas: bool = False) -> tuple:
+    """Filas de un archivo de investigador (sin las que tienen lápida) en el orden de columnas del
+    esquema, como bytes CSV sin encabezado"""
+    with fs.open(ruta, 'r') as f:
+        contenido = f.read()
+    try:
+        # Como texto, igual que las aplicaciones de captura: así las claves de las lápidas coinciden
+        df = pd.read_csv(io.BytesIO(contenido), encoding='utf-8-sig', dtype=str, keep_default_na=False)
+        df.columns = df.columns.str.strip()
+    except Exception as e:
+        # Un archivo vacío o dañado no debe detener la consolidación del resto
+        logging.warning(f"Consolidador: se omite {ruta} ({str(e)})")
+        return b'', 0
+    if con_lapidas:
+        with fs.open(f"{ruta}{LAPIDAS_SUFFIX}", 'r') as f:
+            lapidas = parsear_lapidas(f.read().decode('utf-8'))
+        bajas = posiciones_con_lapida(claves_columnas(df, columnas(tipo)), lapidas)
+        df = df.drop(index=list(bajas))
+    df = df.reindex(columns=columnas(tipo), fill_value='')
+    return df.to_csv(header=False, index=False, lineterminator='\n').encode('utf-8'), len(df)
+
+def consolidar(fs, directorio: str, tipo: str, prefijos: list = None, total: str = None,
+               completo: bool = False) -> dict:
+    """Actualiza el total leyendo solo los archivos que cambiaron; devuelve un resumen de la corrida"""
+    configuracion = CONSOLIDADOS[tipo]
+    prefijos = prefijos or configuracion['prefijos']
+    total = total or configuracion['total']
+    ruta_total = _unir(directorio, total)
+    ruta_candado = f"{ruta_total}{LOCK_SUFFIX}"
+    if not _tomar_candado(fs, ruta_candado):
+        # Otra consolidación está en curso; el total que deje ya incluye estos cambios o los verá la siguiente
+        logging.info(f"Consolidador {tipo}: {ruta_candado} ocupado, se omite la corrida")
+        return {
+            'tipo': tipo, 'total': ruta_total, 'fuentes': 0, 'leidos': 0, 'eliminados': 0,
+            'reconstruido': False, 'bytes_escritos': 0, 'filas': 0, 'omitido': 'candado'
+        }
+    try:
+        return _consolidar(fs, directorio, tipo, prefijos, total, ruta_total, completo)
+    finally:
+        _soltar_candado(fs, ruta_candado)
+
+def _consolidar(fs, directorio: str, tipo: str, prefijos: list, total: str, ruta_total: str,
+                completo: bool) -> dict:
+    ruta_manifiesto = f"{ruta_total}{MANIFEST_SUFFIX}"
+    encabezado = (encabezado_csv(tipo) + '\n').encode('utf-8')
+    # Versión del total al empezar; se vuelve a comparar justo antes de publicar
+    inicial = _estado(fs, ruta_total)
+
+    listado = fs.listdir_attr(directorio or '.')
+    lapidas = {
+        atributos.filename[:-len(LAPIDAS_SUFFIX)]: _firma(atributos)
+        for atributos in listado if atributos.filename.endswith(LAPIDAS_SUFFIX)
+    }
+    fuentes = {
+        atributos.filename: {**_firma(atributos), 'lapidas': lapidas.get(atributos.filename)}
+        for atributos in listado
+        if _es_fuente(atributos.filename, prefijos, total)
+    }
+
+    manifiesto = None if completo else leer_manifiesto(fs, ruta_manifiesto)
+    # Si el total no mide lo que dice el manifiesto (otro proceso lo reescribió), no se puede parchar
+    if manifiesto is not None and (
+        inicial is None or inicial[0] != manifiesto['tamano_total'] or manifiesto['encabezado'] != columnas(tipo)
+    ):
+        manifiesto = None
+
+    bloques = manifiesto['bloques'] if manifiesto else []
+    conservados = [b for b in bloques if fuentes.get(b['archivo']) == b['firma']]
+    vigentes = {b['archivo'] for b in conservados}
+    pendientes = sorted(nombre for nombre in fuentes if nombre not in vigentes)
+    eliminados = [b for b in bloques if b['archivo'] not in fuentes]
+
+    resumen = {
+        'tipo': tipo, 'total': ruta_total, 'fuentes': len(fuentes), 'leidos': len(pendientes),
+        'eliminados': len(eliminados), 'reconstruido': manifiesto is None, 'bytes_escritos': 0, 'filas': 0,
+        'omitido': None
+    }
+    if manifiesto is not None and not pendientes and not eliminados:
+        resumen['filas'] = sum(b['filas'] for b in bloques)
+        return resumen
+
+    if manifiesto is None:
+        corte, posicion = 0, len(encabezado)
+        nuevos_bloques, reubicar, restante = [], [], b''
+    else:
+        # Primer tramo afectado: todo lo anterior queda intacto en el archivo
+        afectados = [b['inicio'] for b in bloques if b['archivo'] not in vigentes]
+        corte = min(afectados) if afectados else manifiesto['tamano_total']
+        nuevos_bloques = [b for b in conservados if b['inicio'] < corte]
+        reubicar = [b for b in conservados if b['inicio'] >= corte]
+        restante = b''
+        if reubicar:
+            # Los tramos sin cambios posteriores al corte se releen antes de truncar
+            with fs.open(ruta_total, 'r') as f:
+                f.seek(corte)
+                restante = f.read()
+        posicion = corte
+
+    escritura = []
+    for b in reubicar:
+        desplazamiento = b['inicio'] - corte
+        contenido = restante[desplazamiento:desplazamiento + b['longitud']]
+        nuevos_bloques.append({**b, 'inicio': posicion})
+        escritura.append(contenido)
+        posicion += len(contenido)
+    # Los archivos nuevos o modificados van al final
+    for nombre in pendientes:
+        contenido, filas = _bloque_fuente(fs, _unir(directorio, nombre), tipo, fuentes[nombre]['lapidas'] is not None)
+        nuevos_bloques.append({
+            'archivo': nombre, 'firma': fuentes[nombre], 'inicio': posicion,
+            'longitud': len(contenido), 'filas': filas
+        })
+        escritura.append(contenido)
+        posicion += len(contenido)
+    cola = b''.join(escritura)
+
+    # El total nuevo se arma completo en un temporal: los tramos intactos se copian tal cual y
+    # un lector nunca ve un archivo a medio parchar
+    temporal = f"{ruta_total}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        with fs.open(temporal, 'w') as f:
+            if manifiesto is None:
+                f.write(encabezado)
+            else:
+                with fs.open(ruta_total, 'r') as origen:
+                    _copiar_tramo(origen, f, corte)
+            f.write(cola)
+        # Hora del servidor según el mtime del temporal recién escrito
+        ahora = float(fs.stat(temporal).st_mtime)
+        if _estado(fs, ruta_total) != inicial:
+            # Otro proceso (p. ej. generador*.sh) reescribió el total durante la corrida
+            logging.warning(f"Consolidador {tipo}: {ruta_total} cambió durante la consolidación; se descarta la corrida")
+            fs.remove(temporal)
+            resumen['omitido'] = 'version'
+            return resumen
+        _renombrar(fs, temporal, ruta_total)
+        publicado = _estado(fs, ruta_total)
+    except Exception:
+        try:
+            fs.remove(temporal)
+        except (OSError, IOError):
+            pass
+        raise
+    resumen['bytes_escritos'] = posicion
+
+    # Fuentes modificadas en el último segundo: su firma se invalida para releerlas en la siguiente corrida
+    limite = int(ahora) - 1
+    for b in nuevos_bloques:
+        if b['firma'].get('mtime') is not None and _firma_dudosa(b['firma'], limite):
+            b['firma'] = {**b['firma'], 'mtime': None}
+
+    escribir_manifiesto(fs, ruta_manifiesto, {
+        'version': VERSION_MANIFIESTO,
+        'tipo': tipo,
+        'encabezado': columnas(tipo),
+        'tamano_total': posicion,
+        # Con el tamaño, identifica el total que armó esta corrida (total_consolidado)
+        'mtime_total': publicado[1] if publicado else None,
+        'bloques': nuevos_bloques,
+    })
+    resumen['filas'] = sum(b['filas'] for b in nuevos_bloques)
+    logging.info(
+        f"Consolidador {tipo}: {resumen['leidos']} archivos leídos de {resumen['fuentes']}, "
+        f"{resumen['bytes_escritos']} bytes escritos"
+    )
+    return resumen
+
+# ====================
+# VIGENCIA DEL TOTAL (GENERADOR REMOTO)
+# ====================
+def _fuente_de(nombre: str) -> str:
+    """Nombre del CSV al que pertenece una entrada del listado (el propio CSV o su archivo de lápidas)"""
+    return nombre[:-len(LAPIDAS_SUFFIX)] if nombre.endswith(LAPIDAS_SUFFIX) else nombre
+
+def total_vigente(fs, directorio: str, prefijos: list, total: str) -> tuple:
+    """(vigente, mtime de la fuente más reciente) con un solo listdir_attr: el total está vigente si
+    ningún archivo de investigador (ni sus lápidas) cambió después de generarlo"""
+    listado = {a.filename: a for a in fs.listdir_attr(directorio or '.')}
+    reciente = max(
+        (int(a.st_mtime) for nombre, a in listado.items() if _es_fuente(_fuente_de(nombre), prefijos, total)),
+        default=0
+    )
+    if total not in listado:
+        return False, reciente
+    try:
+        with fs.open(_unir(directorio, f"{total}{SELLO_SUFFIX}"), 'r') as f:
+            sello = json.loads(f.read().decode('utf-8'))
+        # El sello vale mientras nadie haya reescrito el total después de dejarlo
+        if sello.get('total') == int(listado[total].st_mtime):
+            return reciente <= sello['fuentes'], reciente
+    except (OSError, IOError, ValueError, KeyError):
+        pass
+    # Sin sello: mtime contra mtime; en el mismo segundo no se puede saber el orden y se regenera
+    return reciente < int(listado[total].st_mtime), reciente
+
+def sellar_total(fs, directorio: str, total: str, fuentes_mtime: int) -> None:
+    """Guarda junto al total el mtime de la fuente más reciente que incluye (total_vigente lo consulta)"""
+    ruta_total = _unir(directorio, total)
+    try:
+        sello = {'fuentes': int(fuentes_mtime), 'total': int(fs.stat(ruta_total).st_mtime)}
+        temporal = f"{ruta_total}{SELLO_SUFFIX}.tmp"
+        with fs.open(temporal, 'w') as f:
+            f.write(json.dumps(sello).encode('utf-8'))
+        _renombrar(fs, temporal, f"{ruta_total}{SELLO_SUFFIX}")
+    except (OSError, IOError) as e:
+        logging.warning(f"No se pudo guardar el sello de {ruta_total}: {str(e)}")
+
+def hay_cambios(fs, directorio: str, prefijos: list, total: str, local_path: str) -> bool:
+    """True si alguna fuente es más reciente que el total o el total remoto no es el de la copia local;
+    es la consulta barata (un listdir_attr, el sello y un stat) con que los tableros deciden resincronizar"""
+    vigente, _ = total_vigente(fs, directorio, prefijos, total)
+    if not vigente:
+        return True
+    atributos = fs.stat(_unir(directorio, total))
+    return version_descargada(local_path) != (atributos.st_size, atributos.st_mtime)
+
+def prefijos_desde_secrets(prefixes) -> dict:
+    """{tipo: prefijos de sus archivos fuente} a partir de la sección [prefixes] de secrets.toml"""
+    return {
+        tipo: (
+            [prefixes.get('productos', 'productos_'), prefixes.get('manual', 'manual_')] if tipo == 'articulos'
+            else [prefixes.get(tipo, f"{tipo}_")]
+        )
+        for tipo in CONSOLIDADOS
+    }
+
+# ====================
+# LÁPIDAS EN EL TOTAL DEL GENERADOR
+# ====================
+# generador*.sh concatena los CSV tal cual, con todo y las filas que tienen
+# lápida. Al descargar un total que no armó consolidar, se leen las lápidas de
+# sus fuentes y la copia local se reescribe sin esas filas. Se comparan las
+# claves (record_id o huella, aparición) de lapidas.py sobre el total: el
+# record_id es un uuid y la huella incluye el número económico, así que una
+# clave no se repite entre archivos de investigadores distintos. La versión
+# remota descargada queda en <local>.remoto.json para no volver a bajarlo.
+def total_consolidado(fs, ruta_total: str, atributos) -> bool:
+    """True si el total es el que dejó consolidar (sus filas ya vienen sin lápidas)"""
+    manifiesto = leer_manifiesto(fs, f"{ruta_total}{MANIFEST_SUFFIX}")
+    return (
+        manifiesto is not None
+        and manifiesto['tamano_total'] == int(atributos.st_size)
+        and manifiesto.get('mtime_total') == float(atributos.st_mtime)
+    )
+
+def lapidas_del_total(fs, directorio: str, prefijos: list, total: str) -> set:
+    """Unión de las lápidas de los archivos fuente del total"""
+    lapidas = set()
+    for atributos in fs.listdir_attr(directorio or '.'):
+        nombre = atributos.filename
+        if nombre.endswith(LAPIDAS_SUFFIX) and _es_fuente(_fuente_de(nombre), prefijos, total):
+            with fs.open(_unir(directorio, nombre), 'r') as f:
+                lapidas |= parsear_lapidas(f.read().decode('utf-8'))
+    return lapidas
+
+def version_descargada(local_path: str):
+    """(tamaño, mtime) remotos de la copia local: los guardados si se reescribió sin lápidas, si no los propios"""
+    try:
+        estado = os.stat(local_path)
+    except FileNotFoundError:
+        return None
+    try:
+        with open(f"{local_path}{DESCARGA_SUFFIX}", 'r', encoding='utf-8') as f:
+            descarga = json.load(f)
+        # Solo vale para la copia que se escribió junto con él
+        if descarga['local'] == [estado.st_size, estado.st_mtime]:
+            return tuple(descarga['remoto'])
+    except (OSError, ValueError, KeyError):
+        pass
+    return (estado.st_size, estado.st_mtime)
+
+def quitar_bajas_total(fs, directorio: str, total: str, tipo: str, prefijos: list, local_path: str) -> int:
+    """Reescribe la copia local recién descargada del total sin las filas con lápida; devuelve cuántas quitó"""
+    ruta_descarga = f"{local_path}{DESCARGA_SUFFIX}"
+    if os.path.exists(ruta_descarga):
+        os.remove(ruta_descarga)
+    ruta_total = _unir(directorio, total)
+    atributos = fs.stat(ruta_total)
+    if total_consolidado(fs, ruta_total, atributos):
+        return 0
+    lapidas = lapidas_del_total(fs, directorio, prefijos, total)
+    if not lapidas:
+        return 0
+    try:
+        df = pd.read_csv(local_path, encoding='utf-8-sig', names=nombres_completos(tipo, local_path), header=0,
+                         dtype=str, keep_default_na=False)
+        df.columns = df.columns.str.strip()
+    except Exception as e:
+        logging.warning(f"No se pudieron aplicar las lápidas a {local_path}: {str(e)}")
+        return 0
+    bajas = posiciones_con_lapida(claves_columnas(df, columnas(tipo)), lapidas)
+    if not bajas:
+        return 0
+    temporal = f"{local_path}.tmp"
+    df.drop(index=list(bajas)).to_csv(temporal, index=False, encoding='utf-8-sig')
+    os.replace(temporal, local_path)
+    estado = os.stat(local_path)
+    with open(ruta_descarga, 'w', encoding='utf-8') as f:
+        json.dump({
+            'remoto': [atributos.st_size, atributos.st_mtime],
+            'local': [estado.st_size, estado.st_mtime]
+        }, f)
+    logging.info(f"{local_path}: {len(bajas)} filas con lápida fuera de la copia local")
+    return len(bajas)
+
+def main():
+    parser = argparse.ArgumentParser(description="Consolida de forma incremental los CSV por investigador en el *_total.csv")
+    parser.add_argument('tipos', nargs='*', default=list(CONSOLIDADOS), help="articulos, tesis, libros, capitulos, congresos")
+    parser.add_argument('--dir', default='.', help="Directorio con los CSV (el del servidor o su copia local)")
+    parser.add_argument('--prefijo', action='append', help="Prefijo de los archivos fuente (se puede repetir)")
+    parser.add_argument('--total', help="Nombre del archivo consolidado")
+    parser.add_argument('--completo', action='store_true', help="Ignorar el manifiesto y reconstruir todo")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    fs = DirectorioLocal()
+    for tipo in args.tipos:
+        resumen = consolidar(fs, args.dir, tipo, prefijos=args.prefijo, total=args.total, completo=args.completo)
+        accion = resumen['omitido'] and f"omitido ({resumen['omitido']})" or ('reconstruido' if resumen['reconstruido'] else ('actualizado' if resumen['bytes_escritos'] else 'sin cambios'))
+        print(f"{tipo}: {accion}; {resumen['leidos']}/{resumen['fuentes']} archivos leídos, "
+              f"{resumen['filas']} filas, {resumen['bytes_escritos']} bytes escritos -> {resumen['total']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import pandas as pd
+
+from metricas_vectorizadas import metricas
+from duplicados import COLUMNA_GRUPO
+
+# ====================
+# CUBO MENSUAL PREAGREGADO
+# ====================
+# Conteos y sumas de métricas por mes × investigador × departamento × dimensión
+# propia del producto (grupo JCR, tipo de tesis, editorial, tipo de congreso).
+# Se arma una vez por versión del total; cualquier periodo del selector se
+# responde sumando la rebanada de meses, sin volver a filtrar, deduplicar ni
+# calcular métricas sobre las filas. Un trabajo (su cluster_id si df lo trae,
+# si no el título) cuenta como único en la primera fila de cada periodo en que
+# aparece, en el orden por fecha del índice de periodos; cada celda guarda
+# además el periodo de su aparición anterior ('anterior'). Una rebanada toma
+# como únicas las filas sin aparición anterior dentro de ella, que son las que
+# drop_duplicates deja en los tableros al cortar el mismo periodo. Tesis se
+# agrega por año y congresos por día, como sus selectores.
+
+CUBOS = {
+    'articulos': {
+        'fecha': 'pub_date', 'titulo': 'article_title', 'investigador': 'investigator_name',
+        'dimension': 'jcr_group', 'metricas': ['ICR', 'CC', 'IRT', 'PI'],
+    },
+    'tesis': {
+        'fecha': 'year', 'periodo': 'Y', 'titulo': 'titulo_tesis', 'investigador': 'economic_number',
+        'dimension': 'tipo_tesis', 'metricas': ['ICT', 'CC', 'IRT', 'PI'],
+    },
+    'libros': {
+        'fecha': 'pub_date', 'titulo': 'titulo_libro', 'investigador': 'autor_principal',
+        'dimension': 'editorial', 'metricas': ['ICE', 'CI', 'IRT', 'PI'],
+    },
+    'capitulos': {
+        'fecha': 'pub_date', 'titulo': 'titulo_capitulo', 'investigador': 'autor_principal',
+        'dimension': 'editorial', 'metricas': ['ICE', 'CC', 'IRT', 'PI'],
+    },
+    'congresos': {
+        'fecha': 'fecha_exacta_congreso', 'periodo': 'D', 'titulo': 'titulo_presentacion', 'investigador': 'economic_number',
+        'dimension': 'tipo_congreso', 'metricas': ['IPC', 'CI', 'IRT', 'PI'],
+    },
+}
+
+def construir_cubo(tipo: str, df: pd.DataFrame, categorias: dict = None, terminos: pd.DataFrame = None) -> pd.DataFrame:
+    """Cubo (periodo, investigador, departamento, dimensión, anterior) con 'registros', 'unicos' y la suma de cada métrica"""
+    definicion = CUBOS[tipo]
+    clave = COLUMNA_GRUPO if COLUMNA_GRUPO in df.columns else definicion['titulo']
+    # Mismo orden que IndicePeriodo: las primeras apariciones son las de los tableros
+    df = df.sort_values(definicion['fecha'], kind='stable', na_position='last')
+
+    if definicion.get('periodo') == 'Y':
+        periodo = df[definicion['fecha']].astype('Int64')
+    else:
+        periodo = df[definicion['fecha']].dt.to_period(definicion.get('periodo', 'M'))
+    # Periodo de la aparición anterior del mismo trabajo (nulo en la primera)
+    anterior = periodo.groupby(df[clave].to_numpy(), sort=False, dropna=False).shift(1)
+    primera = anterior.isna() | (anterior != periodo)
+    unicos = metricas(tipo, df[primera], categorias=categorias, terminos=terminos)
+    dimensiones = ['periodo'] + [c for c in (definicion['investigador'], 'departamento', definicion['dimension']) if c in df.columns]
+
+    base = df[dimensiones[1:]].assign(
+        periodo=periodo, anterior=anterior.where(primera), registros=1, unicos=primera.astype(int)
+    )
+    for columna in definicion['metricas']:
+        # Solo las primeras apariciones de cada periodo suman; las demás filas aportan 0
+        base[columna] = unicos[columna].reindex(df.index, fill_value=0.0)
+    return (
+        base.groupby(dimensiones + ['anterior'], observed=True, dropna=False, sort=True)
+        [['registros', 'unicos'] + definicion['metricas']].sum()
+        .reset_index()
+    )
+
+def _limite(periodo: pd.Series, valor):
+    """Fecha del selector llevada a la frecuencia del cubo (el año tal cual en tesis)"""
+    if valor is None or not isinstance(periodo.dtype, pd.PeriodDtype):
+        return valor
+    return pd.Timestamp(valor).to_period(periodo.dtype.freq)
+
+def rebanada(cubo: pd.DataFrame, desde=None, hasta=None) -> pd.DataFrame:
+    """Celdas del cubo entre dos fechas inclusive, llevadas a su mes (o día); años en tesis"""
+    periodo = cubo['periodo']
+    desde, hasta = _limite(periodo, desde), _limite(periodo, hasta)
+    mascara = pd.Series(True, index=cubo.index)
+    if desde is not None:
+        mascara &= periodo >= desde
+    if hasta is not None:
+        mascara &= periodo <= hasta
+    return cubo[mascara.fillna(False)]
+
+def por_investigador(tipo: str, cubo: pd.DataFrame, desde=None, hasta=None) -> pd.DataFrame:
+    """Promedio de cada métrica y número de productos únicos por investigador en el periodo
+    (mismas columnas que el groupby sobre los únicos del periodo en los tableros)"""
+    definicion = CUBOS[tipo]
+    celdas = rebanada(cubo, desde, hasta)
+    # Únicos del periodo: filas cuya aparición anterior (si la hay) queda antes de 'desde'
+    nuevas = celdas['anterior'].isna()
+    if desde is not None:
+        nuevas |= (celdas['anterior'] < _limite(cubo['periodo'], desde)).fillna(False)
+    sumas = celdas[nuevas].groupby(definicion['investigador'], observed=True)[
+        definicion['metricas'] + ['unicos']
+    ].sum()
+    sumas = sumas[sumas['unicos'] > 0]
+    resultado = sumas[definicion['metricas']].div(sumas['unicos'], axis=0)
+    resultado[definicion['titulo']] = sumas['unicos']
+    return resultado.reset_index()
@@ -0,0 +1,371 @@
+import os
+import json
+import time
+import uuid
+import logging
+import importlib
+import threading
+from functools import partial
+from pathlib import Path
+from datetime import datetime
+
+import pandas as pd
+
+import transaccion_guardado
+from esquemas import COLUMNA_ID
+from lapidas import agregar_pendientes, descartar_pendientes, leer_lapidas, sincronizar_lapidas
+from transaccion_guardado import (
+    actualizar_remoto, claves_columnas, con_ids, descartar_cambios_locales, escribir_atomico, fusionar,
+    huellas_filas, ids_registros, leer_base, leer_csv_texto, subir_con_version, traer_si_cambio
+)
+
+# ====================
+# MODO SIN CONEXIÓN Y DIARIO DE CAMBIOS
+# ====================
+# Sin conexión (elegido por el usuario o tras un fallo) las aplicaciones de
+# captura no intentan la red: cada alta o baja se aplica a la copia local y se
+# anota en <csv>.diario.jsonl. Un hilo reconciliador prueba la conexión cada
+# INTERVALO_RECONCILIACION segundos y reproduce cada diario en orden sobre la
+# versión remota vigente: reconstruye la copia local desde el servidor, vuelve
+# a aplicar las entradas detectando conflictos (altas ya presentes, bajas de
+# registros que ya no existen) y sube una sola vez con control de versión.
+# Los archivos laterales de un alta se anotan con ella si su actualización es
+# un functools.partial de una función de módulo, y se publican tras el CSV.
+# Antes de reconstruir la copia local se comprueba que todo lo que difiere de
+# .base esté en el diario; si no, no se toca y el diario queda pendiente.
+DIARIO_SUFFIX = ".diario.jsonl"
+INTERVALO_RECONCILIACION = 60
+# Tras un fallo de conexión, las acciones no vuelven a intentar la red durante este tiempo
+ESPERA_TRAS_FALLO = 300
+
+_candados = {}
+_candado_candados = threading.Lock()
+
+def _candado(local_path: str) -> threading.Lock:
+    """Un candado por archivo: la sesión y el reconciliador no reproducen ni anotan a la vez"""
+    with _candado_candados:
+        return _candados.setdefault(os.path.abspath(local_path), threading.Lock())
+
+class EstadoConexion:
+    _instancia = None
+    _candado = threading.Lock()
+
+    def __new__(cls):
+        with cls._candado:
+            if cls._instancia is None:
+                cls._instancia = super().__new__(cls)
+                cls._instancia._fallo_hasta = 0.0
+                cls._instancia.sin_conexion = False
+            return cls._instancia
+
+    def disponible(self) -> bool:
+        return time.time() >= self._fallo_hasta
+
+    def fijar_sin_conexion(self, valor: bool) -> None:
+        """Modo sin conexión elegido en la última sesión que lo cambió; el reconciliador no usa la red mientras rija"""
+        self.sin_conexion = bool(valor)
+
+    def registrar_fallo(self) -> None:
+        self._fallo_hasta = time.time() + ESPERA_TRAS_FALLO
+
+    def registrar_exito(self) -> None:
+        self._fallo_hasta = 0.0
+
+    def conectar(self, conectar, probar: bool = False):
+        """conectar() salvo durante la espera tras un fallo (probar=True la ignora); actualiza el estado"""
+        if not probar and not self.disponible():
+            return None
+        ssh = conectar()
+        if ssh:
+            self.registrar_exito()
+        else:
+            self.registrar_fallo()
+        return ssh
+
+ESTADO_CONEXION = EstadoConexion()
+
+# ====================
+# DIARIO
+# ====================
+def ruta_diario(local_path: str) -> str:
+    return f"{local_path}{DIARIO_SUFFIX}"
+
+def leer_diario(local_path: str) -> list:
+    ruta = ruta_diario(local_path)
+    if not Path(ruta).exists():
+        return []
+    entradas = []
+    with open(ruta, 'r', encoding='utf-8') as f:
+        for linea in f:
+            try:
+                entradas.append(json.loads(linea))
+            except ValueError:
+                logging.warning(f"Línea dañada en el diario {ruta}; se omite")
+    return entradas
+
+def describir_lateral(remote_path: str, actualizar):
+    """Actualización de un archivo lateral como dict para el diario; None si no es un partial de una función de módulo"""
+    if not isinstance(actualizar, partial) or '<' in actualizar.func.__qualname__:
+        return None
+    descripcion = {
+        'remoto': remote_path,
+        'funcion': f"{actualizar.func.__module__}:{actualizar.func.__qualname__}",
+        'argumentos': list(actualizar.args),
+        'opciones': dict(actualizar.keywords),
+    }
+    try:
+        json.dumps(descripcion, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return None
+    return descripcion
+
+def lateral_anotado(descripcion: dict):
+    """(ruta remota, actualización) de un lateral anotado con describir_lateral"""
+    modulo, nombre = descripcion['funcion'].split(':')
+    funcion = getattr(importlib.import_module(modulo), nombre)
+    return descripcion['remoto'], partial(funcion, *descripcion['argumentos'], **descripcion['opciones'])
+
+def anotar(local_path: str, remote_path: str, columns: list, operacion: str,
+           registros: list = None, claves: list = None, laterales: list = None) -> None:
+    """Agrega una entrada al diario ('alta' con registros y sus laterales o 'baja' con claves de lapidas)"""
+    entrada = {
+        'id': uuid.uuid4().hex,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'operacion': operacion,
+        'remoto': remote_path,
+        'columnas': list(columns),
+    }
+    if registros is not None:
+        entrada['registros'] = registros
+    if claves is not None:
+        entrada['claves'] = [list(clave) for clave in claves]
+    if laterales:
+        entrada['laterales'] = laterales
+    with open(ruta_diario(local_path), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entrada, ensure_ascii=False, default=str) + '\n')
+
+def _retirar_entradas(local_path: str, ids: set) -> None:
+    """Quita las entradas reproducidas; conserva las que se anotaron durante la reproducción"""
+    restantes = [e for e in leer_diario(local_path) if e['id'] not in ids]
+    ruta = ruta_diario(local_path)
+    if not restantes:
+        os.remove(ruta)
+        return
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        for entrada in restantes:
+            f.write(json.dumps(entrada, ensure_ascii=False, default=str) + '\n')
+    os.replace(temporal, ruta)
+
+def archivos_con_diario(directorio: str = '.') -> list:
+    """CSV locales con cambios anotados pendientes de enviar"""
+    return sorted(str(ruta)[:-len(DIARIO_SUFFIX)] for ruta in Path(directorio).glob(f"*{DIARIO_SUFFIX}"))
+
+def cambios_pendientes(directorio: str = '.') -> int:
+    return sum(len(leer_diario(local_path)) for local_path in archivos_con_diario(directorio))
+
+# ====================
+# REPRODUCCIÓN
+# ====================
+def _aplicar_alta(local_path: str, columns: list, entrada: dict, conflictos: list) -> None:
+    df = leer_csv_texto(local_path, columns).reindex(columns=columns, fill_value='')
+    # Repetido: el mismo record_id (ya se había subido) o el mismo contenido (otra sesión lo capturó)
+    existentes = set(ids_registros(df, columns)) | set(huellas_filas(df, columns))
+    # fusionar normaliza los registros igual que al guardarlos
+    nuevos = fusionar(pd.DataFrame(columns=columns), entrada.get('registros', []), columns)
+    duplicados = [
+        posicion
+        for posicion, (identificador, huella) in enumerate(zip(ids_registros(nuevos, columns), huellas_filas(nuevos, columns)))
+        if identificador in existentes or huella in existentes
+    ]
+    for posicion in duplicados:
+        conflictos.append({'entrada': entrada['id'], 'operacion': 'alta', 'motivo': 'el registro ya existe en el servidor'})
+    nuevos = nuevos.drop(index=nuevos.index[duplicados])
+    escribir_atomico(fusionar(df, nuevos.to_dict('records'), columns), local_path)
+
+def _aplicar_baja(local_path: str, columns: list, entrada: dict, conflictos: list) -> None:
+    vigentes = set(claves_columnas(leer_csv_texto(local_path, columns), columns))
+    claves = {tuple(clave) for clave in entrada.get('claves', [])}
+    for clave in claves - vigentes:
+        conflictos.append({'entrada': entrada['id'], 'operacion': 'baja', 'motivo': 'el registro ya no existe en el servidor'})
+    faltantes = (claves & vigentes) - leer_lapidas(local_path)
+    if faltantes:
+        agregar_pendientes(local_path, faltantes)
+
+def sin_anotar(local_path: str, columns: list, entradas: list) -> int:
+    """Filas de la copia local que no vienen de .base ni de las altas del diario, más las filas vigentes de
+    .base que faltan en la copia local (0: la copia local se puede reconstruir desde el remoto sin perder nada)"""
+    def registros(df):
+        return set(zip(ids_registros(df, columns), huellas_filas(df, columns)))
+
+    local = leer_csv_texto(local_path, columns).reindex(columns=columns, fill_value='')
+    base = leer_base(local_path, columns).reindex(columns=columns, fill_value='')
+    # Las altas anotadas ya traen record_id (con_ids antes de anotar)
+    anotados = {
+        str(registro.get(COLUMNA_ID, '')) for entrada in entradas if entrada['operacion'] == 'alta'
+        for registro in entrada.get('registros', [])
+    }
+    # fusionar quita de la copia local las filas con estado 'X' al guardar
+    vigentes_base = base[base['estado'] != 'X'] if 'estado' in base.columns else base
+    en_local = registros(local)
+    nuevos = [identificador for identificador, _ in en_local - registros(base) if identificador not in anotados]
+    return len(nuevos) + len(registros(vigentes_base) - en_local)
+
+def reproducir(conectar, local_path: str) -> dict:
+    """Reproduce en orden el diario de un archivo sobre la versión remota vigente, en una conexión"""
+    resultado = {'entradas': 0, 'conflictos': [], 'subido': False, 'error': ''}
+    with _candado(local_path):
+        entradas = leer_diario(local_path)
+        resultado['entradas'] = len(entradas)
+        if not entradas:
+            resultado['subido'] = True
+            return resultado
+        remote_path, columns = entradas[0]['remoto'], entradas[0]['columnas']
+
+        faltantes = sin_anotar(local_path, columns, entradas)
+        if faltantes:
+            # Reconstruir desde el remoto perdería cambios que no están en el diario
+            resultado['error'] = "cambios locales sin anotar"
+            logging.error(f"{local_path} tiene {faltantes} fila(s) que no están en .base ni en el diario; no se reproduce")
+            return resultado
+
+        ssh = conectar()
+        if not ssh:
+            resultado['error'] = "sin conexión"
+            return resultado
+        try:
+            with ssh.open_sftp() as sftp:
+                # Todos los cambios sin subir están en el diario (sin_anotar): se parte del contenido remoto
+                descartar_cambios_locales(local_path)
+                traer_si_cambio(sftp, remote_path, local_path, columns)
+                # Las bajas anotadas se comprueban contra el remoto antes de publicarlas (_aplicar_baja)
+                descartar_pendientes(local_path, {
+                    tuple(clave) for entrada in entradas if entrada['operacion'] == 'baja' for clave in entrada.get('claves', [])
+                })
+                for entrada in entradas:
+                    if entrada['operacion'] == 'alta':
+                        _aplicar_alta(local_path, columns, entrada, resultado['conflictos'])
+                    elif entrada['operacion'] == 'baja':
+                        _aplicar_baja(local_path, columns, entrada, resultado['conflictos'])
+                subir_con_version(sftp, local_path, remote_path, columns)
+                sincronizar_lapidas(sftp, remote_path, local_path)
+                # Laterales de las altas, en orden y con control de versión como en guardar_registros
+                for entrada in entradas:
+                    for descripcion in entrada.get('laterales', []):
+                        actualizar_remoto(sftp, *lateral_anotado(descripcion))
+            _retirar_entradas(local_path, {e['id'] for e in entradas})
+            resultado['subido'] = True
+        except Exception as e:
+            resultado['error'] = str(e)
+            logging.error(f"Error al reproducir el diario de {local_path}: {str(e)}")
+        finally:
+            ssh.close()
+
+    for conflicto in resultado['conflictos']:
+        logging.warning(f"Conflicto al reproducir {local_path}: {conflicto['operacion']}, {conflicto['motivo']}")
+    logging.info(
+        f"Diario {local_path}: {resultado['entradas']} entradas, {len(resultado['conflictos'])} conflictos, "
+        f"subido={resultado['subido']}"
+    )
+    return resultado
+
+# ====================
+# OPERACIONES CON DIARIO (MISMA FIRMA QUE transaccion_guardado)
+# ====================
+def _sin_red():
+    return None
+
+def sincronizar(conectar, remote_path: str, local_path: str, columns: list = None) -> bool:
+    """Como transaccion_guardado.sincronizar; si hay cambios anotados, primero los reproduce"""
+    if leer_diario(local_path):
+        return reproducir(conectar, local_path)['subido']
+    return transaccion_guardado.sincronizar(conectar, remote_path, local_path, columns)
+
+def guardar_registros(conectar, local_path: str, remote_path: str, columns: list, registros: list, **opciones) -> dict:
+    """Como transaccion_guardado.guardar_registros; si no se pudo subir, el alta queda anotada en el diario.
+    Mientras haya entradas previas sin enviar no se sube nada, para respetar el orden."""
+    # El record_id se asigna antes de anotar: al reproducir, el registro conserva el mismo
+    registros = con_ids(registros)
+    if leer_diario(local_path):
+        reproducir(conectar, local_path)
+    with _candado(local_path):
+        pendiente = bool(leer_diario(local_path))
+        resultado = transaccion_guardado.guardar_registros(
+            _sin_red if pendiente else conectar, local_path, remote_path, columns, registros, **opciones
+        )
+        resultado['diario'] = resultado['escrito'] and not resultado['subido']
+        if resultado['diario']:
+            laterales = [(ruta, describir_lateral(ruta, actualizar)) for ruta, actualizar in (opciones.get('laterales') or {}).items()]
+            for ruta, descripcion in laterales:
+                if descripcion is None:
+                    logging.warning(f"Sin conexión: el lateral {ruta} de {local_path} no se puede anotar y no se publicará")
+            anotar(local_path, remote_path, columns, 'alta', registros=registros,
+                   laterales=[descripcion for _, descripcion in laterales if descripcion is not None])
+    return resultado
+
+def dar_de_baja(conectar, local_path: str, remote_path: str, posiciones, columns: list = None) -> dict:
+    """Como transaccion_guardado.dar_de_baja; si no se pudo publicar, la baja queda anotada en el diario.
+    'aplicada' indica que la baja ya rige en la copia local (publicada o anotada)."""
+    if leer_diario(local_path):
+        reproducir(conectar, local_path)
+    with _candado(local_path):
+        columns = columns or list(leer_csv_texto(local_path).columns)
+        claves = claves_columnas(leer_csv_texto(local_path, columns), columns)
+        seleccion = [claves[p] for p in posiciones if 0 <= p < len(claves)]
+        pendiente = bool(leer_diario(local_path))
+        resultado = transaccion_guardado.dar_de_baja(
+            _sin_red if pendiente else conectar, local_path, remote_path, posiciones, columns
+        )
+        resultado['diario'] = not resultado['subido'] and bool(seleccion)
+        if resultado['diario']:
+            anotar(local_path, remote_path, columns, 'baja', claves=seleccion)
+        resultado['aplicada'] = resultado['subido'] or resultado['diario']
+    return resultado
+
+# ====================
+# RECONCILIADOR EN SEGUNDO PLANO
+# ====================
+class Reconciliador:
+    _instancia = None
+    _candado = threading.Lock()
+
+    def __new__(cls):
+        # Un hilo por proceso, compartido por todas las sesiones de Streamlit
+        with cls._candado:
+            if cls._instancia is None:
+                cls._instancia = super().__new__(cls)
+                cls._instancia._hilo = None
+            return cls._instancia
+
+    def iniciar(self, conectar, directorio: str = '.', intervalo: int = INTERVALO_RECONCILIACION) -> None:
+        """Arranca el hilo si no está corriendo (conectar: la conexión directa, sin llamadas a Streamlit, porque
+        el hilo no tiene ScriptRunContext; el modo sin conexión llega por ESTADO_CONEXION.fijar_sin_conexion)"""
+        with self._candado:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            self.conectar = conectar
+            self.directorio = directorio
+            self.intervalo = intervalo
+            self._hilo = threading.Thread(target=self._ciclo, name="reconciliador-diario", daemon=True)
+            self._hilo.start()
+
+    def _ciclo(self) -> None:
+        while True:
+            time.sleep(self.intervalo)
+            if ESTADO_CONEXION.sin_conexion:
+                # Modo sin conexión elegido: ni siquiera se prueba la red
+                continue
+            try:
+                self.reconciliar()
+            except Exception as e:
+                logging.error(f"Error en el reconciliador: {str(e)}")
+
+    def reconciliar(self) -> list:
+        """Reproduce los diarios pendientes; se detiene en el primer archivo sin conexión"""
+        resultados = []
+        for local_path in archivos_con_diario(self.directorio):
+            resultado = reproducir(lambda: ESTADO_CONEXION.conectar(self.conectar, probar=True), local_path)
+            resultados.append((local_path, resultado))
+            if resultado['error'] == "sin conexión":
+                break
+        return resultados
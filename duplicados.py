@@ -0,0 +1,214 @@
+import re
+import zlib
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from lineas_investigacion import normalizar_texto
+
+# ====================
+# AGRUPACIÓN DE CASI DUPLICADOS (MINHASH + LSH)
+# ====================
+# El mismo trabajo capturado por varios coautores llega con otro uso de
+# mayúsculas, signos o truncado, y drop_duplicates por título lo contaba una
+# vez por captura. Aquí cada registro recibe un cluster_id:
+#   1. Títulos normalizados (minúsculas, sin acentos ni signos) iguales caen en
+#      el mismo grupo; lo demás se calcula una vez por título distinto.
+#   2. Firma MinHash de los k-gramas de caracteres de cada título y LSH por
+#      bandas: solo se comparan los títulos que comparten alguna banda, así que
+#      el costo crece casi linealmente con el historial. Un candidato se une si
+#      la similitud estimada de Jaccard alcanza UMBRAL_SIMILITUD y lo confirma
+#      el Jaccard exacto de sus k-gramas, con los mismos números en ambos
+#      títulos ('... 2019 update' y '... 2020 update' son trabajos distintos).
+#      Así cada unión es un par realmente parecido y union-find no encadena
+#      ediciones o años distintos por la estimación de MinHash.
+#   3. DOI, PMID (artículos) e ISBN (libros) son claves fuertes: los registros
+#      que las comparten se unen aunque el título difiera.
+# Los grupos se cierran con union-find; cluster_id es el número del grupo en
+# orden de primera aparición y solo es estable dentro de una versión del total.
+COLUMNA_GRUPO = 'cluster_id'
+
+TITULOS = {
+    'articulos': 'article_title',
+    'tesis': 'titulo_tesis',
+    'libros': 'titulo_libro',
+    'capitulos': 'titulo_capitulo',
+    'congresos': 'titulo_presentacion',
+}
+# En capítulos el ISBN es del libro (lo comparten todos sus capítulos): no es clave
+CLAVES_FUERTES = {
+    'articulos': ['doi', 'pmid'],
+    'libros': ['isbn_issn'],
+}
+
+K_SHINGLE = 5
+PERMUTACIONES = 64
+# 16 bandas de 4 filas: con Jaccard 0.7 un par es candidato con probabilidad ≈ 0.99, con 0.3 ≈ 0.12
+BANDAS = 16
+UMBRAL_SIMILITUD = 0.7
+_PRIMO = np.uint64(4294967291)  # mayor primo menor que 2^32
+
+_PREFIJO_DOI = re.compile(r'^(https?://)?(dx\.)?doi\.org/|^doi:\s*', re.IGNORECASE)
+_NO_ALFANUMERICO = re.compile(r'[^0-9a-z]+')
+_NUMERO = re.compile(r'\d+')
+
+def normalizar_clave(columna: str, valor) -> str:
+    """DOI sin prefijo de URL y en minúsculas; PMID e ISBN solo con dígitos (y X); '' si no hay valor"""
+    if not isinstance(valor, str) or not valor.strip():
+        return ''
+    valor = valor.strip().lower()
+    if columna == 'doi':
+        return _PREFIJO_DOI.sub('', valor).strip()
+    return _NO_ALFANUMERICO.sub('', valor)
+
+def kgramas(titulo: str) -> list:
+    """k-gramas de caracteres del título normalizado; el título entero si es más corto que k"""
+    if len(titulo) <= K_SHINGLE:
+        return [titulo]
+    return [titulo[i:i + K_SHINGLE] for i in range(len(titulo) - K_SHINGLE + 1)]
+
+def firmas_minhash(titulos: list, semilla: int = 0) -> np.ndarray:
+    """Matriz (títulos × PERMUTACIONES) con el mínimo de (a·h + b) mod p sobre los k-gramas de cada título"""
+    gramas = [kgramas(t) for t in titulos]
+    largos = np.array([len(g) for g in gramas], dtype=np.int64)
+    # Cada k-grama distinto se convierte en un hash de 32 bits una sola vez
+    codigos, distintos = pd.factorize(pd.Series([g for lista in gramas for g in lista], dtype=object))
+    hashes = np.array([zlib.crc32(g.encode('utf-8')) for g in distintos], dtype=np.uint64)
+
+    rng = np.random.default_rng(semilla)
+    a = rng.integers(1, 2**31, PERMUTACIONES, dtype=np.uint64)
+    b = rng.integers(0, 2**31, PERMUTACIONES, dtype=np.uint64)
+    # (permutaciones × k-gramas distintos); a < 2^31 y h < 2^32 no desbordan 64 bits y el módulo cabe en 32
+    tabla = ((a[:, None] * hashes + b[:, None]) % _PRIMO).astype(np.uint32)
+
+    # Mínimo por título con reduceat sobre los tramos contiguos de cada título, una permutación a la vez
+    inicio = np.cumsum(largos) - largos
+    firmas = np.empty((len(titulos), PERMUTACIONES), dtype=np.uint32)
+    for k in range(PERMUTACIONES):
+        firmas[:, k] = np.minimum.reduceat(tabla[k][codigos], inicio)
+    return firmas
+
+class UnionFind:
+    """Conjuntos disjuntos con compresión de caminos y unión por tamaño"""
+    def __init__(self, n: int):
+        self.padre = list(range(n))
+        self.tamano = [1] * n
+
+    def raiz(self, x: int) -> int:
+        while self.padre[x] != x:
+            self.padre[x] = self.padre[self.padre[x]]
+            x = self.padre[x]
+        return x
+
+    def unir(self, x: int, y: int) -> None:
+        x, y = self.raiz(x), self.raiz(y)
+        if x == y:
+            return
+        if self.tamano[x] < self.tamano[y]:
+            x, y = y, x
+        self.padre[y] = x
+        self.tamano[x] += self.tamano[y]
+
+def _con_el_primero(claves: np.ndarray) -> tuple:
+    """Pares (i, primero de su grupo) para los elementos cuya clave se repite; grupos por igualdad de clave"""
+    orden = np.argsort(claves, kind='stable')
+    ordenadas = claves[orden]
+    nuevo = np.ones(len(ordenadas), dtype=bool)
+    nuevo[1:] = ordenadas[1:] != ordenadas[:-1]
+    primero = orden[np.maximum.accumulate(np.where(nuevo, np.arange(len(orden)), 0))]
+    repetido = ~nuevo
+    return orden[repetido], primero[repetido]
+
+def pares_candidatos(firmas: np.ndarray) -> tuple:
+    """Pares (i, j) de títulos que comparten alguna banda LSH y cuya similitud estimada alcanza el umbral"""
+    filas = PERMUTACIONES // BANDAS
+    multiplicadores = np.random.default_rng(1).integers(1, 2**63, filas, dtype=np.uint64) | np.uint64(1)
+    firmas_64 = firmas.astype(np.uint64)
+    izquierda, derecha = [], []
+    for banda in range(BANDAS):
+        # Un hash de 64 bits por banda (el desbordamiento de uint64 es intencional)
+        bloque = firmas_64[:, banda * filas:(banda + 1) * filas]
+        with np.errstate(over='ignore'):
+            claves = (bloque * multiplicadores).sum(axis=1)
+        i, j = _con_el_primero(claves)
+        izquierda.append(i)
+        derecha.append(j)
+    i = np.concatenate(izquierda)
+    j = np.concatenate(derecha)
+    if not len(i):
+        return i, j
+    pares = np.unique(np.stack([i, j], axis=1), axis=0)
+    similitud = (firmas[pares[:, 0]] == firmas[pares[:, 1]]).mean(axis=1)
+    pares = pares[similitud >= UMBRAL_SIMILITUD]
+    return pares[:, 0], pares[:, 1]
+
+def confirmar_pares(titulos: list, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """Máscara de los pares candidatos con los mismos números en el título y Jaccard exacto de
+    k-gramas ≥ UMBRAL_SIMILITUD"""
+    confirmados = np.zeros(len(i), dtype=bool)
+    for n, (a, b) in enumerate(zip(i, j)):
+        a, b = titulos[a], titulos[b]
+        if _NUMERO.findall(a) != _NUMERO.findall(b):
+            continue
+        gramas_a, gramas_b = set(kgramas(a)), set(kgramas(b))
+        confirmados[n] = len(gramas_a & gramas_b) >= UMBRAL_SIMILITUD * len(gramas_a | gramas_b)
+    return confirmados
+
+def grupos_duplicados(tipo: str, df: pd.DataFrame) -> np.ndarray:
+    """cluster_id de cada fila de df (0, 1, ... en orden de primera aparición)"""
+    if df.empty:
+        return np.zeros(0, dtype=np.int64)
+    # 1. Títulos normalizados: un nodo por título distinto
+    codigos_crudos, crudos = pd.factorize(df[TITULOS[tipo]].astype(object))
+    normalizados = np.array([normalizar_texto(t) if isinstance(t, str) else '' for t in crudos] + [''], dtype=object)
+    # El sentinela -1 (título nulo) toma el último elemento: ''
+    codigos, titulos = pd.factorize(normalizados[codigos_crudos])
+    grupos = UnionFind(len(titulos))
+
+    # 2. MinHash + LSH sobre los títulos no vacíos
+    con_texto = np.flatnonzero(np.asarray(titulos, dtype=object) != '')
+    if len(con_texto) > 1:
+        textos = [titulos[k] for k in con_texto]
+        i, j = pares_candidatos(firmas_minhash(textos))
+        confirmados = confirmar_pares(textos, i, j)
+        for a, b in zip(i[confirmados], j[confirmados]):
+            grupos.unir(int(con_texto[a]), int(con_texto[b]))
+
+    # 3. Claves fuertes: une los títulos de las filas que comparten DOI, PMID o ISBN
+    for columna in CLAVES_FUERTES.get(tipo, []):
+        if columna not in df.columns:
+            continue
+        claves = df[columna].map(lambda v: normalizar_clave(columna, v)).to_numpy(dtype=object)
+        presentes = np.flatnonzero(claves != '')
+        if len(presentes):
+            codigos_clave = pd.factorize(claves[presentes])[0]
+            for i, j in zip(*_con_el_primero(codigos_clave)):
+                grupos.unir(int(codigos[presentes[i]]), int(codigos[presentes[j]]))
+
+    raices = np.array([grupos.raiz(k) for k in range(len(titulos))], dtype=np.int64)
+    return pd.factorize(raices[codigos])[0]
+
+def con_grupos(tipo: str, df: pd.DataFrame) -> pd.DataFrame:
+    """df con la columna cluster_id"""
+    return df.assign(**{COLUMNA_GRUPO: grupos_duplicados(tipo, df)})
+
+def main():
+    from esquemas import leer_csv
+    parser = argparse.ArgumentParser(description="Agrupa los casi duplicados de un *_total.csv y muestra los grupos")
+    parser.add_argument('tipo', choices=list(TITULOS))
+    parser.add_argument('csv', help="Ruta del total (p. ej. articulos_total.csv)")
+    parser.add_argument('--mostrar', type=int, default=20, help="Grupos con más de un título a mostrar")
+    args = parser.parse_args()
+
+    df = con_grupos(args.tipo, leer_csv(args.tipo, args.csv))
+    titulo = TITULOS[args.tipo]
+    print(f"{len(df)} registros, {df[titulo].nunique()} títulos exactos, {df[COLUMNA_GRUPO].nunique()} trabajos")
+    variantes = df.groupby(COLUMNA_GRUPO)[titulo].nunique()
+    for grupo in variantes[variantes > 1].index[:args.mostrar]:
+        print(f"\n[{grupo}]")
+        for t in df.loc[df[COLUMNA_GRUPO] == grupo, titulo].drop_duplicates():
+            print(f"  {t}")
+
+if __name__ == "__main__":
+    main()
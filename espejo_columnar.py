@@ -0,0 +1,200 @@
+import os
+import json
+import shutil
+import logging
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+from esquemas import columnas, leer_csv, tipar
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    PYARROW_DISPONIBLE = True
+except ImportError:
+    # pyarrow es opcional: sin él los tableros siguen leyendo el CSV completo
+    PYARROW_DISPONIBLE = False
+
+# ====================
+# ESPEJO COLUMNAR (PARQUET) DE LOS *_total.csv
+# ====================
+# Junto a cada archivo consolidado se mantiene un directorio Parquet ordenado
+# por fecha y particionado por año (anio=AAAA/). Los tableros leen de él solo
+# las columnas que usan y, gracias a la partición y a las estadísticas de cada
+# grupo de filas, solo el periodo seleccionado. El espejo se regenera cuando
+# cambia el tamaño o la fecha de modificación del CSV.
+ESPEJOS = {
+    'articulos': {'csv': 'articulos_total.csv', 'fecha': 'pub_date'},
+    'tesis': {'csv': 'tesis_total.csv', 'fecha': 'pub_date'},
+    'libros': {'csv': 'libros_total.csv', 'fecha': 'pub_date'},
+    'capitulos': {'csv': 'capitulos_total.csv', 'fecha': 'pub_date'},
+    'congresos': {'csv': 'pro_congresos_total.csv', 'fecha': 'fecha_exacta_congreso'},
+}
+COLUMNA_PARTICION = 'anio'
+FILAS_POR_GRUPO = 4096
+FIRMA_ESPEJO = "_origen.json"
+
+def _particion():
+    return ds.partitioning(pa.schema([(COLUMNA_PARTICION, pa.int64())]), flavor='hive')
+
+def _dataset(csv_path: str):
+    # FIRMA_ESPEJO empieza con '_' y ds.dataset lo ignora
+    return ds.dataset(ruta_espejo(csv_path), format='parquet', partitioning=_particion())
+
+def ruta_espejo(csv_path: str) -> str:
+    """articulos_total.csv -> articulos_total.parquet (directorio)"""
+    return str(Path(csv_path).with_suffix('.parquet'))
+
+def _firma_csv(csv_path: str) -> dict:
+    estado = os.stat(csv_path)
+    return {'size': estado.st_size, 'mtime': estado.st_mtime}
+
+def _firma_espejo(directorio: str):
+    try:
+        with open(os.path.join(directorio, FIRMA_ESPEJO), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def espejo_vigente(tipo: str, csv_path: str = None) -> bool:
+    """True si el espejo existe y corresponde a la versión actual del CSV"""
+    csv_path = csv_path or ESPEJOS[tipo]['csv']
+    if not Path(csv_path).exists():
+        return False
+    return _firma_espejo(ruta_espejo(csv_path)) == _firma_csv(csv_path)
+
+def actualizar_espejo(tipo: str, csv_path: str = None, forzar: bool = False) -> bool:
+    """Regenera el espejo Parquet si el CSV cambió; devuelve True si hay un espejo vigente para leer"""
+    if not PYARROW_DISPONIBLE:
+        return False
+    csv_path = csv_path or ESPEJOS[tipo]['csv']
+    if not Path(csv_path).exists():
+        return False
+    if not forzar and espejo_vigente(tipo, csv_path):
+        return True
+
+    destino = ruta_espejo(csv_path)
+    temporal = f"{destino}.tmp-{os.getpid()}"
+    anterior = f"{destino}.old-{os.getpid()}"
+    try:
+        firma = _firma_csv(csv_path)
+        fecha = ESPEJOS[tipo]['fecha']
+        df = leer_csv(tipo, csv_path)
+        # Orden por fecha: cada grupo de filas cubre un intervalo estrecho y el filtro lo descarta sin leerlo
+        df = df.sort_values(fecha, kind='stable', na_position='last').reset_index(drop=True)
+        df[COLUMNA_PARTICION] = df[fecha].dt.year.astype('Int64')
+
+        tabla = pa.Table.from_pandas(df, preserve_index=False)
+        shutil.rmtree(temporal, ignore_errors=True)
+        ds.write_dataset(
+            tabla,
+            temporal,
+            format='parquet',
+            partitioning=_particion(),
+            max_rows_per_group=FILAS_POR_GRUPO,
+            existing_data_behavior='overwrite_or_ignore'
+        )
+        with open(os.path.join(temporal, FIRMA_ESPEJO), 'w', encoding='utf-8') as f:
+            json.dump(firma, f)
+
+        # Reemplazo del directorio completo; un lector a medio camino recurre al CSV
+        if os.path.exists(destino):
+            os.replace(destino, anterior)
+        os.replace(temporal, destino)
+        shutil.rmtree(anterior, ignore_errors=True)
+        logging.info(f"Espejo Parquet actualizado: {destino} ({len(df)} filas)")
+        return True
+    except Exception as e:
+        logging.error(f"No se pudo generar el espejo Parquet de {csv_path}: {str(e)}")
+        shutil.rmtree(temporal, ignore_errors=True)
+        return False
+
+def columnas_espejo(tipo: str, csv_path: str = None) -> list:
+    """Columnas guardadas en el espejo (sin la de partición), para validar sin leer datos"""
+    if not PYARROW_DISPONIBLE:
+        return []
+    csv_path = csv_path or ESPEJOS[tipo]['csv']
+    try:
+        dataset = _dataset(csv_path)
+        return [nombre for nombre in dataset.schema.names if nombre != COLUMNA_PARTICION]
+    except Exception as e:
+        logging.warning(f"Espejo Parquet ilegible: {str(e)}")
+        return []
+
+def leer_espejo(tipo: str, csv_path: str = None, seleccion: list = None, desde=None, hasta=None,
+                anios: tuple = None, solo_activos: bool = False):
+    """Lee del espejo solo 'seleccion' y solo las filas del periodo [desde, hasta] (fechas) o de
+    'anios' (columna year); devuelve None si no se pudo, para que el tablero lea el CSV"""
+    if not PYARROW_DISPONIBLE:
+        return None
+    csv_path = csv_path or ESPEJOS[tipo]['csv']
+    fecha = ESPEJOS[tipo]['fecha']
+    try:
+        dataset = _dataset(csv_path)
+        filtro = None
+
+        def agregar(condicion):
+            nonlocal filtro
+            filtro = condicion if filtro is None else filtro & condicion
+
+        if desde is not None:
+            desde = pd.Timestamp(desde)
+            # La condición sobre la partición descarta directorios completos
+            agregar(ds.field(COLUMNA_PARTICION) >= desde.year)
+            agregar(ds.field(fecha) >= pa.scalar(desde.to_pydatetime(), pa.timestamp('ns')))
+        if hasta is not None:
+            hasta = pd.Timestamp(hasta)
+            agregar(ds.field(COLUMNA_PARTICION) <= hasta.year)
+            agregar(ds.field(fecha) <= pa.scalar(hasta.to_pydatetime(), pa.timestamp('ns')))
+        if anios is not None:
+            agregar((ds.field('year') >= int(anios[0])) & (ds.field('year') <= int(anios[1])))
+        if solo_activos:
+            # Mismo criterio que los tableros: estado 'A' y fecha válida
+            agregar((ds.field('estado') == 'A') & ds.field(fecha).is_valid())
+
+        nombres = [c for c in (seleccion or columnas(tipo)) if c in dataset.schema.names]
+        tabla = dataset.to_table(columns=nombres, filter=filtro)
+        return tipar(tabla.to_pandas(), tipo)
+    except Exception as e:
+        logging.error(f"Error al leer el espejo Parquet de {csv_path}: {str(e)}")
+        return None
+
+def leer_periodo(tipo: str, csv_path: str = None, desde=None, hasta=None, anios: tuple = None) -> pd.DataFrame:
+    """Filas activas del periodo desde el espejo; si no se puede, filtrando el CSV completo"""
+    df = leer_espejo(tipo, csv_path, desde=desde, hasta=hasta, anios=anios, solo_activos=True)
+    if df is not None:
+        return df
+    csv_path = csv_path or ESPEJOS[tipo]['csv']
+    fecha = ESPEJOS[tipo]['fecha']
+    df = leer_csv(tipo, csv_path)
+    mascara = (df['estado'] == 'A') & df[fecha].notna()
+    if desde is not None:
+        mascara &= df[fecha] >= pd.Timestamp(desde)
+    if hasta is not None:
+        mascara &= df[fecha] <= pd.Timestamp(hasta)
+    if anios is not None:
+        mascara &= (df['year'] >= int(anios[0])) & (df['year'] <= int(anios[1]))
+    return df[mascara.fillna(False)].copy()
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera los espejos Parquet de los archivos *_total.csv")
+    parser.add_argument('tipos', nargs='*', default=list(ESPEJOS), help="articulos, tesis, libros, capitulos, congresos")
+    parser.add_argument('--forzar', action='store_true', help="Regenerar aunque el CSV no haya cambiado")
+    args = parser.parse_args()
+
+    if not PYARROW_DISPONIBLE:
+        print("pyarrow no está instalado; no se generan espejos")
+        return
+    for tipo in args.tipos:
+        csv_path = ESPEJOS[tipo]['csv']
+        if not Path(csv_path).exists():
+            print(f"{tipo}: no existe {csv_path}")
+            continue
+        vigente = not args.forzar and espejo_vigente(tipo, csv_path)
+        ok = actualizar_espejo(tipo, csv_path, forzar=args.forzar)
+        print(f"{tipo}: {'sin cambios' if vigente else ('actualizado' if ok else 'error')} -> {ruta_espejo(csv_path)}")
+
+if __name__ == "__main__":
+    main()
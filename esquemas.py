@@ -0,0 +1,214 @@
+import csv
+import os
+import argparse
+from collections import defaultdict
+
+import pandas as pd
+
+# ====================
+# ESQUEMAS DE COLUMNAS POR TIPO DE PRODUCTO
+# ====================
+# Fuente única de las columnas de cada CSV, en el orden en que se escriben, y
+# de su tipo para el análisis. Los tableros leen con tipos (categorías, fechas,
+# enteros con nulos); las aplicaciones de captura leen todo como texto para
+# volver a escribir los valores tal como estaban.
+TEXTO = 'texto'
+CATEGORIA = 'categoria'
+FECHA = 'fecha'
+ENTERO = 'entero'
+
+# Identificador estable de cada registro, asignado al capturarlo (transaccion_guardado.py)
+COLUMNA_ID = 'record_id'
+
+_INVESTIGADOR = {
+    'economic_number': TEXTO,
+    'nombramiento': CATEGORIA,
+    'sni': CATEGORIA,
+    'sii': CATEGORIA,
+    'departamento': CATEGORIA,
+}
+
+ESQUEMAS = {
+    # productos_<num>.csv (PubMed), manual_<num>.csv y articulos_total.csv
+    'articulos': {
+        **_INVESTIGADOR,
+        'participation_key': TEXTO,
+        'investigator_name': TEXTO,
+        'corresponding_author': TEXTO,
+        'coauthors': TEXTO,
+        'article_title': TEXTO,
+        'year': ENTERO,
+        'pub_date': FECHA,
+        'volume': TEXTO,
+        'number': TEXTO,
+        'pages': TEXTO,
+        'journal_full': TEXTO,
+        'journal_abbrev': TEXTO,
+        'doi': TEXTO,
+        'jcr_group': CATEGORIA,
+        'pmid': TEXTO,
+        'selected_keywords': TEXTO,
+        'pdf_filename': TEXTO,
+        'estado': CATEGORIA,
+        COLUMNA_ID: TEXTO,
+    },
+    'tesis': {
+        **_INVESTIGADOR,
+        'titulo_tesis': TEXTO,
+        'tipo_tesis': TEXTO,
+        'year': ENTERO,
+        'pub_date': FECHA,
+        'directores': TEXTO,
+        'paginas': TEXTO,
+        'idioma': TEXTO,
+        'estudiante': TEXTO,
+        'coautores': TEXTO,
+        'selected_keywords': TEXTO,
+        'pdf_filename': TEXTO,
+        'estado': CATEGORIA,
+        COLUMNA_ID: TEXTO,
+    },
+    'libros': {
+        **_INVESTIGADOR,
+        'autor_principal': TEXTO,
+        'tipo_participacion': TEXTO,
+        'titulo_libro': TEXTO,
+        'editorial': TEXTO,
+        'coautores_secundarios': TEXTO,
+        'year': ENTERO,
+        'pub_date': FECHA,
+        'isbn_issn': TEXTO,
+        'numero_edicion': TEXTO,
+        'paginas': TEXTO,
+        'idiomas_disponibles': TEXTO,
+        'selected_keywords': TEXTO,
+        'pdf_filename': TEXTO,
+        'estado': CATEGORIA,
+        COLUMNA_ID: TEXTO,
+    },
+    'capitulos': {
+        **_INVESTIGADOR,
+        'autor_principal': TEXTO,
+        'tipo_participacion': TEXTO,
+        'titulo_libro': TEXTO,
+        'titulo_capitulo': TEXTO,
+        'editorial': TEXTO,
+        'coautores_secundarios': TEXTO,
+        'year': ENTERO,
+        'pub_date': FECHA,
+        'isbn_issn': TEXTO,
+        'numero_edicion': TEXTO,
+        'paginas': TEXTO,
+        'idiomas_disponibles': TEXTO,
+        'selected_keywords': TEXTO,
+        'pdf_filename': TEXTO,
+        'estado': CATEGORIA,
+        COLUMNA_ID: TEXTO,
+    },
+    'congresos': {
+        **_INVESTIGADOR,
+        'titulo_presentacion': TEXTO,
+        'titulo_congreso': TEXTO,
+        'tipo_congreso': TEXTO,
+        'pais': TEXTO,
+        'año_congreso': ENTERO,
+        'fecha_exacta_congreso': FECHA,
+        'rol': TEXTO,
+        'titulo_ponencia': TEXTO,
+        'linea_investigacion': TEXTO,
+        'coautores_secundarios': TEXTO,
+        'pdf_filename': TEXTO,
+        'estado': CATEGORIA,
+        COLUMNA_ID: TEXTO,
+    },
+}
+
+def esquema(tipo: str) -> dict:
+    try:
+        return ESQUEMAS[tipo]
+    except KeyError:
+        raise ValueError(f"Tipo de producto desconocido: {tipo!r}")
+
+def columnas(tipo: str) -> list:
+    """Columnas del CSV en el orden en que se escriben"""
+    return list(esquema(tipo))
+
+def encabezado_csv(tipo: str) -> str:
+    """Línea de encabezado con todas las columnas del esquema (record_id incluido)"""
+    return ','.join(columnas(tipo))
+
+def requeridas(tipo: str) -> list:
+    """Columnas que todo archivo debe traer; record_id falta en los archivos anteriores y se agrega al guardar"""
+    return [columna for columna in columnas(tipo) if columna != COLUMNA_ID]
+
+def df_vacio(tipo: str) -> pd.DataFrame:
+    """DataFrame sin filas con la estructura del CSV (para inicializar archivos nuevos o dañados)"""
+    return pd.DataFrame(columns=columnas(tipo))
+
+def dtypes(tipo: str, analitico: bool = True) -> defaultdict:
+    """dtype para pd.read_csv: categorías directas del parser; fechas y enteros se leen como texto y se convierten después"""
+    if not analitico:
+        return defaultdict(lambda: str)
+    return defaultdict(lambda: str, {
+        columna: 'category' for columna, clase in esquema(tipo).items() if clase == CATEGORIA
+    })
+
+def tipar(df: pd.DataFrame, tipo: str, analitico: bool = True) -> pd.DataFrame:
+    """Aplica los tipos del esquema a un DataFrame leído como texto (p. ej. desde el espejo Parquet)"""
+    if not analitico:
+        return df
+    for columna, clase in esquema(tipo).items():
+        if columna not in df.columns:
+            continue
+        if clase == CATEGORIA and not isinstance(df[columna].dtype, pd.CategoricalDtype):
+            df[columna] = df[columna].astype('category')
+        elif clase == FECHA:
+            df[columna] = pd.to_datetime(df[columna], errors='coerce')
+        elif clase == ENTERO:
+            df[columna] = pd.to_numeric(df[columna], errors='coerce').round().astype('Int64')
+    return df
+
+def nombres_completos(tipo: str, ruta, encoding: str = 'utf-8-sig'):
+    """Columnas del esquema si el encabezado del archivo es el esquema truncado (sin record_id al final),
+    o None. generador*.sh toma el encabezado de su primer archivo y concatena filas de archivos anteriores y
+    posteriores a record_id; con estos nombres las filas cortas quedan con record_id vacío. Con el encabezado
+    completo y filas cortas pandas ya rellena con nulos. Si el generador escribe primero la salida de
+    `python esquemas.py <tipo>` y luego las fuentes sin su encabezado (tail -q -n +2), como consolidar,
+    el total siempre trae el encabezado completo."""
+    if not isinstance(ruta, (str, os.PathLike)):
+        return None
+    try:
+        with open(ruta, 'r', encoding=encoding, newline='') as f:
+            encabezado = [c.strip() for c in next(csv.reader(f), [])]
+    except (OSError, UnicodeDecodeError):
+        return None
+    completas = columnas(tipo)
+    if encabezado and len(encabezado) < len(completas) and encabezado == completas[:len(encabezado)]:
+        return completas
+    return None
+
+def leer_csv(tipo: str, ruta, seleccion: list = None, analitico: bool = True,
+             encoding: str = 'utf-8-sig') -> pd.DataFrame:
+    """pd.read_csv guiado por el esquema: solo las columnas conocidas (o 'seleccion') y con sus tipos.
+    Con analitico=False todo se lee como texto (aplicaciones de captura)."""
+    conocidas = set(seleccion or columnas(tipo))
+    nombres = nombres_completos(tipo, ruta, encoding)
+    df = pd.read_csv(
+        ruta,
+        encoding=encoding,
+        names=nombres,
+        header=0,
+        usecols=lambda columna: columna.strip() in conocidas,
+        dtype=dtypes(tipo, analitico)
+    )
+    df.columns = df.columns.str.strip()
+    return tipar(df, tipo, analitico)
+
+def main():
+    parser = argparse.ArgumentParser(description="Imprime el encabezado CSV del esquema (primera línea para generador*.sh)")
+    parser.add_argument('tipo', choices=list(ESQUEMAS))
+    args = parser.parse_args()
+    print(encabezado_csv(args.tipo))
+
+if __name__ == "__main__":
+    main()
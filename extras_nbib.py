@@ -0,0 +1,268 @@
+import ast
+import gzip
+import json
+import logging
+import argparse
+from pathlib import Path
+
+from lineas_investigacion import ClasificadorLineas, normalizar_texto
+# AB, MH, OT y PT se extraen en nbib_parser junto con el resto del registro
+from nbib_parser import CAMPOS_EXTRA, extraer_extras
+
+# ====================
+# MAPA MeSH → LÍNEA DE INVESTIGACIÓN
+# ====================
+# Descriptores MeSH (sin calificadores) con asignación directa. Se consultan
+# antes del clasificador por términos porque son vocabulario controlado.
+MESH_A_LINEA = {
+    "Coronary Artery Disease": "Enfermedad coronaria",
+    "Coronary Disease": "Enfermedad coronaria",
+    "Myocardial Infarction": "Enfermedad coronaria",
+    "ST Elevation Myocardial Infarction": "Enfermedad coronaria",
+    "Non-ST Elevated Myocardial Infarction": "Enfermedad coronaria",
+    "Acute Coronary Syndrome": "Enfermedad coronaria",
+    "Angina Pectoris": "Enfermedad coronaria",
+    "Angina, Unstable": "Enfermedad coronaria",
+    "Myocardial Ischemia": "Enfermedad coronaria",
+    "Atherosclerosis": "Enfermedad coronaria",
+    "Percutaneous Coronary Intervention": "Enfermedad coronaria",
+    "Coronary Artery Bypass": "Enfermedad coronaria",
+    "Drug-Eluting Stents": "Enfermedad coronaria",
+    "Metabolic Syndrome": "Síndrome metabólico",
+    "Obesity": "Síndrome metabólico",
+    "Insulin Resistance": "Síndrome metabólico",
+    "Diabetes Mellitus, Type 2": "Síndrome metabólico",
+    "Diabetes Mellitus": "Síndrome metabólico",
+    "Dyslipidemias": "Síndrome metabólico",
+    "Hypertriglyceridemia": "Síndrome metabólico",
+    "Non-alcoholic Fatty Liver Disease": "Síndrome metabólico",
+    "Adipose Tissue": "Síndrome metabólico",
+    "Hypertension": "Hipertensión arterial sistémica/pulmonar primaria",
+    "Hypertension, Pulmonary": "Hipertensión arterial sistémica/pulmonar primaria",
+    "Pulmonary Arterial Hypertension": "Hipertensión arterial sistémica/pulmonar primaria",
+    "Familial Primary Pulmonary Hypertension": "Hipertensión arterial sistémica/pulmonar primaria",
+    "Blood Pressure": "Hipertensión arterial sistémica/pulmonar primaria",
+    "Renin-Angiotensin System": "Hipertensión arterial sistémica/pulmonar primaria",
+    "Antihypertensive Agents": "Hipertensión arterial sistémica/pulmonar primaria",
+    "Pre-Eclampsia": "Hipertensión arterial sistémica/pulmonar primaria",
+    "Heart Valve Diseases": "Enfermedad valvular",
+    "Aortic Valve Stenosis": "Enfermedad valvular",
+    "Aortic Valve Insufficiency": "Enfermedad valvular",
+    "Mitral Valve Insufficiency": "Enfermedad valvular",
+    "Mitral Valve Stenosis": "Enfermedad valvular",
+    "Tricuspid Valve Insufficiency": "Enfermedad valvular",
+    "Rheumatic Heart Disease": "Enfermedad valvular",
+    "Endocarditis": "Enfermedad valvular",
+    "Transcatheter Aortic Valve Replacement": "Enfermedad valvular",
+    "Heart Valve Prosthesis": "Enfermedad valvular",
+    "Bicuspid Aortic Valve Disease": "Enfermedad valvular",
+    "Cardiomyopathies": "Miocardiopatías y enfermedad de Chagas",
+    "Cardiomyopathy, Dilated": "Miocardiopatías y enfermedad de Chagas",
+    "Cardiomyopathy, Hypertrophic": "Miocardiopatías y enfermedad de Chagas",
+    "Chagas Cardiomyopathy": "Miocardiopatías y enfermedad de Chagas",
+    "Chagas Disease": "Miocardiopatías y enfermedad de Chagas",
+    "Trypanosoma cruzi": "Miocardiopatías y enfermedad de Chagas",
+    "Myocarditis": "Miocardiopatías y enfermedad de Chagas",
+    "Heart Failure": "Miocardiopatías y enfermedad de Chagas",
+    "Takotsubo Cardiomyopathy": "Miocardiopatías y enfermedad de Chagas",
+    "Amyloidosis": "Miocardiopatías y enfermedad de Chagas",
+    "Mitochondria": "Sistemas biológicos: celular, molecular y producción de energía",
+    "Mitochondria, Heart": "Sistemas biológicos: celular, molecular y producción de energía",
+    "Oxidative Stress": "Sistemas biológicos: celular, molecular y producción de energía",
+    "Reactive Oxygen Species": "Sistemas biológicos: celular, molecular y producción de energía",
+    "Energy Metabolism": "Sistemas biológicos: celular, molecular y producción de energía",
+    "Oxidative Phosphorylation": "Sistemas biológicos: celular, molecular y producción de energía",
+    "Adenosine Triphosphate": "Sistemas biológicos: celular, molecular y producción de energía",
+    "Gene Expression": "Sistemas biológicos: celular, molecular y producción de energía",
+    "Polymorphism, Single Nucleotide": "Sistemas biológicos: celular, molecular y producción de energía",
+    "MicroRNAs": "Sistemas biológicos: celular, molecular y producción de energía",
+    "Apoptosis": "Sistemas biológicos: celular, molecular y producción de energía",
+    "Autophagy": "Sistemas biológicos: celular, molecular y producción de energía",
+    "Myocytes, Cardiac": "Sistemas biológicos: celular, molecular y producción de energía",
+    "Molecular Docking Simulation": "Sistemas biológicos: celular, molecular y producción de energía",
+    "Heart Defects, Congenital": "Cardiopatías congénitas",
+    "Tetralogy of Fallot": "Cardiopatías congénitas",
+    "Heart Septal Defects, Ventricular": "Cardiopatías congénitas",
+    "Heart Septal Defects, Atrial": "Cardiopatías congénitas",
+    "Ductus Arteriosus, Patent": "Cardiopatías congénitas",
+    "Aortic Coarctation": "Cardiopatías congénitas",
+    "Transposition of Great Vessels": "Cardiopatías congénitas",
+    "Fontan Procedure": "Cardiopatías congénitas",
+    "Kidney Diseases": "Nefropatías",
+    "Renal Insufficiency, Chronic": "Nefropatías",
+    "Acute Kidney Injury": "Nefropatías",
+    "Diabetic Nephropathies": "Nefropatías",
+    "Renal Dialysis": "Nefropatías",
+    "Glomerulonephritis": "Nefropatías",
+    "Lupus Nephritis": "Nefropatías",
+    "Proteinuria": "Nefropatías",
+    "Albuminuria": "Nefropatías",
+    "Cardio-Renal Syndrome": "Nefropatías",
+    "Kidney Transplantation": "Nefropatías",
+    "Pacemaker, Artificial": "Elaboración de dispositivos intracardiacos",
+    "Defibrillators, Implantable": "Elaboración de dispositivos intracardiacos",
+    "Heart-Assist Devices": "Elaboración de dispositivos intracardiacos",
+    "Septal Occluder Device": "Elaboración de dispositivos intracardiacos",
+    "Prosthesis Design": "Elaboración de dispositivos intracardiacos",
+    "Equipment Design": "Elaboración de dispositivos intracardiacos",
+    "Biocompatible Materials": "Elaboración de dispositivos intracardiacos",
+    "Printing, Three-Dimensional": "Elaboración de dispositivos intracardiacos",
+    "Biosensing Techniques": "Elaboración de dispositivos intracardiacos",
+    "Air Pollution": "Medio ambiente y sociomedicina",
+    "Particulate Matter": "Medio ambiente y sociomedicina",
+    "Environmental Exposure": "Medio ambiente y sociomedicina",
+    "Socioeconomic Factors": "Medio ambiente y sociomedicina",
+    "Social Determinants of Health": "Medio ambiente y sociomedicina",
+    "Public Health": "Medio ambiente y sociomedicina",
+    "Quality of Life": "Medio ambiente y sociomedicina",
+    "Health Services Accessibility": "Medio ambiente y sociomedicina",
+    "Cost-Benefit Analysis": "Medio ambiente y sociomedicina",
+    "Education, Medical": "Medio ambiente y sociomedicina",
+    "COVID-19": "COVID-19 (SARS-Cov-2)",
+    "SARS-CoV-2": "COVID-19 (SARS-Cov-2)",
+    "Pandemics": "COVID-19 (SARS-Cov-2)",
+    "COVID-19 Vaccines": "COVID-19 (SARS-Cov-2)",
+    "Post-Acute COVID-19 Syndrome": "COVID-19 (SARS-Cov-2)",
+}
+
+# Índice normalizado para comparar sin acentos, mayúsculas ni signos
+_MESH_NORMALIZADO = {normalizar_texto(k): v for k, v in MESH_A_LINEA.items()}
+
+# Puntaje de un descriptor mapeado; los temas principales ('*') pesan el doble
+PESO_MESH_DIRECTO = 4.0
+
+def descriptor_mesh(termino: str) -> tuple:
+    """Separa 'Hypertension, Pulmonary/*epidemiology' en (descriptor, es_tema_principal)"""
+    descriptor, _, calificadores = termino.partition('/')
+    principal = descriptor.startswith('*') or '*' in calificadores
+    return descriptor.strip().lstrip('*').strip(), principal
+
+def lineas_desde_mesh(mesh_terms) -> dict:
+    """Puntajes {línea: puntaje} usando solo el mapa MeSH precalculado"""
+    puntajes = {}
+    for termino in mesh_terms or []:
+        descriptor, principal = descriptor_mesh(termino)
+        linea = _MESH_NORMALIZADO.get(normalizar_texto(descriptor))
+        if linea:
+            peso = PESO_MESH_DIRECTO * (2 if principal else 1)
+            puntajes[linea] = puntajes.get(linea, 0.0) + peso
+    return puntajes
+
+def sugerir_lineas_extras(titulo, extras, maximo=None, umbral_relativo=0.0) -> list:
+    """Combina mapa MeSH y clasificador por términos (título, resumen, MeSH y OT)"""
+    extras = extras or {}
+    mesh_terms = extras.get('mesh') or []
+    texto_mesh = '; '.join(descriptor_mesh(t)[0] for t in mesh_terms)
+    texto_mesh = '; '.join(filter(None, [texto_mesh, '; '.join(extras.get('keywords') or [])]))
+
+    clasificador = ClasificadorLineas()
+    puntajes = clasificador.puntuar(titulo, extras.get('abstract', ''), texto_mesh)
+    for linea, puntaje in lineas_desde_mesh(mesh_terms).items():
+        puntajes[linea] = puntajes.get(linea, 0.0) + puntaje
+
+    return clasificador.ordenar(puntajes, maximo, umbral_relativo)
+
+# ====================
+# ARCHIVO LATERAL POR PMID
+# ====================
+def _registros(lineas) -> dict:
+    """{pmid: extras} de las líneas JSON del archivo lateral; la última versión de cada PMID gana"""
+    extras = {}
+    for linea in lineas:
+        linea = linea.strip()
+        if not linea:
+            continue
+        try:
+            registro = json.loads(linea)
+        except json.JSONDecodeError:
+            continue
+        extras[str(registro.pop('pmid', ''))] = registro
+    return extras
+
+def agregar_extras(contenido: bytes, pmid, extras) -> bytes:
+    """Contenido del archivo lateral comprimido con los extras de un PMID agregados (o reemplazados).
+    Se reescribe completo con una línea por PMID: el archivo no crece con versiones superadas."""
+    if not pmid:
+        return contenido
+    try:
+        # Los archivos anteriores traen un miembro gzip por guardado; gzip.decompress los lee todos
+        registros = _registros(gzip.decompress(contenido).decode('utf-8').splitlines()) if contenido else {}
+    except (OSError, EOFError, UnicodeDecodeError):
+        # Lo que no es gzip (p. ej. un archivo dañado por una descarga anterior) se reinicia
+        logging.warning(f"Archivo de extras inválido, se reinicia (PMID {pmid})")
+        registros = {}
+    registros[str(pmid)] = {k: extras.get(k) for k in CAMPOS_EXTRA.values()}
+    lineas = ''.join(
+        json.dumps({'pmid': clave, **valor}, ensure_ascii=False, separators=(',', ':')) + '\n'
+        for clave, valor in registros.items()
+    )
+    # mtime=0: el mismo contenido produce los mismos bytes y actualizar_remoto no lo vuelve a subir
+    return gzip.compress(lineas.encode('utf-8'), mtime=0)
+
+def cargar_extras(ruta) -> dict:
+    """Lee el archivo lateral y devuelve {pmid: extras}; la última versión de cada PMID gana"""
+    if not Path(ruta).exists():
+        return {}
+    try:
+        with gzip.open(ruta, 'rt', encoding='utf-8') as f:
+            return _registros(f)
+    except (OSError, EOFError) as e:
+        logging.error(f"Error leyendo extras {ruta}: {str(e)}")
+        return {}
+
+# ====================
+# RECLASIFICACIÓN EN LOTE
+# ====================
+def _lineas_guardadas(valor) -> list:
+    """Convierte el texto "['A', 'B']" guardado en el CSV a lista"""
+    if valor is None or (isinstance(valor, float) and valor != valor):
+        return []
+    texto = str(valor).strip()
+    if not texto or texto in ('[]', 'nan'):
+        return []
+    try:
+        lista = ast.literal_eval(texto)
+        if isinstance(lista, (list, tuple)):
+            return [str(x) for x in lista if str(x).strip()]
+    except (ValueError, SyntaxError):
+        pass
+    return [x.strip() for x in texto.split(',') if x.strip()]
+
+def reclasificar_registros(df, extras_por_pmid, solo_vacios=True, maximo=3, umbral_relativo=0.5):
+    """Recalcula 'selected_keywords' de un DataFrame de artículos; devuelve (df, n_cambios)"""
+    df = df.copy()
+    cambios = 0
+    for idx, fila in df.iterrows():
+        actuales = _lineas_guardadas(fila.get('selected_keywords'))
+        if solo_vacios and actuales:
+            continue
+        pmid = str(fila.get('pmid', '')).strip()
+        if pmid.endswith('.0'):
+            pmid = pmid[:-2]
+        sugeridas = sugerir_lineas_extras(
+            fila.get('article_title', ''),
+            extras_por_pmid.get(pmid, {}),
+            maximo=maximo,
+            umbral_relativo=umbral_relativo
+        )
+        if sugeridas and sugeridas != actuales:
+            df.at[idx, 'selected_keywords'] = str(sugeridas)
+            cambios += 1
+    return df, cambios
+
+def main():
+    parser = argparse.ArgumentParser(description="Reclasifica líneas de investigación de un CSV de artículos")
+    parser.add_argument('csv', help="Archivo productos_<num>.csv")
+    parser.add_argument('extras', nargs='?', help="Archivo lateral .jsonl.gz con AB/MH/OT/PT")
+    parser.add_argument('--todos', action='store_true', help="Reclasificar también registros con líneas ya asignadas")
+    args = parser.parse_args()
+
+    from esquemas import leer_csv
+    df = leer_csv('articulos', args.csv, analitico=False)
+    extras = cargar_extras(args.extras) if args.extras else {}
+    df, cambios = reclasificar_registros(df, extras, solo_vacios=not args.todos)
+    df.to_csv(args.csv, index=False, encoding='utf-8-sig')
+    print(f"{cambios} registros reclasificados en {args.csv}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,538 @@
+import io
+import re
+import json
+import logging
+from datetime import datetime
+from difflib import SequenceMatcher
+
+from lineas_investigacion import sugerir_lineas, normalizar_texto
+
+# ====================
+# REGISTRO NORMALIZADO
+# ====================
+# Todos los lectores producen el mismo diccionario intermedio; después cada
+# aplicación lo convierte a sus columnas con a_articulo, a_libro o a_capitulo.
+def registro_vacio() -> dict:
+    return {
+        'tipo': 'otro',             # articulo | libro | capitulo | otro
+        'titulo': '',
+        'titulo_contenedor': '',    # Revista o título del libro (capítulos)
+        'abreviatura': '',
+        'autores': [],
+        'editores': [],
+        'year': '',
+        'pub_date': '',
+        'volumen': '',
+        'numero': '',
+        'paginas': '',
+        'doi': '',
+        'pmid': '',
+        'isbn': '',
+        'issn': '',
+        'editorial': '',
+        'edicion': '',
+        'idioma': '',
+        'resumen': '',
+        'palabras_clave': [],
+    }
+
+TIPOS_RIS = {
+    'JOUR': 'articulo', 'JFULL': 'articulo', 'EJOUR': 'articulo', 'MGZN': 'articulo',
+    'BOOK': 'libro', 'EBOOK': 'libro', 'EDBOOK': 'libro',
+    'CHAP': 'capitulo', 'ECHAP': 'capitulo',
+}
+TIPOS_BIBTEX = {
+    'article': 'articulo',
+    'book': 'libro', 'proceedings': 'libro',
+    'incollection': 'capitulo', 'inbook': 'capitulo',
+}
+TIPOS_CROSSREF = {
+    'journal-article': 'articulo',
+    'book': 'libro', 'monograph': 'libro', 'edited-book': 'libro', 'reference-book': 'libro',
+    'book-chapter': 'capitulo', 'book-section': 'capitulo', 'book-part': 'capitulo',
+}
+
+IDIOMAS_CODIGO = {
+    'es': 'Español', 'spa': 'Español', 'en': 'Inglés', 'eng': 'Inglés',
+    'fr': 'Francés', 'fre': 'Francés', 'fra': 'Francés', 'de': 'Alemán', 'ger': 'Alemán',
+    'deu': 'Alemán', 'pt': 'Portugués', 'por': 'Portugués', 'it': 'Italiano', 'ita': 'Italiano',
+    'zh': 'Chino', 'chi': 'Chino', 'zho': 'Chino', 'ja': 'Japonés', 'jpn': 'Japonés',
+    'ru': 'Ruso', 'rus': 'Ruso',
+}
+
+def normalizar_fecha(texto) -> tuple:
+    """Convierte '2021/05/03/', '2021-05', '2021 May 3' o '2021' en (year, 'YYYY-MM-DD')"""
+    texto = str(texto or '').strip()
+    match = re.match(r'(\d{4})(?:[/\-\s]+(\d{1,2}|[A-Za-z]{3})[A-Za-z]*)?(?:[/\-\s]+(\d{1,2}))?', texto)
+    if not match:
+        return '', ''
+    year, mes, dia = match.groups()
+    if mes and not mes.isdigit():
+        try:
+            mes = str(datetime.strptime(mes[:3].title(), '%b').month)
+        except ValueError:
+            mes = None
+    try:
+        fecha = datetime(int(year), int(mes or 1), int(dia or 1))
+        return year, fecha.strftime('%Y-%m-%d')
+    except ValueError:
+        return year, f"{year}-01-01"
+
+def _agregar_paginas(registro, inicio='', fin=''):
+    inicio, fin = str(inicio or '').strip(), str(fin or '').strip()
+    if inicio and fin:
+        registro['paginas'] = f"{inicio}-{fin}"
+    elif inicio:
+        registro['paginas'] = inicio
+
+# ====================
+# RIS
+# ====================
+_LINEA_RIS = re.compile(r'^([A-Z][A-Z0-9])\s{1,2}-\s?(.*)$')
+
+def leer_ris(lineas):
+    """Genera registros de un flujo de líneas RIS (un registro por bloque TY ... ER)"""
+    registro = None
+    inicio_pag = fin_pag = ''
+    for linea in lineas:
+        linea = linea.rstrip('\r\n').lstrip('\ufeff')
+        match = _LINEA_RIS.match(linea)
+        if not match:
+            continue
+        etiqueta, valor = match.group(1), match.group(2).strip()
+
+        if etiqueta == 'TY':
+            registro = registro_vacio()
+            registro['tipo'] = TIPOS_RIS.get(valor.upper(), 'otro')
+            inicio_pag = fin_pag = ''
+            continue
+        if registro is None:
+            continue
+        if etiqueta == 'ER':
+            _agregar_paginas(registro, inicio_pag, fin_pag)
+            yield registro
+            registro = None
+            continue
+
+        if etiqueta in ('TI', 'T1') and not registro['titulo']:
+            registro['titulo'] = valor
+        elif etiqueta in ('AU', 'A1'):
+            registro['autores'].append(valor)
+        elif etiqueta in ('ED', 'A2', 'A3') and registro['tipo'] != 'articulo':
+            registro['editores'].append(valor)
+        elif etiqueta in ('PY', 'Y1', 'DA'):
+            year, fecha = normalizar_fecha(valor)
+            # DA suele traer la fecha completa; PY solo el año
+            if year and (not registro['pub_date'] or registro['pub_date'].endswith('-01-01')):
+                registro['year'], registro['pub_date'] = year, fecha
+        elif etiqueta in ('JO', 'JF', 'T2', 'BT') and not registro['titulo_contenedor']:
+            registro['titulo_contenedor'] = valor
+        elif etiqueta in ('J2', 'JA'):
+            registro['abreviatura'] = valor
+        elif etiqueta == 'VL':
+            registro['volumen'] = valor
+        elif etiqueta == 'IS':
+            registro['numero'] = valor
+        elif etiqueta == 'SP':
+            inicio_pag = valor
+        elif etiqueta == 'EP':
+            fin_pag = valor
+        elif etiqueta == 'DO':
+            registro['doi'] = valor
+        elif etiqueta == 'SN':
+            if re.search(r'\d{4}-\d{3}[\dXx]$', valor):
+                registro['issn'] = valor
+            else:
+                registro['isbn'] = valor
+        elif etiqueta == 'PB':
+            registro['editorial'] = valor
+        elif etiqueta == 'ET':
+            registro['edicion'] = valor
+        elif etiqueta == 'LA':
+            registro['idioma'] = valor
+        elif etiqueta in ('AB', 'N2'):
+            registro['resumen'] = valor
+        elif etiqueta == 'KW':
+            registro['palabras_clave'].append(valor)
+        elif etiqueta == 'AN' and valor.isdigit():
+            registro['pmid'] = valor
+
+    # Archivo sin ER final: se entrega lo acumulado
+    if registro is not None and registro['titulo']:
+        _agregar_paginas(registro, inicio_pag, fin_pag)
+        yield registro
+
+# ====================
+# BIBTEX
+# ====================
+_ACENTOS_LATEX = {
+    "'": '\u0301', '`': '\u0300', '^': '\u0302', '"': '\u0308', '~': '\u0303', 'c': '\u0327',
+}
+
+def limpiar_latex(texto: str) -> str:
+    """Quita llaves y convierte acentos LaTeX comunes (\\'{e}, \\~n) a Unicode"""
+    import unicodedata
+
+    def acento(match):
+        letra = match.group(2)
+        return unicodedata.normalize('NFC', letra + _ACENTOS_LATEX[match.group(1)])
+
+    texto = re.sub(r"\\([\'`^\"~c])\s*\{?\\?([A-Za-z])\}?", acento, texto)
+    texto = texto.replace('\\&', '&').replace('--', '-')
+    texto = re.sub(r'[{}]', '', texto)
+    return re.sub(r'\s+', ' ', texto).strip()
+
+def _entradas_bibtex(lineas):
+    """Agrupa el flujo en entradas completas '@tipo{...}' contando llaves"""
+    buffer = []
+    profundidad = 0
+    dentro = False
+    for linea in lineas:
+        for caracter in linea:
+            if not dentro:
+                if caracter == '@':
+                    dentro = True
+                    buffer = ['@']
+                    profundidad = 0
+                continue
+            buffer.append(caracter)
+            if caracter == '{':
+                profundidad += 1
+            elif caracter == '}':
+                profundidad -= 1
+                if profundidad == 0:
+                    yield ''.join(buffer)
+                    dentro = False
+
+def _campos_bibtex(cuerpo: str) -> dict:
+    """Interpreta 'campo = {valor}, campo = "valor", campo = 2020' de una entrada"""
+    campos = {}
+    i, n = 0, len(cuerpo)
+    while i < n:
+        match = re.compile(r'\s*,?\s*([A-Za-z][\w\-]*)\s*=\s*').match(cuerpo, i)
+        if not match:
+            break
+        nombre = match.group(1).lower()
+        i = match.end()
+        partes = []
+        while i < n:
+            if cuerpo[i] == '{':
+                profundidad, j = 1, i + 1
+                while j < n and profundidad:
+                    profundidad += {'{': 1, '}': -1}.get(cuerpo[j], 0)
+                    j += 1
+                partes.append(cuerpo[i + 1:j - 1])
+                i = j
+            elif cuerpo[i] == '"':
+                j = i + 1
+                while j < n and (cuerpo[j] != '"' or cuerpo[j - 1] == '\\'):
+                    j += 1
+                partes.append(cuerpo[i + 1:j])
+                i = j + 1
+            else:
+                token = re.compile(r'[^,#\s}]+').match(cuerpo, i)
+                if not token:
+                    break
+                partes.append(token.group(0))
+                i = token.end()
+            # Concatenación con '#'
+            siguiente = re.compile(r'\s*#\s*').match(cuerpo, i)
+            if not siguiente:
+                break
+            i = siguiente.end()
+        campos[nombre] = limpiar_latex(''.join(partes))
+    return campos
+
+def leer_bibtex(lineas):
+    """Genera registros de un flujo BibTeX, una entrada a la vez"""
+    for entrada in _entradas_bibtex(lineas):
+        match = re.match(r'@\s*(\w+)\s*\{\s*([^,]*),', entrada, re.DOTALL)
+        if not match:
+            continue
+        tipo = match.group(1).lower()
+        if tipo in ('comment', 'string', 'preamble'):
+            continue
+        campos = _campos_bibtex(entrada[match.end():-1])
+
+        registro = registro_vacio()
+        registro['tipo'] = TIPOS_BIBTEX.get(tipo, 'otro')
+        registro['titulo'] = campos.get('title', '') if registro['tipo'] != 'capitulo' or 'chapter' not in campos else campos['chapter']
+        registro['titulo_contenedor'] = campos.get('journal') or campos.get('booktitle', '')
+        if registro['tipo'] == 'capitulo' and not registro['titulo_contenedor']:
+            registro['titulo_contenedor'] = campos.get('title', '')
+        registro['abreviatura'] = campos.get('shortjournal', '')
+        registro['autores'] = [a.strip() for a in re.split(r'\s+and\s+', campos.get('author', '')) if a.strip()]
+        registro['editores'] = [e.strip() for e in re.split(r'\s+and\s+', campos.get('editor', '')) if e.strip()]
+        fecha = campos.get('date') or ' '.join(filter(None, [campos.get('year', ''), campos.get('month', ''), campos.get('day', '')]))
+        registro['year'], registro['pub_date'] = normalizar_fecha(fecha)
+        registro['volumen'] = campos.get('volume', '')
+        registro['numero'] = campos.get('number') or campos.get('issue', '')
+        registro['paginas'] = campos.get('pages', '')
+        registro['doi'] = campos.get('doi', '')
+        registro['pmid'] = campos.get('pmid', '')
+        registro['isbn'] = campos.get('isbn', '')
+        registro['issn'] = campos.get('issn', '')
+        registro['editorial'] = campos.get('publisher', '')
+        registro['edicion'] = campos.get('edition', '')
+        registro['idioma'] = campos.get('language', '')
+        registro['resumen'] = campos.get('abstract', '')
+        registro['palabras_clave'] = [k.strip() for k in re.split(r'[;,]', campos.get('keywords', '')) if k.strip()]
+        yield registro
+
+# ====================
+# CROSSREF JSON
+# ====================
+def _nombre_crossref(persona: dict) -> str:
+    if persona.get('family'):
+        return ', '.join(filter(None, [persona.get('family'), persona.get('given')]))
+    return persona.get('name', '')
+
+def _primero(valor):
+    if isinstance(valor, list):
+        return valor[0] if valor else ''
+    return valor or ''
+
+def _registro_crossref(obra: dict) -> dict:
+    registro = registro_vacio()
+    registro['tipo'] = TIPOS_CROSSREF.get(obra.get('type', ''), 'otro')
+    registro['titulo'] = limpiar_latex(_primero(obra.get('title')))
+    registro['titulo_contenedor'] = _primero(obra.get('container-title'))
+    registro['abreviatura'] = _primero(obra.get('short-container-title'))
+    registro['autores'] = [_nombre_crossref(a) for a in obra.get('author', []) if _nombre_crossref(a)]
+    registro['editores'] = [_nombre_crossref(e) for e in obra.get('editor', []) if _nombre_crossref(e)]
+    for campo in ('published-print', 'published', 'published-online', 'issued', 'created'):
+        partes = (obra.get(campo) or {}).get('date-parts') or [[]]
+        if partes and partes[0] and partes[0][0]:
+            registro['year'], registro['pub_date'] = normalizar_fecha('-'.join(str(p) for p in partes[0]))
+            break
+    registro['volumen'] = str(obra.get('volume', ''))
+    registro['numero'] = str(obra.get('issue', ''))
+    registro['paginas'] = str(obra.get('page', ''))
+    registro['doi'] = obra.get('DOI', '')
+    registro['isbn'] = _primero(obra.get('ISBN'))
+    registro['issn'] = _primero(obra.get('ISSN'))
+    registro['editorial'] = obra.get('publisher', '')
+    registro['edicion'] = str(obra.get('edition-number', ''))
+    registro['idioma'] = obra.get('language', '')
+    registro['resumen'] = re.sub(r'<[^>]+>', ' ', obra.get('abstract', '')).strip()
+    registro['palabras_clave'] = list(obra.get('subject', []))
+    return registro
+
+def leer_crossref(flujo):
+    """Genera registros de un JSON de CrossRef: obra única, lista 'items', arreglo o JSON por línea"""
+    texto = flujo.read() if hasattr(flujo, 'read') else ''.join(flujo)
+    texto = texto.lstrip('\ufeff').strip()
+    if not texto:
+        return
+    try:
+        datos = json.loads(texto)
+        documentos = [datos]
+    except json.JSONDecodeError:
+        # JSON Lines: una obra por línea
+        documentos = []
+        for linea in texto.splitlines():
+            linea = linea.strip()
+            if linea:
+                try:
+                    documentos.append(json.loads(linea))
+                except json.JSONDecodeError as e:
+                    logging.warning(f"Línea JSON inválida ignorada: {str(e)}")
+
+    for documento in documentos:
+        if isinstance(documento, dict) and 'message' in documento:
+            documento = documento['message']
+        if isinstance(documento, dict) and 'items' in documento:
+            obras = documento['items']
+        elif isinstance(documento, list):
+            obras = documento
+        else:
+            obras = [documento]
+        for obra in obras:
+            if isinstance(obra, dict) and (obra.get('title') or obra.get('DOI')):
+                yield _registro_crossref(obra)
+
+# ====================
+# ENTRADA ÚNICA
+# ====================
+LECTORES = {
+    'ris': leer_ris,
+    'bibtex': leer_bibtex,
+    'crossref': leer_crossref,
+}
+
+def detectar_formato(nombre: str, primera_linea: str = '') -> str:
+    """Deduce el formato por extensión y, si no basta, por el contenido"""
+    nombre = (nombre or '').lower()
+    if nombre.endswith('.ris') or nombre.endswith('.txt') and primera_linea.startswith('TY'):
+        return 'ris'
+    if nombre.endswith('.bib') or nombre.endswith('.bibtex'):
+        return 'bibtex'
+    if nombre.endswith('.json') or nombre.endswith('.jsonl'):
+        return 'crossref'
+    primera_linea = primera_linea.lstrip('\ufeff').strip()
+    if primera_linea.startswith('TY'):
+        return 'ris'
+    if primera_linea.startswith('@'):
+        return 'bibtex'
+    if primera_linea[:1] in ('{', '['):
+        return 'crossref'
+    return ''
+
+def importar_archivo(nombre: str, flujo_bytes):
+    """Lee un archivo subido (bytes) sin cargarlo completo a memoria y genera registros normalizados"""
+    if hasattr(flujo_bytes, 'seek'):
+        flujo_bytes.seek(0)
+    texto = io.TextIOWrapper(flujo_bytes, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        primera = ''
+        for linea in texto:
+            if linea.strip():
+                primera = linea
+                break
+        formato = detectar_formato(nombre, primera)
+        if not formato:
+            raise ValueError("Formato no reconocido: use RIS (.ris), BibTeX (.bib) o JSON de CrossRef (.json)")
+
+        def lineas():
+            yield primera
+            yield from texto
+
+        fuente = io.StringIO(primera + texto.read()) if formato == 'crossref' else lineas()
+        yield from LECTORES[formato](fuente)
+    finally:
+        # Se libera el envoltorio sin cerrar el archivo subido
+        texto.detach()
+
+# ====================
+# CONVERSIÓN A LAS COLUMNAS DE CADA APLICACIÓN
+# ====================
+def _variantes_nombre(nombre: str) -> set:
+    """'Pérez, Juan' y 'Juan Pérez' producen las mismas variantes normalizadas"""
+    normalizado = normalizar_texto(nombre)
+    variantes = {normalizado}
+    if ',' in nombre:
+        apellido, _, nombres = nombre.partition(',')
+        variantes.add(normalizar_texto(f"{nombres} {apellido}"))
+    return {v for v in variantes if v}
+
+def identificar_autor(nombre: str, autores: list, umbral: float = 0.8) -> int:
+    """Posición del autor que mejor coincide con 'nombre' o -1 si ninguno supera el umbral"""
+    if not nombre or not autores:
+        return -1
+    buscado = _variantes_nombre(nombre)
+    mejor, posicion = 0.0, -1
+    for i, autor in enumerate(autores):
+        for variante in _variantes_nombre(autor):
+            for objetivo in buscado:
+                razon = SequenceMatcher(None, variante, objetivo).ratio()
+                if razon > mejor:
+                    mejor, posicion = razon, i
+    return posicion if mejor >= umbral else -1
+
+def lineas_sugeridas(registro: dict, maximo: int = 3) -> list:
+    """Líneas de investigación sugeridas por el clasificador; 'Otros' si no hay coincidencias"""
+    sugeridas = sugerir_lineas(
+        registro['titulo'],
+        registro['resumen'],
+        '; '.join(registro['palabras_clave']),
+        maximo=maximo,
+        umbral_relativo=0.5
+    )
+    return sugeridas or ["Otros"]
+
+def a_articulo(registro: dict, investigador: str = '', maximo_lineas: int = 3) -> dict:
+    """Columnas de manual4.py (artículos no indexados en PubMed)"""
+    autores = registro['autores']
+    posicion = identificar_autor(investigador, autores)
+    if posicion == 0:
+        participation_key = "CA"
+    elif posicion > 0:
+        participation_key = f"{posicion + 1}C"
+    else:
+        participation_key = ""
+    return {
+        'corresponding_author': autores[0] if autores else '',
+        'coauthors': '; '.join(autores[1:]),
+        'article_title': registro['titulo'],
+        'year': registro['year'],
+        'pub_date': registro['pub_date'] or (f"{registro['year']}-01-01" if registro['year'] else ''),
+        'volume': registro['volumen'] or '0',
+        'number': registro['numero'] or '0',
+        'pages': registro['paginas'] or '0',
+        'journal_full': registro['titulo_contenedor'],
+        'journal_abbrev': registro['abreviatura'],
+        'doi': registro['doi'],
+        'jcr_group': "Grupo no determinado",
+        'pmid': registro['pmid'],
+        'selected_keywords': str(lineas_sugeridas(registro, maximo_lineas)),
+        'investigator_name': autores[posicion] if posicion >= 0 else '',
+        'participation_key': participation_key,
+    }
+
+def _tipo_participacion(registro: dict, investigador: str) -> str:
+    if identificar_autor(investigador, registro['editores']) >= 0 and identificar_autor(investigador, registro['autores']) < 0:
+        return "Editor"
+    if len(registro['autores']) == 1:
+        return "Autor único"
+    return "Coautor"
+
+def _idiomas(registro: dict) -> str:
+    codigo = str(registro['idioma'] or '').strip()
+    return IDIOMAS_CODIGO.get(codigo.lower(), codigo)
+
+def a_libro(registro: dict, investigador: str = '', maximo_lineas: int = 3) -> dict:
+    """Columnas de libros8.py"""
+    responsables = registro['autores'] or registro['editores']
+    return {
+        'autor_principal': responsables[0] if responsables else '',
+        'tipo_participacion': _tipo_participacion(registro, investigador),
+        'titulo_libro': registro['titulo'],
+        'editorial': registro['editorial'],
+        'coautores_secundarios': '; '.join(responsables[1:]),
+        'year': registro['year'],
+        'pub_date': registro['pub_date'] or registro['year'],
+        'isbn_issn': registro['isbn'] or registro['issn'],
+        'numero_edicion': registro['edicion'],
+        'paginas': registro['paginas'],
+        'idiomas_disponibles': _idiomas(registro),
+        'selected_keywords': str(lineas_sugeridas(registro, maximo_lineas)),
+    }
+
+def numero_paginas(paginas: str) -> str:
+    """'123-145' → '23'; cualquier otro valor se conserva"""
+    match = re.match(r'^\s*(\d+)\s*[-–]+\s*(\d+)\s*$', str(paginas or ''))
+    if match and int(match.group(2)) >= int(match.group(1)):
+        return str(int(match.group(2)) - int(match.group(1)) + 1)
+    return str(paginas or '')
+
+def a_capitulo(registro: dict, investigador: str = '', maximo_lineas: int = 3) -> dict:
+    """Columnas de capitulos7.py"""
+    responsables_libro = registro['editores'] or registro['autores']
+    return {
+        'autor_principal': responsables_libro[0] if responsables_libro else '',
+        'tipo_participacion': _tipo_participacion(registro, investigador),
+        'titulo_libro': registro['titulo_contenedor'],
+        'titulo_capitulo': registro['titulo'],
+        'editorial': registro['editorial'],
+        'coautores_secundarios': '; '.join(registro['autores']),
+        'year': registro['year'],
+        'pub_date': registro['pub_date'] or registro['year'],
+        'isbn_issn': registro['isbn'] or registro['issn'],
+        'numero_edicion': registro['edicion'],
+        'paginas': numero_paginas(registro['paginas']),
+        'idiomas_disponibles': _idiomas(registro),
+        'selected_keywords': str(lineas_sugeridas(registro, maximo_lineas)),
+    }
+
+def ya_registrado(registro_app: dict, existentes, campo_titulo: str, campo_doi: str = None) -> bool:
+    """True si el DOI o el título normalizado ya están en el DataFrame de la aplicación"""
+    if existentes is None or existentes.empty:
+        return False
+    if campo_doi and registro_app.get(campo_doi) and campo_doi in existentes.columns:
+        dois = existentes[campo_doi].dropna().astype(str).str.strip().str.lower()
+        if str(registro_app[campo_doi]).strip().lower() in set(dois):
+            return True
+    if campo_titulo in existentes.columns:
+        titulos = {normalizar_texto(t) for t in existentes[campo_titulo].dropna()}
+        return normalizar_texto(registro_app.get(campo_titulo, '')) in titulos
+    return False
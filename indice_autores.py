@@ -0,0 +1,154 @@
+import os
+import json
+import logging
+from difflib import SequenceMatcher
+
+from lineas_investigacion import normalizar_texto
+
+# ====================
+# ÍNDICE DE ALIAS DE AUTOR
+# ====================
+# {economic_number: {nombre_como_se_guardó: veces_usado}}. Se actualiza en cada
+# guardado (artículos PubMed y no PubMed) y sirve para preseleccionar al
+# investigador en la lista de autores de un registro nuevo.
+ALIAS_AUTORES_FILE = "alias_autores_{economic_number}.json"
+UMBRAL_COINCIDENCIA = 0.82
+
+def partes_nombre(nombre: str) -> tuple:
+    """('perez lopez', 'jc') a partir de 'Pérez-López, Juan Carlos', 'Perez-Lopez JC' o 'Juan Carlos Pérez-López'"""
+    nombre = str(nombre or '').strip()
+    if ',' in nombre:
+        apellidos, _, nombres = nombre.partition(',')
+        nombres = normalizar_texto(nombres).split()
+    else:
+        tokens = normalizar_texto(nombre).split()
+        if not tokens:
+            return '', ''
+        # Formato MEDLINE 'Apellido IN': el último token son las iniciales
+        if len(tokens) > 1 and len(tokens[-1]) <= 3 and nombre.split()[-1].isupper():
+            apellidos, nombres = ' '.join(tokens[:-1]), list(tokens[-1])
+        else:
+            apellidos, nombres = tokens[-1], tokens[:-1]
+    iniciales = ''.join(n[0] for n in nombres if n)
+    return normalizar_texto(apellidos), iniciales
+
+def similitud_nombres(a: str, b: str) -> float:
+    """Similitud entre 0 y 1 tolerante a acentos, orden 'Apellido, Nombre' e iniciales"""
+    clave_a, clave_b = normalizar_texto(a), normalizar_texto(b)
+    if not clave_a or not clave_b:
+        return 0.0
+    if clave_a == clave_b:
+        return 1.0
+    apellidos_a, iniciales_a = partes_nombre(a)
+    apellidos_b, iniciales_b = partes_nombre(b)
+    if apellidos_a and apellidos_a == apellidos_b:
+        # Mismo apellido: decide la compatibilidad de iniciales ('JC' vs 'J')
+        if iniciales_a and iniciales_b:
+            if iniciales_a.startswith(iniciales_b) or iniciales_b.startswith(iniciales_a):
+                return 0.95
+            return 0.5
+        return 0.85
+    ordenado_a = ' '.join(sorted(clave_a.split()))
+    ordenado_b = ' '.join(sorted(clave_b.split()))
+    return SequenceMatcher(None, ordenado_a, ordenado_b).ratio()
+
+class IndiceAutores:
+    """Índice persistente de alias en un archivo JSON; cada guardado lo actualiza sin reconstruirlo"""
+    def __init__(self, ruta: str = None):
+        self.ruta = ruta
+        self.alias = {}
+        self.cargar()
+
+    @classmethod
+    def desde_contenido(cls, contenido: bytes):
+        """Índice en memoria a partir del JSON (p. ej. leído del servidor); vacío si no hay contenido"""
+        indice = cls()
+        indice._leer_json(contenido.decode('utf-8') if contenido else '')
+        return indice
+
+    def _leer_json(self, texto: str):
+        self.alias = {}
+        if not texto.strip():
+            return
+        try:
+            datos = json.loads(texto)
+            if isinstance(datos, dict):
+                self.alias = {
+                    str(numero): {str(nombre): int(usos) for nombre, usos in nombres.items()}
+                    for numero, nombres in datos.items() if isinstance(nombres, dict)
+                }
+        except (ValueError, TypeError, AttributeError) as e:
+            logging.warning(f"Índice de autores ilegible, se inicia vacío: {self.ruta or 'contenido remoto'} ({str(e)})")
+
+    def cargar(self):
+        """Lee el JSON; si no existe o está dañado se inicia vacío"""
+        self.alias = {}
+        if not self.ruta or not os.path.exists(self.ruta):
+            return self
+        try:
+            with open(self.ruta, 'r', encoding='utf-8') as f:
+                self._leer_json(f.read())
+        except OSError as e:
+            logging.warning(f"Índice de autores ilegible, se inicia vacío: {self.ruta} ({str(e)})")
+        return self
+
+    def contenido(self) -> bytes:
+        """JSON del índice, con orden estable para que el mismo índice produzca los mismos bytes"""
+        return json.dumps(self.alias, ensure_ascii=False, indent=1, sort_keys=True).encode('utf-8')
+
+    def guardar(self) -> bool:
+        """Escritura atómica: archivo temporal y reemplazo"""
+        try:
+            temporal = f"{self.ruta}.tmp"
+            with open(temporal, 'wb') as f:
+                f.write(self.contenido())
+            os.replace(temporal, self.ruta)
+            return True
+        except OSError as e:
+            logging.error(f"Error al guardar índice de autores: {str(e)}")
+            return False
+
+    def nombres(self, economic_number) -> dict:
+        return self.alias.get(str(economic_number), {})
+
+    def registrar(self, economic_number, nombre: str, usos: int = 1):
+        """Suma un uso del nombre para el número económico"""
+        nombre = str(nombre or '').strip()
+        if not nombre or nombre.lower() == 'nan':
+            return
+        nombres = self.alias.setdefault(str(economic_number), {})
+        nombres[nombre] = nombres.get(nombre, 0) + usos
+
+    def sembrar(self, economic_number, nombres):
+        """Solo la primera vez: toma los nombres ya guardados en el CSV que la aplicación tiene a mano"""
+        if self.nombres(economic_number):
+            return False
+        for nombre in nombres:
+            self.registrar(economic_number, nombre)
+        return bool(self.nombres(economic_number))
+
+    def sugerir(self, economic_number, autores: list, umbral: float = UMBRAL_COINCIDENCIA):
+        """Posición en 'autores' del nombre más parecido a algún alias conocido, o None"""
+        conocidos = self.nombres(economic_number)
+        if not conocidos or not autores:
+            return None
+        total = sum(conocidos.values())
+        mejor, posicion = 0.0, None
+        for i, autor in enumerate(autores):
+            if autor in conocidos:
+                return i
+            for alias, usos in conocidos.items():
+                # Los alias más usados desempatan a favor de la grafía habitual
+                puntaje = similitud_nombres(autor, alias) + 0.01 * usos / total
+                if puntaje > mejor:
+                    mejor, posicion = puntaje, i
+        return posicion if mejor >= umbral else None
+
+def actualizar_contenido(contenido: bytes, economic_number, nombres, semilla=()) -> bytes:
+    """JSON publicado con los nombres nuevos registrados; si el investigador aún no tiene alias, antes se
+    siembra con 'semilla' (los nombres de sus registros anteriores). Para actualizar_remoto."""
+    indice = IndiceAutores.desde_contenido(contenido)
+    indice.sembrar(economic_number, semilla)
+    for nombre in nombres:
+        indice.registrar(economic_number, nombre)
+    return indice.contenido()
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+# ====================
+# ÍNDICE POR FECHA E INVESTIGADOR
+# ====================
+# Los tableros filtraban el periodo comparando la columna de fecha de todo el
+# total en cada rerun, y cada expander volvía a recorrer el periodo para sacar
+# las filas de su investigador. Aquí el total se ordena una vez por fecha
+# (orden estable: las filas de una misma fecha conservan el del archivo), el
+# periodo es un corte [i, j) hallado con searchsorted y las filas de cada
+# investigador son un arreglo de posiciones que se recorta con otra búsqueda
+# binaria. Se arma en cargar_datos, así que se cachea por versión del total.
+
+class IndicePeriodo:
+    def __init__(self, df: pd.DataFrame, fecha: str, investigador: str):
+        # Fechas nulas al final: quedan fuera de cualquier periodo, como con las comparaciones
+        self.df = df.sort_values(fecha, kind='stable', na_position='last')
+        fechas = self.df[fecha].dropna()
+        self._es_fecha = pd.api.types.is_datetime64_any_dtype(fechas)
+        self._fechas = fechas.to_numpy(dtype='datetime64[ns]' if self._es_fecha else 'int64')
+        # {investigador: posiciones (ascendentes) en self.df}
+        self._posiciones = self.df.groupby(investigador, observed=True, sort=False).indices
+
+    def _valor(self, limite):
+        return np.datetime64(pd.Timestamp(limite), 'ns') if self._es_fecha else int(limite)
+
+    def limites(self, desde=None, hasta=None) -> tuple:
+        """(i, j) tales que self.df.iloc[i:j] son las filas con desde <= fecha <= hasta"""
+        i = 0 if desde is None else int(np.searchsorted(self._fechas, self._valor(desde), side='left'))
+        j = len(self._fechas) if hasta is None else int(np.searchsorted(self._fechas, self._valor(hasta), side='right'))
+        return i, max(i, j)
+
+    def periodo(self, desde=None, hasta=None) -> pd.DataFrame:
+        """Filas del periodo (inclusive en ambos extremos), en orden de fecha"""
+        i, j = self.limites(desde, hasta)
+        return self.df.iloc[i:j]
+
+    def de_investigador(self, clave, desde=None, hasta=None) -> pd.DataFrame:
+        """Filas del investigador en el periodo, sin recorrer las de los demás"""
+        posiciones = self._posiciones.get(clave, np.empty(0, dtype=np.intp))
+        i, j = self.limites(desde, hasta)
+        desde_pos, hasta_pos = np.searchsorted(posiciones, [i, j], side='left')
+        return self.df.iloc[posiciones[desde_pos:hasta_pos]]
@@ -0,0 +1,245 @@
+import os
+import json
+import logging
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+# ====================
+# LÁPIDAS (BAJAS DIFERIDAS)
+# ====================
+# Dar de baja ya no reescribe ni vuelve a subir el CSV: cada baja agrega una
+# línea a <csv>.lapidas.jsonl con la clave del registro (claves_columnas en
+# transaccion_guardado.py) y quien lee el CSV descarta esas filas. El CSV se
+# compacta (se reescribe sin ellas y se retiran sus lápidas) solo cuando la
+# proporción de lápidas supera UMBRAL_COMPACTACION: en el siguiente guardado,
+# que de todos modos reescribe el archivo, o con `python lapidas.py compactar`.
+#
+# Localmente hay dos archivos: la copia de las lápidas remotas y las
+# pendientes de publicar (si la subida falló), que se envían en la siguiente
+# conexión.
+LAPIDAS_SUFFIX = ".lapidas.jsonl"
+PENDIENTES_SUFFIX = ".lapidas.pendientes.jsonl"
+UMBRAL_COMPACTACION = 0.2
+MAX_INTENTOS_PUBLICAR = 3
+
+def ruta_lapidas(csv_path: str) -> str:
+    return f"{csv_path}{LAPIDAS_SUFFIX}"
+
+def ruta_pendientes(csv_path: str) -> str:
+    return f"{csv_path}{PENDIENTES_SUFFIX}"
+
+def parsear_lapidas(texto: str) -> set:
+    """{(clave, aparición)} a partir de las líneas JSON; las líneas dañadas se ignoran"""
+    lapidas = set()
+    for linea in (texto or '').splitlines():
+        try:
+            entrada = json.loads(linea)
+            lapidas.add((str(entrada['clave']), int(entrada['n'])))
+        except (ValueError, KeyError, TypeError):
+            continue
+    return lapidas
+
+def serializar_lapidas(lapidas) -> str:
+    fecha = datetime.now().isoformat(timespec='seconds')
+    return ''.join(
+        json.dumps({'clave': clave, 'n': n, 'fecha': fecha}) + '\n'
+        for clave, n in sorted(lapidas)
+    )
+
+def _leer_local(ruta: str) -> set:
+    if not Path(ruta).exists():
+        return set()
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return parsear_lapidas(f.read())
+
+def _escribir_local(ruta: str, lapidas: set) -> None:
+    if not lapidas:
+        if Path(ruta).exists():
+            os.remove(ruta)
+        return
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        f.write(serializar_lapidas(lapidas))
+    os.replace(temporal, ruta)
+
+def leer_lapidas(csv_path: str) -> set:
+    """Lápidas vigentes para la copia local: las remotas conocidas más las pendientes de publicar"""
+    return _leer_local(ruta_lapidas(csv_path)) | _leer_local(ruta_pendientes(csv_path))
+
+def agregar_pendientes(csv_path: str, lapidas) -> None:
+    """Agrega lápidas al archivo local de pendientes (solo se añaden líneas)"""
+    with open(ruta_pendientes(csv_path), 'a', encoding='utf-8') as f:
+        f.write(serializar_lapidas(lapidas))
+
+def descartar_pendientes(csv_path: str, lapidas) -> None:
+    """Quita lápidas del archivo local de pendientes (p. ej. para volver a comprobarlas antes de publicarlas)"""
+    _escribir_local(ruta_pendientes(csv_path), _leer_local(ruta_pendientes(csv_path)) - set(lapidas))
+
+def posiciones_con_lapida(claves: list, lapidas: set) -> set:
+    """Posiciones de las filas (en el orden de 'claves') que tienen lápida"""
+    if not lapidas:
+        return set()
+    return {i for i, clave in enumerate(claves) if clave in lapidas}
+
+def proporcion_lapidas(claves: list, lapidas: set) -> float:
+    if not claves:
+        return 0.0
+    return len(posiciones_con_lapida(claves, lapidas)) / len(claves)
+
+# ====================
+# LÁPIDAS REMOTAS
+# ====================
+def _stat_remoto(sftp, ruta: str):
+    try:
+        return sftp.stat(ruta)
+    except FileNotFoundError:
+        return None
+
+def _misma_version(a, b) -> bool:
+    if a is None or b is None:
+        return a is None and b is None
+    return a.st_size == b.st_size and a.st_mtime == b.st_mtime
+
+def _leer_remoto(sftp, ruta: str) -> set:
+    try:
+        with sftp.open(ruta, 'r') as f:
+            return parsear_lapidas(f.read().decode('utf-8'))
+    except FileNotFoundError:
+        return set()
+
+def _reemplazar_remoto(sftp, ruta: str, lapidas: set, version_esperada) -> bool:
+    """Escribe las lápidas en un temporal y lo renombra solo si nadie cambió el archivo entretanto"""
+    if not lapidas:
+        # Sin lápidas vigentes el archivo sobra
+        if not _misma_version(_stat_remoto(sftp, ruta), version_esperada):
+            return False
+        if version_esperada is not None:
+            sftp.remove(ruta)
+        return True
+    temporal = f"{ruta}.tmp"
+    with sftp.open(temporal, 'w') as f:
+        f.write(serializar_lapidas(lapidas).encode('utf-8'))
+    if not _misma_version(_stat_remoto(sftp, ruta), version_esperada):
+        sftp.remove(temporal)
+        return False
+    try:
+        sftp.posix_rename(temporal, ruta)
+    except IOError:
+        # Servidores sin la extensión posix-rename
+        try:
+            sftp.remove(ruta)
+        except FileNotFoundError:
+            pass
+        sftp.rename(temporal, ruta)
+    return True
+
+def sincronizar_lapidas(sftp, remote_path: str, local_path: str, intentos: int = MAX_INTENTOS_PUBLICAR) -> bool:
+    """Publica las pendientes locales (unión con las remotas) y actualiza la copia local de las remotas.
+    Sin candados: si otra sesión publicó entretanto, se vuelve a leer y se reintenta."""
+    pendientes = _leer_local(ruta_pendientes(local_path))
+    remota = ruta_lapidas(remote_path)
+    for _ in range(intentos):
+        version = _stat_remoto(sftp, remota)
+        actuales = _leer_remoto(sftp, remota)
+        if pendientes and not pendientes <= actuales:
+            if not _reemplazar_remoto(sftp, remota, actuales | pendientes, version):
+                continue
+        _escribir_local(ruta_lapidas(local_path), actuales | pendientes)
+        _escribir_local(ruta_pendientes(local_path), set())
+        return True
+    logging.warning(f"No se pudieron publicar las lápidas de {remote_path} tras {intentos} intentos")
+    return False
+
+def retirar_lapidas(sftp, remote_path: str, local_path: str, aplicadas: set,
+                    intentos: int = MAX_INTENTOS_PUBLICAR) -> bool:
+    """Quita las lápidas ya aplicadas por una compactación; conserva las que llegaron mientras tanto"""
+    remota = ruta_lapidas(remote_path)
+    for _ in range(intentos):
+        version = _stat_remoto(sftp, remota)
+        restantes = _leer_remoto(sftp, remota) - aplicadas
+        if version is None or _reemplazar_remoto(sftp, remota, restantes, version):
+            _escribir_local(ruta_lapidas(local_path), restantes)
+            _escribir_local(ruta_pendientes(local_path), _leer_local(ruta_pendientes(local_path)) - aplicadas)
+            return True
+    logging.warning(f"No se pudieron retirar las lápidas de {remote_path} tras {intentos} intentos")
+    return False
+
+# ====================
+# COMPACTACIÓN EN EL SERVIDOR
+# ====================
+# Corre junto a los CSV mientras las aplicaciones siguen guardando por SFTP: el
+# CSV compactado se escribe en un temporal y se renombra solo si el archivo no
+# cambió desde que se leyó, y del archivo de lápidas se retiran solo las
+# aplicadas, con la misma comparación de versión que las sesiones remotas.
+def _reemplazar_csv(fs, df, csv_path: str, version_esperada) -> bool:
+    """Escribe df en lugar del CSV si este sigue en la versión leída"""
+    temporal = f"{csv_path}.compactado.tmp"
+    df.to_csv(temporal, index=False, encoding='utf-8-sig')
+    if not _misma_version(_stat_remoto(fs, csv_path), version_esperada):
+        os.remove(temporal)
+        return False
+    os.replace(temporal, csv_path)
+    return True
+
+def compactar_directorio(directorio: str, umbral: float = UMBRAL_COMPACTACION, prefijos: dict = None) -> list:
+    """Reescribe los CSV del directorio cuya proporción de lápidas supera el umbral; devuelve los compactados.
+    prefijos: {tipo: prefijos de sus archivos} (consolidador.prefijos_desde_secrets); por omisión los de CONSOLIDADOS"""
+    from esquemas import columnas
+    from consolidador import CONSOLIDADOS, DirectorioLocal
+    from transaccion_guardado import claves_columnas, leer_csv_texto
+
+    prefijos = prefijos or {t: c['prefijos'] for t, c in CONSOLIDADOS.items()}
+    fs = DirectorioLocal()
+    compactados = []
+    for ruta in sorted(Path(directorio).glob(f"*.csv{LAPIDAS_SUFFIX}")):
+        csv_path = str(ruta)[:-len(LAPIDAS_SUFFIX)]
+        nombre = Path(csv_path).name
+        tipo = next((t for t, lista in prefijos.items() if any(nombre.startswith(p) for p in lista)), None)
+        version_csv = _stat_remoto(fs, csv_path)
+        if tipo is None or version_csv is None:
+            continue
+        lapidas = _leer_local(str(ruta))
+        df = leer_csv_texto(csv_path, columnas(tipo))
+        claves = claves_columnas(df, columnas(tipo))
+        if proporcion_lapidas(claves, lapidas) <= umbral:
+            continue
+        bajas = posiciones_con_lapida(claves, lapidas)
+        if not _reemplazar_csv(fs, df.drop(index=list(bajas)), csv_path, version_csv):
+            logging.warning(f"{csv_path} cambió mientras se compactaba; se deja para la siguiente corrida")
+            continue
+        # Solo las lápidas leídas: las que llegaron durante la compactación se conservan
+        for _ in range(MAX_INTENTOS_PUBLICAR):
+            version = _stat_remoto(fs, str(ruta))
+            if version is None or _reemplazar_remoto(fs, str(ruta), _leer_remoto(fs, str(ruta)) - lapidas, version):
+                break
+        else:
+            logging.warning(f"No se pudieron retirar las lápidas aplicadas de {ruta}")
+        compactados.append((csv_path, len(bajas)))
+        logging.info(f"Compactado {csv_path}: {len(bajas)} filas con lápida eliminadas")
+    return compactados
+
+def main():
+    parser = argparse.ArgumentParser(description="Compacta los CSV con demasiadas lápidas (bajas diferidas)")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    p_compactar = subparsers.add_parser('compactar', help="Reescribe los CSV cuya proporción de lápidas supera el umbral")
+    p_compactar.add_argument('--dir', default='.', help="Directorio con los CSV (en el servidor)")
+    p_compactar.add_argument('--umbral', type=float, default=UMBRAL_COMPACTACION,
+                             help="Proporción de filas con lápida a partir de la cual se reescribe (0 = siempre)")
+    p_compactar.add_argument('--secrets', help="secrets.toml de las aplicaciones, para tomar los prefijos de [prefixes]")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    prefijos = None
+    if args.secrets:
+        import tomllib
+        from consolidador import prefijos_desde_secrets
+        with open(args.secrets, 'rb') as f:
+            prefijos = prefijos_desde_secrets(tomllib.load(f).get('prefixes', {}))
+    compactados = compactar_directorio(args.dir, args.umbral, prefijos)
+    for csv_path, filas in compactados:
+        print(f"{csv_path}: {filas} filas eliminadas")
+    print(f"{len(compactados)} archivos compactados")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import re
+import unicodedata
+import logging
+from bisect import bisect_right
+from collections import deque
+
+# ====================
+# LÉXICO POR LÍNEA DE INVESTIGACIÓN
+# ====================
+# Términos en español e inglés (PubMed indexa en inglés). Un '*' final indica
+# raíz: 'miocardiopat*' acepta miocardiopatía, miocardiopatías, etc. Sin '*'
+# el término debe aparecer como palabra(s) completa(s). Acentos, mayúsculas y
+# signos de puntuación se ignoran al comparar.
+LEXICO_LINEAS = {
+    "Enfermedad coronaria": [
+        "coronary", "coronari*", "coronario*", "myocardial infarction", "infarto*",
+        "acute coronary syndrome", "sindrome coronario agudo", "angina*",
+        "atherosclero*", "ateroscleros*", "atherothromb*", "percutaneous coronary intervention",
+        "pci", "stemi", "nstemi", "angioplast*", "ischemic heart disease", "ischaemic heart disease",
+        "cardiopatia isquemica", "myocardial ischemia", "isquemia miocardica",
+        "bypass graft*", "cabg", "stent*", "troponin*", "revasculariz*"
+    ],
+    "Síndrome metabólico": [
+        "metabolic syndrome", "sindrome metabolico", "obesity", "obese", "obesidad",
+        "insulin resistance", "resistencia a la insulina", "diabet*", "dyslipid*",
+        "dislipid*", "hypertriglyceridemia", "hipertrigliceridemia", "cholesterol*",
+        "colesterol*", "triglycerid*", "triglicerid*", "adipos*", "adipocyt*",
+        "adipocit*", "fatty liver", "higado graso", "nafld", "masld",
+        "waist circumference", "body mass index", "indice de masa corporal", "hyperuricemia"
+    ],
+    "Hipertensión arterial sistémica/pulmonar primaria": [
+        "hypertension", "hypertensive", "hipertension", "hipertens*", "blood pressure",
+        "presion arterial", "pulmonary arterial hypertension", "hipertension pulmonar",
+        "antihypertensive*", "antihipertensiv*", "renin*", "renina", "angiotensin*",
+        "aldosterone", "aldosterona", "vascular resistance", "endothelin*",
+        "endotelina*", "preeclampsia", "right ventricular afterload"
+    ],
+    "Enfermedad valvular": [
+        "valv*", "aortic stenosis", "estenosis aortica", "mitral", "tricuspid*",
+        "tavi", "tavr", "transcatheter aortic", "regurgitation", "insuficiencia mitral",
+        "insuficiencia aortica", "rheumatic heart disease", "fiebre reumatica",
+        "cardiopatia reumatica", "endocarditis", "prosthetic valve*", "protesis valvular*",
+        "bicuspid*", "bicuspide*"
+    ],
+    "Miocardiopatías y enfermedad de Chagas": [
+        "cardiomyopath*", "miocardiopat*", "chagas", "trypanosom*", "tripanosom*",
+        "myocarditis", "miocarditis", "heart failure", "insuficiencia cardiaca",
+        "hypertrophic", "hipertrofic*", "dilated", "dilatada", "amyloid*", "amiloid*",
+        "takotsubo", "left ventricular dysfunction", "disfuncion ventricular",
+        "ejection fraction", "fraccion de expulsion", "arrhythmogenic", "arritmogenic*"
+    ],
+    "Sistemas biológicos: celular, molecular y producción de energía": [
+        "mitochondri*", "mitocondri*", "oxidative stress", "estres oxidativo",
+        "reactive oxygen species", "atp", "bioenerget*", "oxidative phosphorylation",
+        "fosforilacion oxidativa", "gene expression", "expresion genica", "polymorphism*",
+        "polimorfism*", "microrna*", "mirna*", "proteom*", "genom*", "transcriptom*",
+        "metabolom*", "apoptosis", "apoptotic", "autophag*", "autofag*", "enzym*",
+        "enzima*", "kinetic*", "cinetic*", "ion channel*", "canal ionico", "canales ionicos", "calcium",
+        "calcio", "nitric oxide", "oxido nitrico", "cardiomyocyte*", "cardiomiocito*",
+        "molecular docking", "signaling pathway*", "via de senalizacion"
+    ],
+    "Cardiopatías congénitas": [
+        "congenital heart", "cardiopatia congenita", "cardiopatias congenitas",
+        "congenit*", "tetralogy of fallot", "tetralogia de fallot", "fallot",
+        "ventricular septal defect", "atrial septal defect", "comunicacion interventricular",
+        "comunicacion interauricular", "patent ductus arteriosus", "ductus arteriosus",
+        "persistencia del conducto arterioso", "fontan", "coarctation", "coartacion",
+        "transposition of the great arteries", "transposicion de grandes arterias",
+        "pediatric cardiac surgery", "cirugia cardiaca pediatrica"
+    ],
+    "Nefropatías": [
+        "kidney", "renal", "rinon", "nephropath*", "nefropat*", "chronic kidney disease",
+        "enfermedad renal cronica", "ckd", "dialysis", "dialisis", "hemodialysis",
+        "hemodialisis", "peritoneal dialysis", "glomerul*", "proteinuria", "albuminuria",
+        "acute kidney injury", "lesion renal aguda", "cardiorenal", "cardio renal",
+        "nephritis", "nefritis", "nephrotox*", "nefrotox*"
+    ],
+    "Elaboración de dispositivos intracardiacos": [
+        "device*", "dispositivo*", "pacemaker*", "marcapaso*", "implantable cardioverter",
+        "defibrillator*", "desfibrilador*", "ventricular assist device*", "occluder*",
+        "oclusor*", "prosthes*", "protesis", "biomaterial*", "3d printing",
+        "3d printed", "impresion 3d", "catheter*", "cateter*", "electrode*", "electrodo*",
+        "sensor*", "biosensor*", "instrumentation", "instrumentacion"
+    ],
+    "Medio ambiente y sociomedicina": [
+        "air pollution", "contaminacion atmosferica", "contaminacion del aire",
+        "particulate matter", "pm2 5", "pm10", "environmental", "ambiental*",
+        "socioeconomic", "socioeconomic*", "social determinants", "determinantes sociales",
+        "public health", "salud publica", "epidemiolog*", "population based",
+        "cross sectional survey", "encuesta*", "health services", "servicios de salud",
+        "quality of life", "calidad de vida", "cost effectiveness", "costo efectividad",
+        "medical education", "educacion medica", "bioethic*", "bioetic*", "indigenous",
+        "indigena*"
+    ],
+    "COVID-19 (SARS-Cov-2)": [
+        "covid*", "sars cov 2", "sars cov2", "sarscov2", "coronavirus disease 2019",
+        "2019 ncov", "pandemic*", "pandemia*", "long covid", "post covid",
+        "covid 19 vaccin*"
+    ],
+}
+
+# Peso de cada campo en la puntuación: el título es la señal más fuerte,
+# luego los descriptores MeSH y por último el resumen.
+PESOS_CAMPO = {
+    'titulo': 3.0,
+    'mesh': 2.0,
+    'resumen': 1.0,
+}
+
+# Separador de campos en el texto normalizado; ningún patrón lo contiene,
+# por lo que una coincidencia nunca cruza de un campo a otro.
+_SEPARADOR = " \x01 "
+
+_NO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+def normalizar_texto(texto) -> str:
+    """Minúsculas, sin acentos y con cualquier signo convertido en un espacio"""
+    if not texto:
+        return ""
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO.sub(' ', texto.lower()).strip()
+
+# ====================
+# AUTÓMATA AHO-CORASICK
+# ====================
+class AutomataAhoCorasick:
+    """Autómata multipatrón: encuentra todos los patrones en una sola pasada lineal"""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._salida = [[]]
+        self._construido = False
+
+    def agregar(self, patron: str, valor):
+        """Registra un patrón y el valor que se reporta al encontrarlo"""
+        estado = 0
+        for caracter in patron:
+            siguiente = self._goto[estado].get(caracter)
+            if siguiente is None:
+                siguiente = len(self._goto)
+                self._goto[estado][caracter] = siguiente
+                self._goto.append({})
+                self._fail.append(0)
+                self._salida.append([])
+            estado = siguiente
+        self._salida[estado].append((len(patron), valor))
+        self._construido = False
+
+    def construir(self):
+        """Calcula los enlaces de falla (recorrido en anchura)"""
+        cola = deque()
+        for estado in self._goto[0].values():
+            self._fail[estado] = 0
+            cola.append(estado)
+
+        while cola:
+            actual = cola.popleft()
+            for caracter, siguiente in self._goto[actual].items():
+                cola.append(siguiente)
+                falla = self._fail[actual]
+                while falla and caracter not in self._goto[falla]:
+                    falla = self._fail[falla]
+                destino = self._goto[falla].get(caracter, 0)
+                self._fail[siguiente] = destino if destino != siguiente else 0
+                self._salida[siguiente] = self._salida[siguiente] + self._salida[self._fail[siguiente]]
+
+        self._construido = True
+        return self
+
+    def buscar(self, texto: str):
+        """Genera (posición_inicial, valor) por cada patrón encontrado en el texto"""
+        if not self._construido:
+            self.construir()
+
+        goto, fail, salida = self._goto, self._fail, self._salida
+        estado = 0
+        for posicion, caracter in enumerate(texto):
+            while estado and caracter not in goto[estado]:
+                estado = fail[estado]
+            estado = goto[estado].get(caracter, 0)
+            for longitud, valor in salida[estado]:
+                yield posicion - longitud + 1, valor
+
+# ====================
+# CLASIFICADOR DE LÍNEAS
+# ====================
+class ClasificadorLineas:
+    """Clasifica textos en líneas de investigación; el autómata se compila una sola vez"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ClasificadorLineas, cls).__new__(cls)
+            cls._instance._compilar(LEXICO_LINEAS)
+        return cls._instance
+
+    def _compilar(self, lexico):
+        """Construye el autómata con todos los términos del léxico"""
+        self._automata = AutomataAhoCorasick()
+        self._orden = {categoria: i for i, categoria in enumerate(lexico)}
+        total = 0
+        for categoria, terminos in lexico.items():
+            for termino in terminos:
+                es_raiz = termino.endswith('*')
+                normalizado = normalizar_texto(termino.rstrip('*'))
+                if not normalizado:
+                    continue
+                # Los espacios delimitan palabras: ' termino ' exige palabra completa,
+                # ' raiz' solo exige que la palabra comience con la raíz
+                patron = f" {normalizado}" if es_raiz else f" {normalizado} "
+                self._automata.agregar(patron, (categoria, normalizado))
+                total += 1
+        self._automata.construir()
+        logging.info(f"Clasificador de líneas compilado con {total} términos")
+
+    def puntuar(self, titulo='', resumen='', mesh='') -> dict:
+        """Devuelve {categoría: puntaje} recorriendo título, MeSH y resumen en una sola pasada"""
+        campos = [('titulo', titulo), ('mesh', mesh), ('resumen', resumen)]
+        partes = []
+        inicios = []
+        pesos = []
+        posicion = 0
+        for nombre, contenido in campos:
+            if isinstance(contenido, (list, tuple, set)):
+                contenido = '; '.join(str(c) for c in contenido)
+            normalizado = normalizar_texto(contenido)
+            if not normalizado:
+                continue
+            if partes:
+                partes.append(_SEPARADOR)
+                posicion += len(_SEPARADOR)
+            inicios.append(posicion)
+            pesos.append(PESOS_CAMPO[nombre])
+            partes.append(f" {normalizado} ")
+            posicion += len(normalizado) + 2
+
+        if not partes:
+            return {}
+
+        puntajes = {}
+        vistos = set()
+        for inicio, (categoria, termino) in self._automata.buscar(''.join(partes)):
+            campo = bisect_right(inicios, inicio) - 1
+            # Cada término cuenta una vez por campo, aunque se repita
+            if (campo, categoria, termino) in vistos:
+                continue
+            vistos.add((campo, categoria, termino))
+            puntajes[categoria] = puntajes.get(categoria, 0.0) + pesos[campo]
+        return puntajes
+
+    def ordenar(self, puntajes: dict, maximo=None, umbral_relativo=0.0) -> list:
+        """Categorías por puntaje descendente (empates en el orden del léxico)"""
+        if not puntajes:
+            return []
+        ranking = sorted(puntajes, key=lambda c: (-puntajes[c], self._orden.get(c, len(self._orden))))
+        if umbral_relativo:
+            minimo = max(puntajes.values()) * umbral_relativo
+            ranking = [c for c in ranking if puntajes[c] >= minimo]
+        return ranking[:maximo] if maximo else ranking
+
+    def sugerir(self, titulo='', resumen='', mesh='', maximo=None, umbral_relativo=0.0) -> list:
+        """Categorías sugeridas para un texto, de mayor a menor puntaje"""
+        return self.ordenar(self.puntuar(titulo, resumen, mesh), maximo, umbral_relativo)
+
+def sugerir_lineas(titulo='', resumen='', mesh='', maximo=None, umbral_relativo=0.0) -> list:
+    """Atajo al clasificador compartido"""
+    return ClasificadorLineas().sugerir(titulo, resumen, mesh, maximo, umbral_relativo)
+
+def clasificar_lote(registros, maximo=3):
+    """Clasifica un iterable de (título, resumen, mesh); pensado para el histórico completo"""
+    clasificador = ClasificadorLineas()
+    for titulo, resumen, mesh in registros:
+        yield clasificador.sugerir(titulo, resumen, mesh, maximo)
@@ -0,0 +1,277 @@
+import numpy as np
+import pandas as pd
+
+from tablas_normalizadas import de_filas, explotar, partir_terminos
+
+# ====================
+# MÉTRICAS DE CALIDAD VECTORIZADAS
+# ====================
+# Sustituyen a las funciones fila por fila de los tableros (ICR, CC, IRT, ICT,
+# ICE, CI, IPC) con los mismos valores. Lo que depende solo del valor de una
+# celda (nivel de revista o editorial, JCR, palabras clave) se calcula una vez
+# por valor distinto y se reparte con los códigos de pd.factorize; los conteos
+# de autores usan str.count y las reglas por tramos, np.select. El IRT agrupa la
+# tabla explotada 'terminos' (tablas_normalizadas.py), partida en cada coma como
+# las funciones originales: una categoría con comas dentro de las comillas
+# ('Sistemas biológicos: celular, molecular y ...') cuenta como varias palabras,
+# a diferencia de la tabla resumen. banco_metricas.py compara contra las
+# funciones anteriores y mide tiempos; tests/test_metricas.py fija la equivalencia.
+
+# Niveles de prestigio: (valores, puntaje), en orden de prioridad
+REVISTAS_NIVELES = [
+    (['Nature', 'Science', 'Cell', 'Lancet', 'NEJM'], 1.0),
+    (['JAMA', 'BMJ', 'Circulation', 'JACC'], 0.7),
+    (['PLoS One', 'Scientific Reports'], 0.5),
+]
+EDITORIALES_NIVELES = [
+    (['Springer', 'Elsevier', 'Wiley', 'Nature', 'Oxford University Press'], 1.0),
+    (['Taylor & Francis', 'Cambridge University Press', 'Academic Press', 'Bentham Science Publishers'], 0.7),
+    (['Acta Biochimica Polonica', 'CRC Press'], 0.5),
+]
+CONGRESOS_INTERNACIONALES = [
+    'american heart', 'european society of cardiology',
+    'world congress of cardiology', 'international congress'
+]
+CONGRESOS_NACIONALES = [
+    'congreso nacional', 'sociedad mexicana',
+    'reunión anual', 'simposio nacional'
+]
+PAISES_NIVEL1 = ['Estados Unidos', 'Reino Unido', 'Alemania', 'Japón', 'Canadá']
+PAISES_NIVEL2 = ['Francia', 'Italia', 'España', 'Australia', 'Suiza']
+
+# Términos de relevancia temática (se comparan tal cual contra la palabra en minúsculas)
+TERMINOS_CARDIO = [
+    "cardíaco", "miocardio", "arritmia", "isquemia",
+    "hipertensión", "ECG", "insuficiencia cardíaca",
+    "coronario", "válvula", "aterosclerosis", "angina"
+]
+TERMINOS_CAPITULOS = [
+    "hipertensión", "cardíaco", "miocardio", "arritmia",
+    "isquemia", "ECG", "insuficiencia cardíaca",
+    "coronario", "válvula", "aterosclerosis", "angina"
+]
+TERMINOS_TESIS = [
+    "sistemas biológicos", "celular", "molecular", "energía",
+    "genómica", "biotecnología", "investigación aplicada"
+]
+
+# Pesos del Índice de Productividad (PI) de cada tablero
+PESOS_PI = {
+    'articulos': {'ICR': 0.5, 'CC': 0.3, 'IRT': 0.2},
+    'tesis': {'ICT': 0.5, 'CC': 0.3, 'IRT': 0.2},
+    'libros': {'ICE': 0.4, 'CI': 0.3, 'IRT': 0.3},
+    'capitulos': {'ICE': 0.5, 'CC': 0.3, 'IRT': 0.2},
+    'congresos': {'IPC': 0.5, 'CI': 0.3, 'IRT': 0.2},
+}
+
+# ====================
+# AUXILIARES
+# ====================
+def _por_valor(serie: pd.Series, funcion, nulo: float) -> np.ndarray:
+    """Aplica 'funcion' una vez por valor distinto y reparte el resultado; los nulos reciben 'nulo'"""
+    codigos, valores = pd.factorize(serie.astype(object), use_na_sentinel=True)
+    if not len(valores):
+        return np.full(len(serie), nulo, dtype=float)
+    por_valor = np.array([funcion(v) for v in valores], dtype=float)
+    return np.where(codigos >= 0, por_valor[np.maximum(codigos, 0)], nulo)
+
+def _por_distintos(serie: pd.Series, calcular, nulo) -> np.ndarray:
+    """Como _por_valor, pero 'calcular' recibe de una vez los valores distintos como Serie de str
+    (igual que str(x)) y devuelve un arreglo; así las operaciones .str corren una vez por valor"""
+    codigos, valores = pd.factorize(serie.astype(object), use_na_sentinel=True)
+    if not len(valores):
+        return np.full(len(serie), nulo)
+    por_valor = np.asarray(calcular(pd.Series(valores, dtype=object).astype(str)))
+    return np.where(codigos >= 0, por_valor[np.maximum(codigos, 0)], nulo)
+
+def _cuenta_no_vacios(serie: pd.Series, separador: str) -> np.ndarray:
+    """Elementos no vacíos (tras strip) de cada texto separado por 'separador'; 0 en los nulos"""
+    sep = '\\' + separador
+    # Cada elemento no vacío aporta exactamente un tramo que empieza en su primer carácter visible
+    return _por_distintos(serie, lambda texto: texto.str.count(rf'[^{sep}\s][^{sep}]*').to_numpy(dtype=float), 0.0)
+
+def _contiene_alguno(texto: pd.Series, terminos: list) -> np.ndarray:
+    encontrado = np.zeros(len(texto), dtype=bool)
+    for termino in terminos:
+        encontrado |= texto.str.contains(termino, regex=False).to_numpy(dtype=bool)
+    return encontrado
+
+def _por_nivel(niveles: list, otro: float):
+    mapa = {}
+    for valores, puntaje in reversed(niveles):
+        mapa.update(dict.fromkeys(valores, puntaje))
+    return lambda valor: mapa.get(str(valor).strip(), otro)
+
+def _relevancia(palabras: pd.DataFrame, indice: pd.Index, coincide) -> np.ndarray:
+    """Fracción de palabras clave de cada fila de 'indice' para las que coincide(palabra) es verdadero,
+    agrupando la tabla explotada (tablas_normalizadas); las filas sin palabras valen 0"""
+    palabras = de_filas(palabras, indice)['palabra']
+    # Cada palabra distinta se evalúa una sola vez, sobre las categorías
+    por_categoria = np.array([bool(coincide(p.lower())) for p in palabras.cat.categories], dtype=float)
+    aciertos = pd.Series(por_categoria[palabras.cat.codes.to_numpy()], index=palabras.index)
+    fraccion = aciertos.groupby(level=0).mean()
+    return fraccion.reindex(indice, fill_value=0.0).to_numpy()
+
+def _algun_termino(terminos: list):
+    return lambda palabra: any(termino in palabra for termino in terminos)
+
+# ====================
+# ARTÍCULOS
+# ====================
+def _puntaje_jcr(jcr_group) -> float:
+    """Puntaje por el número al final del grupo JCR; NaN si no aplica"""
+    try:
+        jcr_num = float(jcr_group.split()[-1])
+    except Exception:
+        return np.nan
+    if jcr_num >= 4.0:
+        return 1.0
+    elif jcr_num >= 2.0:
+        return 0.7
+    elif jcr_num >= 1.0:
+        return 0.5
+    return np.nan
+
+def indice_calidad_revista(journal_abbrev: pd.Series, jcr_group: pd.Series) -> pd.Series:
+    """ICR: el grupo JCR si se puede interpretar; si no, el nivel de la revista"""
+    por_jcr = _por_valor(jcr_group, _puntaje_jcr, np.nan)
+    por_revista = _por_valor(journal_abbrev, _por_nivel(REVISTAS_NIVELES, 0.3), 0.3)
+    icr = np.where(np.isnan(por_jcr), por_revista, por_jcr)
+    return pd.Series(np.where(journal_abbrev.isna().to_numpy(), 0.3, icr), index=journal_abbrev.index)
+
+def coeficiente_colaboracion_articulos(coauthors: pd.Series) -> pd.Series:
+    """CC por número de autores separados por ';' (1 → 0, hasta 3 → 0.5, hasta 6 → 0.7, más → 1)"""
+    autores = _cuenta_no_vacios(coauthors, ';')
+    cc = np.select([autores == 1, autores <= 3, autores <= 6], [0.0, 0.5, 0.7], 1.0)
+    return pd.Series(np.where(coauthors.isna().to_numpy(), 0.0, cc), index=coauthors.index)
+
+def indice_relevancia_articulos(palabras: pd.DataFrame, indice: pd.Index, categorias: dict) -> pd.Series:
+    """IRT: fracción de palabras clave que pertenecen a alguna categoría"""
+    terminos = [termino for lista in categorias.values() for termino in lista]
+    return pd.Series(_relevancia(palabras, indice, _algun_termino(terminos)), index=indice)
+
+# ====================
+# TESIS
+# ====================
+def indice_calidad_tesis(tipo_tesis: pd.Series) -> pd.Series:
+    def calcular(texto: pd.Series) -> np.ndarray:
+        tipo = texto.str.strip().str.lower()
+        return np.select(
+            [tipo.str.contains(nivel, regex=False) for nivel in ("doctorado", "maestría", "licenciatura")],
+            [1.0, 0.7, 0.5], 0.3
+        )
+    return pd.Series(_por_distintos(tipo_tesis, calcular, 0.3), index=tipo_tesis.index)
+
+def coeficiente_colaboracion_tesis(directores: pd.Series, coautores: pd.Series) -> pd.Series:
+    """CC: directores (separados por ',') más coautores (por ';'), hasta 5"""
+    total = _cuenta_no_vacios(directores, ',') + _cuenta_no_vacios(coautores, ';')
+    return pd.Series(np.minimum(total / 5, 1.0), index=directores.index)
+
+def indice_relevancia_tesis(palabras: pd.DataFrame, indice: pd.Index) -> pd.Series:
+    return pd.Series(_relevancia(palabras, indice, _algun_termino(TERMINOS_TESIS)), index=indice)
+
+# ====================
+# LIBROS Y CAPÍTULOS
+# ====================
+def indice_calidad_editorial(editorial: pd.Series) -> pd.Series:
+    return pd.Series(_por_valor(editorial, _por_nivel(EDITORIALES_NIVELES, 0.3), 0.3), index=editorial.index)
+
+def coeficiente_internacionalizacion_libros(idiomas: pd.Series) -> pd.Series:
+    """CI de libros: idiomas disponibles (elementos separados por ','), hasta 2"""
+    ci = _por_distintos(idiomas, lambda texto: np.minimum(texto.str.count(',').to_numpy() + 1, 2) / 2, 0.0)
+    return pd.Series(ci, index=idiomas.index)
+
+def indice_relevancia_libros(palabras: pd.DataFrame, indice: pd.Index) -> pd.Series:
+    return pd.Series(_relevancia(palabras, indice, _algun_termino(TERMINOS_CARDIO)), index=indice)
+
+def coeficiente_colaboracion_capitulos(coautores: pd.Series) -> pd.Series:
+    """CC de capítulos: coautores separados por ';', hasta 5"""
+    coautores_num = _cuenta_no_vacios(coautores, ';')
+    return pd.Series(np.minimum(coautores_num, 5) / 5, index=coautores.index)
+
+def indice_relevancia_capitulos(palabras: pd.DataFrame, indice: pd.Index) -> pd.Series:
+    return pd.Series(_relevancia(palabras, indice, _algun_termino(TERMINOS_CAPITULOS)), index=indice)
+
+# ====================
+# CONGRESOS
+# ====================
+def indice_prestigio_congreso(titulo_congreso: pd.Series, tipo_congreso: pd.Series) -> pd.Series:
+    """IPC según el tipo de congreso y si el título menciona uno de los congresos reconocidos"""
+    internacional = _por_distintos(tipo_congreso, lambda texto: (texto.str.lower() == 'internacional').to_numpy(), False)
+    nacional = _por_distintos(tipo_congreso, lambda texto: (texto.str.lower() == 'nacional').to_numpy(), False)
+    reconocido_int = _por_distintos(titulo_congreso, lambda texto: _contiene_alguno(texto.str.lower(), CONGRESOS_INTERNACIONALES), False)
+    reconocido_nac = _por_distintos(titulo_congreso, lambda texto: _contiene_alguno(texto.str.lower(), CONGRESOS_NACIONALES), False)
+    ipc = np.select(
+        [internacional & reconocido_int, internacional, nacional & reconocido_nac, nacional],
+        [1.0, 0.7, 0.6, 0.4], 0.3
+    )
+    nulos = (titulo_congreso.isna() | tipo_congreso.isna()).to_numpy()
+    return pd.Series(np.where(nulos, 0.3, ipc), index=titulo_congreso.index)
+
+def coeficiente_internacionalizacion_congresos(pais: pd.Series, tipo_congreso: pd.Series) -> pd.Series:
+    """CI de congresos: país sede de los internacionales"""
+    internacional = _por_distintos(tipo_congreso, lambda texto: (texto.str.lower() == 'internacional').to_numpy(), False)
+    pais_nivel = _por_distintos(
+        pais, lambda texto: np.select([texto.str.strip().isin(PAISES_NIVEL1), texto.str.strip().isin(PAISES_NIVEL2)], [1.0, 0.8], 0.6), 0.6
+    )
+    ci = np.where(internacional, pais_nivel, 0.3)
+    nulos = (pais.isna() | tipo_congreso.isna()).to_numpy()
+    return pd.Series(np.where(nulos, 0.0, ci), index=pais.index)
+
+def indice_relevancia_congresos(linea_investigacion: pd.Series) -> pd.Series:
+    """IRT de congresos: términos de cardiología presentes en la línea de investigación"""
+    def puntaje(valor) -> float:
+        if not isinstance(valor, str):
+            return 0.0
+        valor = valor.lower()
+        return min(sum(1 for termino in TERMINOS_CARDIO if termino in valor) / len(TERMINOS_CARDIO), 1.0)
+    return pd.Series(_por_valor(linea_investigacion, puntaje, 0.0), index=linea_investigacion.index)
+
+# ====================
+# MÉTRICAS POR TIPO
+# ====================
+def metricas(tipo: str, df: pd.DataFrame, categorias: dict = None, terminos: pd.DataFrame = None) -> pd.DataFrame:
+    """df con las columnas de métricas del tablero y el PI; 'categorias' = KEYWORD_CATEGORIES (artículos),
+    'terminos' = tabla 'terminos' del cargador (si falta, se construye aquí)"""
+    palabras = terminos
+    if palabras is None and 'selected_keywords' in df.columns:
+        palabras = explotar(df, 'selected_keywords', partir_terminos, 'palabra')
+    if tipo == 'articulos':
+        df = df.assign(
+            ICR=indice_calidad_revista(df['journal_abbrev'], df['jcr_group']),
+            CC=coeficiente_colaboracion_articulos(df['coauthors']),
+            IRT=indice_relevancia_articulos(palabras, df.index, categorias or {})
+        )
+    elif tipo == 'tesis':
+        df = df.assign(
+            ICT=indice_calidad_tesis(df['tipo_tesis']),
+            CC=coeficiente_colaboracion_tesis(df['directores'], df['coautores']),
+            IRT=indice_relevancia_tesis(palabras, df.index)
+        )
+    elif tipo == 'libros':
+        df = df.assign(
+            ICE=indice_calidad_editorial(df['editorial']),
+            CI=coeficiente_internacionalizacion_libros(df['idiomas_disponibles']),
+            IRT=indice_relevancia_libros(palabras, df.index)
+        )
+    elif tipo == 'capitulos':
+        df = df.assign(
+            ICE=indice_calidad_editorial(df['editorial']),
+            CC=coeficiente_colaboracion_capitulos(df['coautores_secundarios']),
+            IRT=indice_relevancia_capitulos(palabras, df.index)
+        )
+    elif tipo == 'congresos':
+        df = df.assign(
+            IPC=indice_prestigio_congreso(df['titulo_congreso'], df['tipo_congreso']),
+            CI=coeficiente_internacionalizacion_congresos(df['pais'], df['tipo_congreso']),
+            IRT=indice_relevancia_congresos(df['linea_investigacion'])
+        )
+    else:
+        raise ValueError(f"Tipo de producto desconocido: {tipo}")
+    pesos = PESOS_PI[tipo]
+    # Misma suma, en el mismo orden, que en los tableros
+    columnas_pi = list(pesos)
+    pi = pesos[columnas_pi[0]] * df[columnas_pi[0]]
+    for columna in columnas_pi[1:]:
+        pi = pi + pesos[columna] * df[columna]
+    return df.assign(PI=pi)
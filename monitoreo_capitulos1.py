@@ -6,10 +6,22 @@ import calendar
 import paramiko
 import time
 import os
+import hmac
 import logging
 import zipfile
+import tempfile
 from pathlib import Path
 from PIL import Image
+from cache_local import cache_desde_secrets
+from esquemas import leer_csv, requeridas
+from metricas_vectorizadas import metricas
+from cubo_mensual import construir_cubo, por_investigador
+from tablas_normalizadas import distintos, tablas_laterales
+from indice_periodo import IndicePeriodo
+from duplicados import COLUMNA_GRUPO, con_grupos
+from reporte_excel import MIME_XLSX, TOP_N, generar_reporte, hoja_resumen, limpiar_reportes
+from consolidador import consolidar, hay_cambios, quitar_bajas_total, sellar_total, total_vigente, version_descargada
+from espejo_columnar import actualizar_espejo, columnas_espejo, leer_espejo, leer_periodo
 
 # Configuración de logging
 logging.basicConfig(
@@ -51,8 +63,30 @@ class Config:
         self.LOGO_PATH = "escudo_COLOR.jpg"
         self.COLUMN_WIDTH = "200px"  # Ancho fijo para columnas
 
+        # Caché local por contenido para PDF y temporales ([cache] dir y max_mb en secrets.toml)
+        self.CACHE = cache_desde_secrets(st.secrets)
+
+        # Consolidación incremental opcional ([consolidador] incremental = true en secrets.toml);
+        # si falla o está desactivada se ejecuta el generador remoto
+        self.CONSOLIDADOR_INCREMENTAL = st.secrets.get("consolidador", {}).get("incremental", False)
+        # Cada cuántos segundos una sesión abierta consulta si el total cambió ([sincronizacion] revision_segundos)
+        self.REVISION_SEGUNDOS = st.secrets.get("sincronizacion", {}).get("revision_segundos", 300)
+        self.PREFIJOS_FUENTE = [st.secrets['prefixes'].get('capitulos', 'capitulos_')]
+
+        # Clave para "Forzar actualización" ([admin] clave en secrets.toml); sin ella no se muestra el control
+        self.ADMIN_CLAVE = st.secrets.get("admin", {}).get("clave")
+
 CONFIG = Config()
 
+def version_archivo(path: str):
+    """(tamaño, mtime) del archivo, o None si no existe"""
+    try:
+        estado = os.stat(path)
+        return (estado.st_size, estado.st_mtime)
+    except FileNotFoundError:
+        return None
+
+
 # ==================
 # CLASE SSH MEJORADA (se mantiene igual)
 # ==================
@@ -108,14 +142,23 @@ class SSHManager:
             try:
                 with ssh.open_sftp() as sftp:
                     try:
-                        sftp.stat(remote_path)
+                        atributos = sftp.stat(remote_path)
                     except FileNotFoundError:
                         logging.error(f"Archivo remoto no encontrado: {remote_path}")
                         return False
-                        
+
+                    # La copia local lleva el tamaño y el mtime del remoto: si coinciden, ya es esa versión
+                    if version_descargada(local_path) == (atributos.st_size, atributos.st_mtime):
+                        logging.info(f"Sin cambios en {remote_path}; se conserva {local_path}")
+                        return True
+
                     sftp.get(remote_path, local_path)
                     
                     if SSHManager.verify_file_integrity(local_path, remote_path, sftp):
+                        os.utime(local_path, (atributos.st_atime, atributos.st_mtime))
+                        # El total de generadorcapitulos.sh trae las filas dadas de baja (lápidas)
+                        quitar_bajas_total(sftp, CONFIG.REMOTE['DIR'], CONFIG.REMOTE_CAPITULOS_FILE, 'capitulos',
+                                           CONFIG.PREFIJOS_FUENTE, local_path)
                         logging.info(f"Archivo descargado correctamente: {remote_path} a {local_path}")
                         return True
                     else:
@@ -134,8 +177,27 @@ class SSHManager:
             finally:
                 ssh.close()
 
-def ejecutar_generador_remoto():
-    """Ejecuta el script generadorcapitulos.sh en el servidor remoto"""
+def consolidar_incremental(completo: bool = False):
+    """Actualiza el total en el servidor leyendo solo los CSV por investigador que cambiaron"""
+    ssh = SSHManager.get_connection()
+    if not ssh:
+        return False
+    try:
+        with st.spinner("🔄 Consolidando cambios en el servidor..."):
+            with ssh.open_sftp() as sftp:
+                resumen = consolidar(sftp, CONFIG.REMOTE['DIR'], 'capitulos',
+                                     prefijos=CONFIG.PREFIJOS_FUENTE, total=CONFIG.REMOTE_CAPITULOS_FILE, completo=completo)
+        logging.info(f"Consolidación incremental: {resumen['leidos']} de {resumen['fuentes']} archivos leídos")
+        return True
+    except Exception as e:
+        logging.error(f"Error en consolidación incremental: {str(e)}")
+        st.warning("⚠️ Falló la consolidación incremental; se ejecuta el generador remoto")
+        return False
+    finally:
+        ssh.close()
+
+def ejecutar_generador_remoto(forzar: bool = False):
+    """Ejecuta el script generadorcapitulos.sh en el servidor remoto; solo si algún archivo de investigador es más reciente que el total (o si se fuerza)"""
     ssh = None
     try:
         with st.spinner("🔄 Ejecutando generadorcapitulos.sh en servidor remoto..."):
@@ -149,6 +211,12 @@ def ejecutar_generador_remoto():
             try:
                 sftp.stat(CONFIG.REMOTE_GENERADOR_PATH)
                 logging.info(f"Script encontrado en: {CONFIG.REMOTE_GENERADOR_PATH}")
+
+                # 2. Comprobar si hace falta: un listdir_attr compara las fuentes con el total
+                vigente, fuentes_mtime = total_vigente(sftp, CONFIG.REMOTE['DIR'], CONFIG.PREFIJOS_FUENTE, CONFIG.REMOTE_CAPITULOS_FILE)
+                if vigente and not forzar:
+                    logging.info(f"{CONFIG.REMOTE_CAPITULOS_FILE} al día; no se ejecuta el generador")
+                    return True
             except FileNotFoundError:
                 st.error(f"❌ Error: No se encontró el script en {CONFIG.REMOTE_GENERADOR_PATH}")
                 logging.error(f"Script no encontrado: {CONFIG.REMOTE_GENERADOR_PATH}")
@@ -156,7 +224,7 @@ def ejecutar_generador_remoto():
             finally:
                 sftp.close()
 
-            # 2. Ejecutar el script en el directorio correcto
+            # 3. Ejecutar el script en el directorio correcto
             comando = f"cd {CONFIG.REMOTE['DIR']} && bash {CONFIG.REMOTE_GENERADOR_PATH}"
             logging.info(f"Ejecutando comando: {comando}")
             
@@ -165,7 +233,7 @@ def ejecutar_generador_remoto():
             output = stdout.read().decode('utf-8').strip()
             error = stderr.read().decode('utf-8').strip()
 
-            # 3. Verificar resultados
+            # 4. Verificar resultados
             if exit_status != 0:
                 error_msg = f"Código {exit_status}\nOutput: {output}\nError: {error}"
                 st.error(f"❌ Error en la ejecución: {error_msg}")
@@ -174,13 +242,14 @@ def ejecutar_generador_remoto():
 
             logging.info("Script ejecutado correctamente")
             
-            # 4. Verificar que el archivo se creó en la ubicación correcta
+            # 5. Verificar que el archivo se creó en la ubicación correcta
             sftp = ssh.open_sftp()
             output_path = os.path.join(CONFIG.REMOTE['DIR'], CONFIG.REMOTE_CAPITULOS_FILE)
             try:
                 sftp.stat(output_path)
                 file_size = sftp.stat(output_path).st_size
                 logging.info(f"Archivo creado en: {output_path} (Tamaño: {file_size} bytes)")
+                sellar_total(sftp, CONFIG.REMOTE['DIR'], CONFIG.REMOTE_CAPITULOS_FILE, fuentes_mtime)
                 st.success("✅ generadorcapitulos.sh ejecutado correctamente en el servidor")
                 return True
                 
@@ -219,13 +288,31 @@ def sync_capitulos_file():
         logging.error(f"Sync Error: {str(e)}")
         return False
 
+def datos_vencidos() -> bool:
+    """True si el total o sus fuentes cambiaron en el servidor; a lo más una consulta cada REVISION_SEGUNDOS por sesión"""
+    ahora = time.time()
+    if ahora - st.session_state.get('ultima_revision', 0.0) < CONFIG.REVISION_SEGUNDOS:
+        return False
+    st.session_state['ultima_revision'] = ahora
+    ssh = SSHManager.get_connection()
+    if not ssh:
+        return False
+    try:
+        with ssh.open_sftp() as sftp:
+            return hay_cambios(sftp, CONFIG.REMOTE['DIR'], CONFIG.PREFIJOS_FUENTE, CONFIG.REMOTE_CAPITULOS_FILE, "capitulos_total.csv")
+    except Exception as e:
+        logging.warning(f"No se pudo consultar la versión remota: {str(e)}")
+        return False
+    finally:
+        ssh.close()
+
 def highlight_author(author: str, investigator_name: str) -> str:
     """Resalta el nombre del investigador principal"""
     if investigator_name and investigator_name.lower() == author.lower():
         return f"<span style='background-color: {CONFIG.HIGHLIGHT_COLOR};'>{author}</span>"
     return author
 
-def generar_tabla_resumen(unique_capitulos, filtered_df):
+def generar_tabla_resumen(unique_capitulos, filtered_df, tablas):
     """Genera una tabla consolidada con todos los totales"""
     datos_resumen = []
     
@@ -242,23 +329,9 @@ def generar_tabla_resumen(unique_capitulos, filtered_df):
     datos_resumen.append(("Tipos de participación distintos", total_participaciones))
     
     # 4. Líneas de investigación
-    try:
-        all_keywords = []
-        for keywords in unique_capitulos['selected_keywords']:
-            if pd.notna(keywords):
-                keywords_str = str(keywords).strip()
-                if keywords_str.startswith('[') and keywords_str.endswith(']'):
-                    keywords_str = keywords_str[1:-1]
-                    import re
-                    keyword_list = re.split(r",\s*(?=(?:[^']*'[^']*')*[^']*$)", keywords_str)
-                    keyword_list = [k.strip().strip("'\"") for k in keyword_list if k.strip()]
-                    all_keywords.extend(keyword_list)
-                else:
-                    keyword_list = [k.strip() for k in keywords_str.split(",") if k.strip()]
-                    all_keywords.extend(keyword_list)
-        total_keywords = len(set(all_keywords)) if all_keywords else 0
-        datos_resumen.append(("Líneas de investigación distintas", total_keywords))
-    except:
+    if 'palabras' in tablas:
+        datos_resumen.append(("Líneas de investigación distintas", distintos(tablas['palabras'], unique_capitulos.index)))
+    else:
         datos_resumen.append(("Líneas de investigación distintas", "N/D"))
     
     # 5. Departamentos
@@ -336,69 +409,143 @@ def mostrar_tabla_uniforme(df, titulo, ayuda=None, max_rows=10):
     
     st.dataframe(df.head(max_rows), hide_index=True)
 
-# ====================
-# FUNCIONES DE MÉTRICAS PARA CAPÍTULOS
-# ====================
-def indice_calidad_editorial(editorial):
-    """Calcula el Índice de Calidad Editorial (ICE) basado en el prestigio de la editorial"""
-    if pd.isna(editorial):
-        return 0.3
-
-    editorial = str(editorial).strip()
-
-    # Definición de categorías de editoriales
-    editoriales_tier1 = ['Springer', 'Elsevier', 'Wiley', 'Nature', 'Oxford University Press']
-    editoriales_tier2 = ['Taylor & Francis', 'Cambridge University Press', 'Academic Press', 'Bentham Science Publishers']
-    editoriales_tier3 = ['Acta Biochimica Polonica', 'CRC Press']
-
-    if editorial in editoriales_tier1:
-        return 1.0
-    elif editorial in editoriales_tier2:
-        return 0.7
-    elif editorial in editoriales_tier3:
-        return 0.5
-    else:
-        return 0.3  # Editoriales no clasificadas
-
-def coeficiente_colaboracion(coautores):
-    """Calcula el Coeficiente de Colaboración (CC)"""
-    if pd.isna(coautores):
-        return 0.0
+def boton_pdf(remote_pdf_path: str, file_name: str, etiqueta: str, clave: str):
+    """Descarga de un PDF bajo demanda: solo se trae del servidor cuando el usuario lo pide"""
+    obtenidos = st.session_state.setdefault('pdfs_obtenidos', set())
+    if remote_pdf_path not in obtenidos:
+        if not st.button("Obtener PDF", key=f"obtener_{clave}"):
+            return
+        with st.spinner("Descargando PDF..."):
+            # Pasa por el caché: si el PDF no cambió en el servidor no se vuelve a descargar
+            if CONFIG.CACHE.descargar(SSHManager.get_connection, remote_pdf_path) is None:
+                st.error("No se pudo descargar el PDF seleccionado")
+                return
+        obtenidos.add(remote_pdf_path)
+
+    # Ya validado contra el servidor en esta sesión: se sirve del caché local sin conectarse
+    ruta = CONFIG.CACHE.buscar(remote_pdf_path)
+    if ruta is None:
+        obtenidos.discard(remote_pdf_path)
+        st.warning("El PDF salió del caché local; vuelva a obtenerlo")
+        return
+    with open(ruta, 'rb') as f:
+        st.download_button(
+            label=etiqueta,
+            data=f.read(),
+            file_name=file_name,
+            mime="application/pdf",
+            key=f"download_{clave}"
+        )
+
+def boton_csv(df, file_name: str, etiqueta: str, clave: str):
+    """Descarga de un CSV bajo demanda: los bytes se generan una vez, cuando el usuario los pide, y se
+    conservan en la sesión (la clave incluye la versión y el periodo)"""
+    preparados = st.session_state.setdefault('csv_preparados', {})
+    if clave not in preparados:
+        if not st.button("Preparar CSV", key=f"preparar_{clave}"):
+            return
+        preparados[clave] = df.to_csv(index=False).encode('utf-8')
+        # Solo los más recientes: los de periodos anteriores ya no se muestran
+        while len(preparados) > 20:
+            preparados.pop(next(iter(preparados)))
+    st.download_button(
+        label=etiqueta,
+        data=preparados[clave],
+        file_name=file_name,
+        mime='text/csv',
+        key=f"download_{clave}"
+    )
 
+def boton_excel(hojas: dict, file_name: str, etiqueta: str, clave: str):
+    """Reporte Excel bajo demanda en dos clics: el libro se escribe en disco por bloques cuando el usuario
+    lo pide (una vez por versión y periodo) y sus bytes se leen solo en ese rerun para el botón de descarga"""
+    preparados = st.session_state.setdefault('reportes_preparados', {})
+    if not st.button("Preparar reporte Excel", key=f"preparar_{clave}"):
+        return
+    ruta = preparados.get(clave)
+    if ruta is None or not Path(ruta).exists():
+        with st.spinner("Generando reporte..."):
+            try:
+                limpiar_reportes(tempfile.gettempdir())
+                # Mismo nombre para la misma versión y periodo: otras sesiones lo reemplazan completo
+                ruta = generar_reporte(hojas, Path(tempfile.gettempdir()) / f"{clave}.xlsx")
+            except Exception as e:
+                logging.error(f"Error al generar el reporte Excel: {str(e)}")
+                st.error("No se pudo generar el reporte Excel")
+                return
+        preparados[clave] = str(ruta)
     try:
-        # Procesar coautores (eliminar valores vacíos)
-        coautores_list = [c.strip() for c in str(coautores).split(";") if c.strip()]
-        return min(len(coautores_list), 5) / 5  # Normalizado a 0-1 (máx. 5 coautores)
-    except:
-        return 0.0
-
-def indice_relevancia_tematica(keywords):
-    """Calcula el Índice de Relevancia Temática (IRT) para capítulos"""
-    if pd.isna(keywords):
-        return 0.0
-
-    keywords_estrategicas = [
-        "hipertensión", "cardíaco", "miocardio", "arritmia",
-        "isquemia", "ECG", "insuficiencia cardíaca",
-        "coronario", "válvula", "aterosclerosis", "angina"
-    ]
+        with open(ruta, 'rb') as f:
+            datos = f.read()
+    except FileNotFoundError:
+        # Lo borró la limpieza de reportes viejos de otra sesión
+        preparados.pop(clave, None)
+        st.warning("El reporte ya no está disponible; vuelva a prepararlo")
+        return
+    st.download_button(
+        label=etiqueta,
+        data=datos,
+        file_name=file_name,
+        mime=MIME_XLSX,
+        key=f"download_{clave}"
+    )
 
-    try:
-        if isinstance(keywords, str):
-            # Limpiar y separar keywords
-            keywords_str = keywords.strip()
-            if keywords_str.startswith('[') and keywords_str.endswith(']'):
-                keywords_str = keywords_str[1:-1]
-                kw_list = [k.strip().strip("'\"") for k in keywords_str.split(",") if k.strip()]
-            else:
-                kw_list = [k.strip() for k in keywords_str.split(",") if k.strip()]
+def boton_archivo(ruta: str, etiqueta: str, clave: str):
+    """Descarga de un archivo local bajo demanda: sus bytes se leen solo en el rerun en que el usuario lo pide"""
+    if not Path(ruta).exists() or not st.button("Preparar dataset completo", key=f"preparar_{clave}"):
+        return
+    with open(ruta, 'rb') as f:
+        datos = f.read()
+    st.download_button(
+        label=etiqueta,
+        data=datos,
+        file_name=Path(ruta).name,
+        mime="text/csv",
+        key=f"download_{clave}"
+    )
 
-            # Calcular matches con términos estratégicos
-            matches = sum(1 for kw in kw_list if any(estrategico_kw in kw.lower() for estrategico_kw in keywords_estrategicas))
-            return matches / len(kw_list) if kw_list else 0.0
-        return 0.0
-    except:
-        return 0.0
+@st.cache_data(show_spinner=False, max_entries=2)
+def cargar_datos(version: tuple):
+    """Total tipado, solo con registros activos; se cachea entre reruns y sesiones por versión (tamaño, mtime) del archivo remoto"""
+    df = None
+    usar_espejo = False
+    if actualizar_espejo('capitulos', "capitulos_total.csv"):
+        # Espejo Parquet: aquí solo lo necesario para el selector; el periodo se lee después
+        df = leer_espejo('capitulos', "capitulos_total.csv", seleccion=['pub_date', 'estado'])
+        usar_espejo = df is not None
+    if df is None:
+        # Solo las columnas del esquema, con categorías, fechas y enteros ya tipados
+        df = leer_csv('capitulos', "capitulos_total.csv")
+    df.columns = df.columns.str.strip()
+
+    # Verificar campos importantes
+    required_columns = requeridas('capitulos')
+    disponibles = columnas_espejo('capitulos', "capitulos_total.csv") if usar_espejo else df.columns
+    missing_columns = [col for col in required_columns if col not in disponibles]
+
+    if missing_columns:
+        return df, usar_espejo, missing_columns, {}, None
+
+    # pub_date ya viene como fecha (esquemas.py); las inválidas son NaT
+    df = df[(df['estado'] == 'A') & (df['pub_date'].notna())].copy()
+    if not usar_espejo:
+        # Casi duplicados del mismo trabajo agrupados en cluster_id una vez por versión
+        df = con_grupos('capitulos', df)
+    # Ordenado por fecha y agrupado por investigador una vez por versión; con el espejo, en main
+    indice = None if usar_espejo else IndicePeriodo(df, 'pub_date', 'autor_principal')
+    if indice is not None:
+        df = indice.df
+    # Palabras clave explotadas una vez por versión; con el espejo se arman del periodo
+    return df, usar_espejo, [], tablas_laterales('capitulos', df), indice
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def cargar_cubo(version: tuple):
+    """Cubo mensual del total con las métricas ya sumadas y los cluster_id de cargar_datos, por la misma versión"""
+    df, usar_espejo, missing_columns, tablas, _ = cargar_datos(version)
+    # Con el espejo el cubo se arma en main del mismo periodo (y los mismos grupos) que las tablas
+    if missing_columns or usar_espejo:
+        return None
+    return construir_cubo('capitulos', df, terminos=tablas.get('terminos'))
 
 # ====================
 # FUNCIÓN MAIN MODIFICADA PARA CAPÍTULOS
@@ -416,13 +563,29 @@ def main():
 
     st.title("Análisis de Capítulos de Libros")
 
-    # Paso 1: Ejecutar generador remoto para actualizar datos
-    if not ejecutar_generador_remoto():
-        st.warning("⚠️ Continuando con datos existentes (pueden no estar actualizados)")
-
-    # Paso 2: Sincronizar archivo capitulos_total.csv
-    if not sync_capitulos_file():
-        st.warning("⚠️ Trabajando con copia local de capitulos_total.csv debido a problemas de conexión")
+    # Forzar actualización (administradores): regenera el total aunque las fuentes no hayan cambiado
+    if CONFIG.ADMIN_CLAVE:
+        with st.sidebar.expander("🔐 Administración"):
+            clave = st.text_input("Clave de administrador", type="password")
+            if hmac.compare_digest(clave.encode('utf-8'), str(CONFIG.ADMIN_CLAVE).encode('utf-8')) \
+                    and st.button("🔄 Forzar actualización"):
+                st.session_state['datos_sincronizados'] = False
+                st.session_state['forzar_generador'] = True
+                cargar_datos.clear()
+
+    # Pasos 1 y 2 al abrir la sesión y cuando la consulta periódica (datos_vencidos) ve cambios en el
+    # servidor: al mover un filtro o abrir un expander no se consolida ni se descarga
+    if not st.session_state.get('datos_sincronizados') or datos_vencidos():
+        forzar = st.session_state.pop('forzar_generador', False)
+        # Paso 1: Actualizar el total en el servidor (incremental si está activado; si no, generador remoto)
+        if not (CONFIG.CONSOLIDADOR_INCREMENTAL and consolidar_incremental(completo=forzar)) and not ejecutar_generador_remoto(forzar):
+            st.warning("⚠️ Continuando con datos existentes (pueden no estar actualizados)")
+
+        # Paso 2: Sincronizar archivo capitulos_total.csv
+        if not sync_capitulos_file():
+            st.warning("⚠️ Trabajando con copia local de capitulos_total.csv debido a problemas de conexión")
+        st.session_state['datos_sincronizados'] = True
+        st.session_state['ultima_revision'] = time.time()
 
     # Verificar si el archivo local existe
     if not Path("capitulos_total.csv").exists():
@@ -430,26 +593,14 @@ def main():
         return
 
     try:
-        # Leer y procesar el archivo
-        df = pd.read_csv("capitulos_total.csv", header=0, encoding='utf-8')
-        df.columns = df.columns.str.strip()
-
-        # Verificar campos importantes
-        required_columns = ['economic_number', 'nombramiento', 'sni', 'sii', 'departamento', 
-                          'autor_principal', 'tipo_participacion', 'titulo_libro', 'titulo_capitulo',
-                          'editorial', 'coautores_secundarios', 'year', 'pub_date', 'isbn_issn',
-                          'numero_edicion', 'paginas', 'idiomas_disponibles', 'selected_keywords',
-                          'pdf_filename', 'estado']
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        # Leer y procesar el archivo (cacheado mientras el archivo remoto no cambie)
+        version = version_archivo("capitulos_total.csv")
+        df, usar_espejo, missing_columns, tablas, indice = cargar_datos(version)
 
         if missing_columns:
             st.warning(f"El archivo capitulos_total.csv no contiene los campos requeridos: {', '.join(missing_columns)}")
             return
 
-        # Convertir y validar fechas
-        df['pub_date'] = pd.to_datetime(df['pub_date'], errors='coerce')
-        df = df[(df['estado'] == 'A') & (df['pub_date'].notna())].copy()
-
         if df.empty:
             st.warning("No hay capítulos válidos para analizar")
             return
@@ -482,11 +633,18 @@ def main():
         date_end = datetime(end_year, end_month, end_day)
 
         # Filtrar dataframe
-        filtered_df = df[(df['pub_date'] >= pd.to_datetime(date_start)) &
-                       (df['pub_date'] <= pd.to_datetime(date_end))].copy()
+        if usar_espejo:
+            # Solo las particiones y grupos de filas del periodo seleccionado
+            filtered_df = con_grupos('capitulos', leer_periodo('capitulos', "capitulos_total.csv", desde=date_start, hasta=date_end))
+            indice = IndicePeriodo(filtered_df, 'pub_date', 'autor_principal')
+            filtered_df = indice.df
+            tablas = tablas_laterales('capitulos', filtered_df)
+        else:
+            # Corte por búsqueda binaria sobre el total ordenado por fecha
+            filtered_df = indice.periodo(date_start, date_end)
 
         # Obtener capítulos únicos
-        unique_capitulos = filtered_df.drop_duplicates(subset=['titulo_capitulo']).copy()
+        unique_capitulos = filtered_df.drop_duplicates(subset=[COLUMNA_GRUPO]).copy()
 
         st.markdown(f"**Periodo seleccionado:** {date_start.strftime('%d/%m/%Y')} - {date_end.strftime('%d/%m/%Y')}")
         st.markdown(f"**Registros encontrados:** {len(filtered_df)}")
@@ -503,8 +661,8 @@ def main():
         # TABLA DE PRODUCTIVIDAD POR INVESTIGADOR
         # =============================================
         st.header("🔍 Productividad por investigador")
-        investigator_stats = filtered_df.groupby(['autor_principal', 'economic_number', 'nombramiento', 'sni', 'sii', 'departamento']).agg(
-            Capitulos_Unicos=('titulo_capitulo', lambda x: len(set(x))),
+        investigator_stats = filtered_df.groupby(['autor_principal', 'economic_number', 'nombramiento', 'sni', 'sii', 'departamento'], observed=True).agg(
+            Capitulos_Unicos=(COLUMNA_GRUPO, 'nunique'),
             Participaciones=('tipo_participacion', lambda x: ', '.join(sorted(set(x))))
         ).reset_index()
         investigator_stats = investigator_stats.sort_values('Capitulos_Unicos', ascending=False)
@@ -515,8 +673,8 @@ def main():
         # Detalle expandible por investigador
         for index, row in investigator_stats.iterrows():
             with st.expander(f"{row['Investigador']} - {row['Capítulos únicos']} capítulos"):
-                investigator_capitulos = filtered_df[filtered_df['autor_principal'] == row['Investigador']]
-                unique_capitulos_investigator = investigator_capitulos.drop_duplicates(subset=['titulo_capitulo'])
+                investigator_capitulos = indice.de_investigador(row['Investigador'], date_start, date_end)
+                unique_capitulos_investigator = investigator_capitulos.drop_duplicates(subset=[COLUMNA_GRUPO])
 
                 display_columns = ['titulo_capitulo', 'titulo_libro', 'editorial', 'pub_date', 'isbn_issn']
                 if 'paginas' in unique_capitulos_investigator.columns:
@@ -540,38 +698,15 @@ def main():
                     )
 
                     if selected_pdf:
-                        temp_pdf_path = f"temp_{selected_pdf}"
-                        remote_pdf_path = os.path.join(CONFIG.REMOTE['DIR'], selected_pdf)
-
-                        if SSHManager.download_remote_file(remote_pdf_path, temp_pdf_path):
-                            with open(temp_pdf_path, "rb") as f:
-                                pdf_bytes = f.read()
-
-                            st.download_button(
-                                label="Descargar este capítulo",
-                                data=pdf_bytes,
-                                file_name=selected_pdf,
-                                mime="application/pdf",
-                                key=f"download_pdf_{row['Número económico']}_{index}"
-                            )
-
-                            try:
-                                os.remove(temp_pdf_path)
-                            except:
-                                pass
-                        else:
-                            st.error("No se pudo descargar el PDF seleccionado")
+                        # Solo se descarga cuando el usuario lo pide, no en cada rerun
+                        boton_pdf(os.path.join(CONFIG.REMOTE['DIR'], selected_pdf), selected_pdf,
+                                  "Descargar este capítulo", f"pdf_{row['Número económico']}_{index}")
                 else:
                     st.warning("No se encontraron capítulos en PDF para este investigador")
 
-                csv = unique_capitulos_investigator.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    label="Descargar producción de capítulos en CSV",
-                    data=csv,
-                    file_name=f"capitulos_{row['Investigador'].replace(' ', '_')}.csv",
-                    mime='text/csv',
-                    key=f"download_csv_{row['Número económico']}_{index}"
-                )
+                boton_csv(unique_capitulos_investigator, f"capitulos_{row['Investigador'].replace(' ', '_')}.csv",
+                          "Descargar producción de capítulos en CSV",
+                          f"csv_{row['Número económico']}_{index}_{version[0]}_{int(version[1])}_{date_start:%Y%m%d}_{date_end:%Y%m%d}")
 
         # =============================================
         # SECCIÓN DE MÉTRICAS DE CALIDAD
@@ -580,24 +715,14 @@ def main():
 
         # Calcular métricas para cada capítulo único
         with st.spinner("Calculando métricas de calidad..."):
-            unique_capitulos = unique_capitulos.assign(
-                ICE=unique_capitulos['editorial'].apply(indice_calidad_editorial),
-                CC=unique_capitulos['coautores_secundarios'].apply(coeficiente_colaboracion),
-                IRT=unique_capitulos['selected_keywords'].apply(indice_relevancia_tematica)
-            )
-            unique_capitulos = unique_capitulos.assign(
-                PI=0.5 * unique_capitulos['ICE'] + 0.3 * unique_capitulos['CC'] + 0.2 * unique_capitulos['IRT']
-            )
+            unique_capitulos = metricas('capitulos', unique_capitulos, terminos=tablas.get('terminos'))
 
         # Mostrar tabla de resultados por investigador
         st.subheader("Métricas por Investigador")
-        metrics_by_investigator = unique_capitulos.groupby('autor_principal').agg({
-            'ICE': 'mean',
-            'CC': 'mean',
-            'IRT': 'mean',
-            'PI': 'mean',
-            'titulo_capitulo': 'count'
-        }).reset_index()
+        # Promedios por investigador sumando la rebanada del cubo (no se recalculan por periodo); con el espejo
+        # se arma del periodo ya leído, así sus grupos de casi duplicados son los de las tablas
+        cubo = construir_cubo('capitulos', filtered_df, terminos=tablas.get('terminos')) if usar_espejo else cargar_cubo(version)
+        metrics_by_investigator = por_investigador('capitulos', cubo, date_start, date_end)
 
         metrics_by_investigator.columns = [
             'Investigador',
@@ -701,23 +826,30 @@ def main():
         col1, col2, col3 = st.columns(3)
 
         with col1:
-            csv_metricas = metricas_df.to_csv(index=False).encode('utf-8')
-            st.download_button(
-                label="Descargar métricas de calidad (CSV)",
-                data=csv_metricas,
-                file_name="metricas_calidad_capitulos.csv",
-                mime='text/csv'
+            # Resumen, productividad, métricas, top N y registros del periodo en un solo libro
+            boton_excel(
+                {
+                    'Resumen': hoja_resumen({
+                        'Periodo': f"{date_start.strftime('%d/%m/%Y')} - {date_end.strftime('%d/%m/%Y')}",
+                        'Registros encontrados': len(filtered_df),
+                        'Capítulos únicos': len(unique_capitulos),
+                        'Registros duplicados': len(filtered_df) - len(unique_capitulos),
+                        'Investigadores': len(investigator_stats),
+                        'Puntaje Integrado (PI) promedio': round(float(unique_capitulos['PI'].mean()), 2),
+                    }),
+                    'Por investigador': investigator_stats,
+                    'Métricas por investigador': metrics_by_investigator,
+                    'Métricas por producto': metricas_df,
+                    f'Top {TOP_N}': metricas_df.head(TOP_N),
+                    'Registros': filtered_df,
+                },
+                f"reporte_capitulos_{date_start:%Y%m%d}_{date_end:%Y%m%d}.xlsx",
+                "Descargar reporte (Excel)",
+                f"reporte_capitulos_{version[0]}_{int(version[1])}_{date_start:%Y%m%d}_{date_end:%Y%m%d}"
             )
 
         with col2:
-            if Path("capitulos_total.csv").exists():
-                with open("capitulos_total.csv", "rb") as file:
-                    st.download_button(
-                        label="Descargar dataset completo",
-                        data=file,
-                        file_name="capitulos_total.csv",
-                        mime="text/csv"
-                    )
+            boton_archivo("capitulos_total.csv", "Descargar dataset completo", f"dataset_{version[0]}_{int(version[1])}")
 
         with col3:
             # Botón para descargar todos los PDFs con prefijo CAP
@@ -727,9 +859,8 @@ def main():
                     if ssh:
                         try:
                             with ssh.open_sftp() as sftp:
-                                sftp.chdir(CONFIG.REMOTE['DIR'])
                                 pdf_files = []
-                                for filename in sftp.listdir():
+                                for filename in sftp.listdir(CONFIG.REMOTE['DIR']):
                                     if (filename.startswith('CAP')) and filename.lower().endswith('.pdf'):
                                         pdf_files.append(filename)
 
@@ -742,11 +873,12 @@ def main():
                                     zip_buffer = io.BytesIO()
                                     with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
                                         for pdf_file in pdf_files:
-                                            temp_path = f"temp_{pdf_file}"
                                             remote_path = os.path.join(CONFIG.REMOTE['DIR'], pdf_file)
-                                            if SSHManager.download_remote_file(remote_path, temp_path):
-                                                zip_file.write(temp_path, pdf_file)
-                                                os.remove(temp_path)
+                                            # Misma conexión y caché: solo se descargan los PDF nuevos o modificados
+                                            try:
+                                                zip_file.write(CONFIG.CACHE.obtener(sftp, remote_path), pdf_file)
+                                            except Exception as e:
+                                                logging.warning(f"No se pudo agregar {pdf_file} al ZIP: {str(e)}")
 
                                     zip_buffer.seek(0)
                                     st.download_button(
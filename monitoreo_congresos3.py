@@ -6,10 +6,22 @@ import calendar
 import paramiko
 import time
 import os
+import hmac
 import logging
 import zipfile
+import tempfile
 from pathlib import Path
 from PIL import Image
+from cache_local import cache_desde_secrets
+from esquemas import leer_csv
+from metricas_vectorizadas import metricas
+from cubo_mensual import construir_cubo, por_investigador
+from tablas_normalizadas import distintos, tablas_laterales
+from indice_periodo import IndicePeriodo
+from duplicados import COLUMNA_GRUPO, con_grupos
+from reporte_excel import MIME_XLSX, TOP_N, generar_reporte, hoja_resumen, limpiar_reportes
+from consolidador import consolidar, hay_cambios, quitar_bajas_total, sellar_total, total_vigente, version_descargada
+from espejo_columnar import actualizar_espejo, columnas_espejo, leer_espejo, leer_periodo
 
 # Configuración de logging
 logging.basicConfig(
@@ -51,8 +63,30 @@ class Config:
         self.LOGO_PATH = "escudo_COLOR.jpg"
         self.COLUMN_WIDTH = "200px"  # Ancho fijo para todas las columnas
 
+        # Caché local por contenido para PDF y temporales ([cache] dir y max_mb en secrets.toml)
+        self.CACHE = cache_desde_secrets(st.secrets)
+
+        # Consolidación incremental opcional ([consolidador] incremental = true en secrets.toml);
+        # si falla o está desactivada se ejecuta el generador remoto
+        self.CONSOLIDADOR_INCREMENTAL = st.secrets.get("consolidador", {}).get("incremental", False)
+        # Cada cuántos segundos una sesión abierta consulta si el total cambió ([sincronizacion] revision_segundos)
+        self.REVISION_SEGUNDOS = st.secrets.get("sincronizacion", {}).get("revision_segundos", 300)
+        self.PREFIJOS_FUENTE = [st.secrets['prefixes'].get('congresos', 'congresos_')]
+
+        # Clave para "Forzar actualización" ([admin] clave en secrets.toml); sin ella no se muestra el control
+        self.ADMIN_CLAVE = st.secrets.get("admin", {}).get("clave")
+
 CONFIG = Config()
 
+def version_archivo(path: str):
+    """(tamaño, mtime) del archivo, o None si no existe"""
+    try:
+        estado = os.stat(path)
+        return (estado.st_size, estado.st_mtime)
+    except FileNotFoundError:
+        return None
+
+
 # ==================
 # CLASE SSH MEJORADA (se mantiene igual)
 # ==================
@@ -108,14 +142,23 @@ class SSHManager:
             try:
                 with ssh.open_sftp() as sftp:
                     try:
-                        sftp.stat(remote_path)
+                        atributos = sftp.stat(remote_path)
                     except FileNotFoundError:
                         logging.error(f"Archivo remoto no encontrado: {remote_path}")
                         return False
-                        
+
+                    # La copia local lleva el tamaño y el mtime del remoto: si coinciden, ya es esa versión
+                    if version_descargada(local_path) == (atributos.st_size, atributos.st_mtime):
+                        logging.info(f"Sin cambios en {remote_path}; se conserva {local_path}")
+                        return True
+
                     sftp.get(remote_path, local_path)
                     
                     if SSHManager.verify_file_integrity(local_path, remote_path, sftp):
+                        os.utime(local_path, (atributos.st_atime, atributos.st_mtime))
+                        # El total de generadorcongresos.sh trae las filas dadas de baja (lápidas)
+                        quitar_bajas_total(sftp, CONFIG.REMOTE['DIR'], CONFIG.REMOTE_CONGRESOS_FILE, 'congresos',
+                                           CONFIG.PREFIJOS_FUENTE, local_path)
                         logging.info(f"Archivo descargado correctamente: {remote_path} a {local_path}")
                         return True
                     else:
@@ -134,8 +177,27 @@ class SSHManager:
             finally:
                 ssh.close()
 
-def ejecutar_generador_remoto():
-    """Ejecuta el script generadorcongresos.sh en el servidor remoto"""
+def consolidar_incremental(completo: bool = False):
+    """Actualiza el total en el servidor leyendo solo los CSV por investigador que cambiaron"""
+    ssh = SSHManager.get_connection()
+    if not ssh:
+        return False
+    try:
+        with st.spinner("🔄 Consolidando cambios en el servidor..."):
+            with ssh.open_sftp() as sftp:
+                resumen = consolidar(sftp, CONFIG.REMOTE['DIR'], 'congresos',
+                                     prefijos=CONFIG.PREFIJOS_FUENTE, total=CONFIG.REMOTE_CONGRESOS_FILE, completo=completo)
+        logging.info(f"Consolidación incremental: {resumen['leidos']} de {resumen['fuentes']} archivos leídos")
+        return True
+    except Exception as e:
+        logging.error(f"Error en consolidación incremental: {str(e)}")
+        st.warning("⚠️ Falló la consolidación incremental; se ejecuta el generador remoto")
+        return False
+    finally:
+        ssh.close()
+
+def ejecutar_generador_remoto(forzar: bool = False):
+    """Ejecuta el script generadorcongresos.sh en el servidor remoto; solo si algún archivo de investigador es más reciente que el total (o si se fuerza)"""
     ssh = None
     try:
         with st.spinner("🔄 Ejecutando generadorcongresos.sh en servidor remoto..."):
@@ -149,6 +211,12 @@ def ejecutar_generador_remoto():
             try:
                 sftp.stat(CONFIG.REMOTE_GENERADOR_PATH)
                 logging.info(f"Script encontrado en: {CONFIG.REMOTE_GENERADOR_PATH}")
+
+                # 2. Comprobar si hace falta: un listdir_attr compara las fuentes con el total
+                vigente, fuentes_mtime = total_vigente(sftp, CONFIG.REMOTE['DIR'], CONFIG.PREFIJOS_FUENTE, CONFIG.REMOTE_CONGRESOS_FILE)
+                if vigente and not forzar:
+                    logging.info(f"{CONFIG.REMOTE_CONGRESOS_FILE} al día; no se ejecuta el generador")
+                    return True
             except FileNotFoundError:
                 st.error(f"❌ Error: No se encontró el script en {CONFIG.REMOTE_GENERADOR_PATH}")
                 logging.error(f"Script no encontrado: {CONFIG.REMOTE_GENERADOR_PATH}")
@@ -156,7 +224,7 @@ def ejecutar_generador_remoto():
             finally:
                 sftp.close()
 
-            # 2. Ejecutar el script en el directorio correcto
+            # 3. Ejecutar el script en el directorio correcto
             comando = f"cd {CONFIG.REMOTE['DIR']} && bash {CONFIG.REMOTE_GENERADOR_PATH}"
             logging.info(f"Ejecutando comando: {comando}")
             
@@ -165,7 +233,7 @@ def ejecutar_generador_remoto():
             output = stdout.read().decode('utf-8').strip()
             error = stderr.read().decode('utf-8').strip()
 
-            # 3. Verificar resultados
+            # 4. Verificar resultados
             if exit_status != 0:
                 error_msg = f"Código {exit_status}\nOutput: {output}\nError: {error}"
                 st.error(f"❌ Error en la ejecución: {error_msg}")
@@ -174,13 +242,14 @@ def ejecutar_generador_remoto():
 
             logging.info("Script ejecutado correctamente")
             
-            # 4. Verificar que el archivo se creó en la ubicación correcta
+            # 5. Verificar que el archivo se creó en la ubicación correcta
             sftp = ssh.open_sftp()
             output_path = os.path.join(CONFIG.REMOTE['DIR'], CONFIG.REMOTE_CONGRESOS_FILE)
             try:
                 sftp.stat(output_path)
                 file_size = sftp.stat(output_path).st_size
                 logging.info(f"Archivo creado en: {output_path} (Tamaño: {file_size} bytes)")
+                sellar_total(sftp, CONFIG.REMOTE['DIR'], CONFIG.REMOTE_CONGRESOS_FILE, fuentes_mtime)
                 st.success("✅ generadorcongresos.sh ejecutado correctamente en el servidor")
                 return True
                 
@@ -219,13 +288,31 @@ def sync_congresos_file():
         logging.error(f"Sync Error: {str(e)}")
         return False
 
+def datos_vencidos() -> bool:
+    """True si el total o sus fuentes cambiaron en el servidor; a lo más una consulta cada REVISION_SEGUNDOS por sesión"""
+    ahora = time.time()
+    if ahora - st.session_state.get('ultima_revision', 0.0) < CONFIG.REVISION_SEGUNDOS:
+        return False
+    st.session_state['ultima_revision'] = ahora
+    ssh = SSHManager.get_connection()
+    if not ssh:
+        return False
+    try:
+        with ssh.open_sftp() as sftp:
+            return hay_cambios(sftp, CONFIG.REMOTE['DIR'], CONFIG.PREFIJOS_FUENTE, CONFIG.REMOTE_CONGRESOS_FILE, "pro_congresos_total.csv")
+    except Exception as e:
+        logging.warning(f"No se pudo consultar la versión remota: {str(e)}")
+        return False
+    finally:
+        ssh.close()
+
 def highlight_author(author: str, investigator_name: str) -> str:
     """Resalta el nombre del investigador principal"""
     if investigator_name and investigator_name.lower() == author.lower():
         return f"<span style='background-color: {CONFIG.HIGHLIGHT_COLOR};'>{author}</span>"
     return author
 
-def generar_tabla_resumen(unique_congresos, filtered_df):
+def generar_tabla_resumen(unique_congresos, filtered_df, tablas):
     """Genera una tabla consolidada con todos los totales"""
     datos_resumen = []
     
@@ -246,16 +333,9 @@ def generar_tabla_resumen(unique_congresos, filtered_df):
     datos_resumen.append(("Países distintos", total_paises))
     
     # 5. Líneas de investigación
-    try:
-        all_keywords = []
-        for keywords in unique_congresos['linea_investigacion']:
-            if pd.notna(keywords):
-                keywords_str = str(keywords).strip()
-                keyword_list = [k.strip() for k in keywords_str.split(",") if k.strip()]
-                all_keywords.extend(keyword_list)
-        total_keywords = len(set(all_keywords)) if all_keywords else 0
-        datos_resumen.append(("Líneas de investigación distintas", total_keywords))
-    except:
+    if 'palabras' in tablas:
+        datos_resumen.append(("Líneas de investigación distintas", distintos(tablas['palabras'], unique_congresos.index)))
+    else:
         datos_resumen.append(("Líneas de investigación distintas", "N/D"))
     
     # 6. Departamentos
@@ -328,82 +408,145 @@ def mostrar_tabla_uniforme(df, titulo, ayuda=None, max_rows=10):
     
     st.dataframe(df.head(max_rows), hide_index=True)
 
-# ====================
-# FUNCIONES DE MÉTRICAS PARA CONGRESOS
-# ====================
-def indice_prestigio_congreso(titulo_congreso, tipo_congreso):
-    """Calcula el Índice de Prestigio del Congreso (IPC)"""
-    if pd.isna(titulo_congreso) or pd.isna(tipo_congreso):
-        return 0.3
-
-    titulo_congreso = str(titulo_congreso).lower()
-    tipo_congreso = str(tipo_congreso).lower()
-
-    # Congresos internacionales conocidos
-    congresos_tier1 = [
-        'american heart', 'european society of cardiology', 
-        'world congress of cardiology', 'international congress'
-    ]
-    
-    # Congresos nacionales importantes
-    congresos_tier2 = [
-        'congreso nacional', 'sociedad mexicana', 
-        'reunión anual', 'simposio nacional'
-    ]
-
-    # Asignar puntaje según tipo y nombre del congreso
-    if tipo_congreso == 'internacional':
-        if any(keyword in titulo_congreso for keyword in congresos_tier1):
-            return 1.0
-        return 0.7
-    elif tipo_congreso == 'nacional':
-        if any(keyword in titulo_congreso for keyword in congresos_tier2):
-            return 0.6
-        return 0.4
-    else:
-        return 0.3  # Congresos locales o no clasificados
-
-def coeficiente_internacionalizacion(pais, tipo_congreso):
-    """Calcula el Coeficiente de Internacionalización (CI) para congresos"""
-    if pd.isna(pais) or pd.isna(tipo_congreso):
-        return 0.0
-
-    tipo_congreso = str(tipo_congreso).lower()
-    pais = str(pais).strip()
-
-    # Países con mayor prestigio en investigación
-    paises_tier1 = ['Estados Unidos', 'Reino Unido', 'Alemania', 'Japón', 'Canadá']
-    paises_tier2 = ['Francia', 'Italia', 'España', 'Australia', 'Suiza']
-
-    if tipo_congreso == 'internacional':
-        if pais in paises_tier1:
-            return 1.0
-        elif pais in paises_tier2:
-            return 0.8
-        else:
-            return 0.6
-    else:
-        return 0.3  # Congresos nacionales o locales
+def boton_pdf(remote_pdf_path: str, file_name: str, etiqueta: str, clave: str):
+    """Descarga de un PDF bajo demanda: solo se trae del servidor cuando el usuario lo pide"""
+    obtenidos = st.session_state.setdefault('pdfs_obtenidos', set())
+    if remote_pdf_path not in obtenidos:
+        if not st.button("Obtener PDF", key=f"obtener_{clave}"):
+            return
+        with st.spinner("Descargando PDF..."):
+            # Pasa por el caché: si el PDF no cambió en el servidor no se vuelve a descargar
+            if CONFIG.CACHE.descargar(SSHManager.get_connection, remote_pdf_path) is None:
+                st.error("No se pudo descargar el PDF seleccionado")
+                return
+        obtenidos.add(remote_pdf_path)
+
+    # Ya validado contra el servidor en esta sesión: se sirve del caché local sin conectarse
+    ruta = CONFIG.CACHE.buscar(remote_pdf_path)
+    if ruta is None:
+        obtenidos.discard(remote_pdf_path)
+        st.warning("El PDF salió del caché local; vuelva a obtenerlo")
+        return
+    with open(ruta, 'rb') as f:
+        st.download_button(
+            label=etiqueta,
+            data=f.read(),
+            file_name=file_name,
+            mime="application/pdf",
+            key=f"download_{clave}"
+        )
+
+def boton_csv(df, file_name: str, etiqueta: str, clave: str):
+    """Descarga de un CSV bajo demanda: los bytes se generan una vez, cuando el usuario los pide, y se
+    conservan en la sesión (la clave incluye la versión y el periodo)"""
+    preparados = st.session_state.setdefault('csv_preparados', {})
+    if clave not in preparados:
+        if not st.button("Preparar CSV", key=f"preparar_{clave}"):
+            return
+        preparados[clave] = df.to_csv(index=False).encode('utf-8')
+        # Solo los más recientes: los de periodos anteriores ya no se muestran
+        while len(preparados) > 20:
+            preparados.pop(next(iter(preparados)))
+    st.download_button(
+        label=etiqueta,
+        data=preparados[clave],
+        file_name=file_name,
+        mime='text/csv',
+        key=f"download_{clave}"
+    )
 
-def indice_relevancia_tematica(linea_investigacion):
-    """Calcula el Índice de Relevancia Temática (IRT) para cardiología"""
-    if pd.isna(linea_investigacion):
-        return 0.0
+def boton_excel(hojas: dict, file_name: str, etiqueta: str, clave: str):
+    """Reporte Excel bajo demanda en dos clics: el libro se escribe en disco por bloques cuando el usuario
+    lo pide (una vez por versión y periodo) y sus bytes se leen solo en ese rerun para el botón de descarga"""
+    preparados = st.session_state.setdefault('reportes_preparados', {})
+    if not st.button("Preparar reporte Excel", key=f"preparar_{clave}"):
+        return
+    ruta = preparados.get(clave)
+    if ruta is None or not Path(ruta).exists():
+        with st.spinner("Generando reporte..."):
+            try:
+                limpiar_reportes(tempfile.gettempdir())
+                # Mismo nombre para la misma versión y periodo: otras sesiones lo reemplazan completo
+                ruta = generar_reporte(hojas, Path(tempfile.gettempdir()) / f"{clave}.xlsx")
+            except Exception as e:
+                logging.error(f"Error al generar el reporte Excel: {str(e)}")
+                st.error("No se pudo generar el reporte Excel")
+                return
+        preparados[clave] = str(ruta)
+    try:
+        with open(ruta, 'rb') as f:
+            datos = f.read()
+    except FileNotFoundError:
+        # Lo borró la limpieza de reportes viejos de otra sesión
+        preparados.pop(clave, None)
+        st.warning("El reporte ya no está disponible; vuelva a prepararlo")
+        return
+    st.download_button(
+        label=etiqueta,
+        data=datos,
+        file_name=file_name,
+        mime=MIME_XLSX,
+        key=f"download_{clave}"
+    )
 
-    keywords_cardio = [
-        "cardíaco", "miocardio", "arritmia", "isquemia",
-        "hipertensión", "ECG", "insuficiencia cardíaca",
-        "coronario", "válvula", "aterosclerosis", "angina"
-    ]
+def boton_archivo(ruta: str, etiqueta: str, clave: str):
+    """Descarga de un archivo local bajo demanda: sus bytes se leen solo en el rerun en que el usuario lo pide"""
+    if not Path(ruta).exists() or not st.button("Preparar dataset completo", key=f"preparar_{clave}"):
+        return
+    with open(ruta, 'rb') as f:
+        datos = f.read()
+    st.download_button(
+        label=etiqueta,
+        data=datos,
+        file_name=Path(ruta).name,
+        mime="text/csv",
+        key=f"download_{clave}"
+    )
 
-    try:
-        if isinstance(linea_investigacion, str):
-            linea_investigacion = linea_investigacion.lower()
-            matches = sum(1 for kw in keywords_cardio if kw in linea_investigacion)
-            return min(matches / len(keywords_cardio), 1.0)  # Normalizado a 0-1
-        return 0.0
-    except:
-        return 0.0
+@st.cache_data(show_spinner=False, max_entries=2)
+def cargar_datos(version: tuple):
+    """Total tipado, solo con registros activos; se cachea entre reruns y sesiones por versión (tamaño, mtime) del archivo remoto"""
+    df = None
+    usar_espejo = False
+    if actualizar_espejo('congresos', "pro_congresos_total.csv"):
+        # Espejo Parquet: aquí solo lo necesario para el selector; el periodo se lee después
+        df = leer_espejo('congresos', "pro_congresos_total.csv", seleccion=['fecha_exacta_congreso', 'estado'])
+        usar_espejo = df is not None
+    if df is None:
+        # Solo las columnas del esquema, con categorías, fechas y enteros ya tipados
+        df = leer_csv('congresos', "pro_congresos_total.csv")
+    df.columns = df.columns.str.strip()
+
+    # Verificar campos importantes
+    required_columns = ['economic_number', 'titulo_presentacion', 'titulo_congreso', 
+                      'tipo_congreso', 'pais', 'año_congreso', 'fecha_exacta_congreso',
+                      'rol', 'linea_investigacion', 'pdf_filename', 'estado']
+    disponibles = columnas_espejo('congresos', "pro_congresos_total.csv") if usar_espejo else df.columns
+    missing_columns = [col for col in required_columns if col not in disponibles]
+
+    if missing_columns:
+        return df, usar_espejo, missing_columns, {}, None
+
+    # fecha_exacta_congreso ya viene como fecha (esquemas.py); las inválidas son NaT
+    df = df[df['estado'] == 'A'].copy()
+    if not usar_espejo:
+        # Casi duplicados del mismo trabajo agrupados en cluster_id una vez por versión
+        df = con_grupos('congresos', df)
+    # Ordenado por fecha y agrupado por investigador una vez por versión; con el espejo, en main
+    indice = None if usar_espejo else IndicePeriodo(df, 'fecha_exacta_congreso', 'economic_number')
+    if indice is not None:
+        df = indice.df
+    # Líneas de investigación explotadas una vez por versión; con el espejo se arman del periodo
+    return df, usar_espejo, [], tablas_laterales('congresos', df), indice
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def cargar_cubo(version: tuple):
+    """Cubo mensual del total con las métricas ya sumadas y los cluster_id de cargar_datos, por la misma versión"""
+    df, usar_espejo, missing_columns, tablas, _ = cargar_datos(version)
+    # Con el espejo el cubo se arma en main del mismo periodo (y los mismos grupos) que las tablas
+    if missing_columns or usar_espejo:
+        return None
+    return construir_cubo('congresos', df, terminos=tablas.get('terminos'))
 
 def main():
     st.set_page_config(
@@ -418,13 +561,29 @@ def main():
 
     st.title("Análisis de Participación en Congresos")
 
-    # Paso 1: Ejecutar generador remoto para actualizar datos
-    if not ejecutar_generador_remoto():
-        st.warning("⚠️ Continuando con datos existentes (pueden no estar actualizados)")
-
-    # Paso 2: Sincronizar archivo pro_congresos_total.csv
-    if not sync_congresos_file():
-        st.warning("⚠️ Trabajando con copia local de pro_congresos_total.csv debido a problemas de conexión")
+    # Forzar actualización (administradores): regenera el total aunque las fuentes no hayan cambiado
+    if CONFIG.ADMIN_CLAVE:
+        with st.sidebar.expander("🔐 Administración"):
+            clave = st.text_input("Clave de administrador", type="password")
+            if hmac.compare_digest(clave.encode('utf-8'), str(CONFIG.ADMIN_CLAVE).encode('utf-8')) \
+                    and st.button("🔄 Forzar actualización"):
+                st.session_state['datos_sincronizados'] = False
+                st.session_state['forzar_generador'] = True
+                cargar_datos.clear()
+
+    # Pasos 1 y 2 al abrir la sesión y cuando la consulta periódica (datos_vencidos) ve cambios en el
+    # servidor: al mover un filtro o abrir un expander no se consolida ni se descarga
+    if not st.session_state.get('datos_sincronizados') or datos_vencidos():
+        forzar = st.session_state.pop('forzar_generador', False)
+        # Paso 1: Actualizar el total en el servidor (incremental si está activado; si no, generador remoto)
+        if not (CONFIG.CONSOLIDADOR_INCREMENTAL and consolidar_incremental(completo=forzar)) and not ejecutar_generador_remoto(forzar):
+            st.warning("⚠️ Continuando con datos existentes (pueden no estar actualizados)")
+
+        # Paso 2: Sincronizar archivo pro_congresos_total.csv
+        if not sync_congresos_file():
+            st.warning("⚠️ Trabajando con copia local de pro_congresos_total.csv debido a problemas de conexión")
+        st.session_state['datos_sincronizados'] = True
+        st.session_state['ultima_revision'] = time.time()
 
     # Verificar si el archivo local existe
     if not Path("pro_congresos_total.csv").exists():
@@ -432,24 +591,14 @@ def main():
         return
 
     try:
-        # Leer y procesar el archivo
-        df = pd.read_csv("pro_congresos_total.csv", header=0, encoding='utf-8')
-        df.columns = df.columns.str.strip()
-
-        # Verificar campos importantes
-        required_columns = ['economic_number', 'titulo_presentacion', 'titulo_congreso', 
-                          'tipo_congreso', 'pais', 'año_congreso', 'fecha_exacta_congreso',
-                          'rol', 'linea_investigacion', 'pdf_filename', 'estado']
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        # Leer y procesar el archivo (cacheado mientras el archivo remoto no cambie)
+        version = version_archivo("pro_congresos_total.csv")
+        df, usar_espejo, missing_columns, tablas, indice = cargar_datos(version)
 
         if missing_columns:
             st.warning(f"El archivo pro_congresos_total.csv no contiene los campos requeridos: {', '.join(missing_columns)}")
             return
 
-        # Convertir y validar fechas
-        df['fecha_exacta_congreso'] = pd.to_datetime(df['fecha_exacta_congreso'], errors='coerce')
-        df = df[df['estado'] == 'A'].copy()
-
         if df.empty:
             st.warning("No hay congresos válidos para analizar")
             return
@@ -471,11 +620,18 @@ def main():
             end_date = st.date_input("Fecha término", max_date)
 
         # Filtrar dataframe
-        filtered_df = df[(df['fecha_exacta_congreso'] >= pd.to_datetime(start_date)) &
-                       (df['fecha_exacta_congreso'] <= pd.to_datetime(end_date))].copy()
+        if usar_espejo:
+            # Solo las particiones y grupos de filas del periodo seleccionado
+            filtered_df = con_grupos('congresos', leer_periodo('congresos', "pro_congresos_total.csv", desde=start_date, hasta=end_date))
+            indice = IndicePeriodo(filtered_df, 'fecha_exacta_congreso', 'economic_number')
+            filtered_df = indice.df
+            tablas = tablas_laterales('congresos', filtered_df)
+        else:
+            # Corte por búsqueda binaria sobre el total ordenado por fecha
+            filtered_df = indice.periodo(start_date, end_date)
 
-        # Obtener presentaciones únicas (basado en título de presentación)
-        unique_congresos = filtered_df.drop_duplicates(subset=['titulo_presentacion']).copy()
+        # Obtener presentaciones únicas (por grupo de casi duplicados)
+        unique_congresos = filtered_df.drop_duplicates(subset=[COLUMNA_GRUPO]).copy()
 
         st.markdown(f"**Periodo seleccionado:** {start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}")
         st.markdown(f"**Registros encontrados:** {len(filtered_df)}")
@@ -490,15 +646,15 @@ def main():
         # =============================================
         st.header("🔍 Productividad por investigador")
         investigator_stats = filtered_df.groupby(['economic_number']).agg(
-            Presentaciones_Unicas=('titulo_presentacion', lambda x: len(set(x))),
+            Presentaciones_Unicas=(COLUMNA_GRUPO, 'nunique'),
             Congresos_Distintos=('titulo_congreso', 'nunique'),
             Paises_Visitados=('pais', 'nunique'),
             Roles=('rol', lambda x: ', '.join(sorted(set(x))))
         ).reset_index()
         
         # Agregar información de nombramiento, SNI, SII si existe
-        if 'nombramiento' in df.columns and 'sni' in df.columns and 'sii' in df.columns:
-            investigator_info = df[['economic_number', 'nombramiento', 'sni', 'sii']].drop_duplicates()
+        if 'nombramiento' in filtered_df.columns and 'sni' in filtered_df.columns and 'sii' in filtered_df.columns:
+            investigator_info = filtered_df[['economic_number', 'nombramiento', 'sni', 'sii']].drop_duplicates()
             investigator_stats = pd.merge(investigator_stats, investigator_info, on='economic_number', how='left')
         
         investigator_stats = investigator_stats.sort_values('Presentaciones_Unicas', ascending=False)
@@ -510,8 +666,8 @@ def main():
         # Detalle expandible por investigador
         for index, row in investigator_stats.iterrows():
             with st.expander(f"{row['Número económico']} - {row['Presentaciones únicas']} presentaciones"):
-                investigator_congresos = filtered_df[filtered_df['economic_number'] == row['Número económico']]
-                unique_congresos_investigator = investigator_congresos.drop_duplicates(subset=['titulo_presentacion'])
+                investigator_congresos = indice.de_investigador(row['Número económico'], start_date, end_date)
+                unique_congresos_investigator = investigator_congresos.drop_duplicates(subset=[COLUMNA_GRUPO])
 
                 display_columns = ['titulo_presentacion', 'titulo_congreso', 'tipo_congreso', 
                                  'pais', 'fecha_exacta_congreso', 'rol']
@@ -536,38 +692,15 @@ def main():
                     )
 
                     if selected_pdf:
-                        temp_pdf_path = f"temp_{selected_pdf}"
-                        remote_pdf_path = os.path.join(CONFIG.REMOTE['DIR'], selected_pdf)
-
-                        if SSHManager.download_remote_file(remote_pdf_path, temp_pdf_path):
-                            with open(temp_pdf_path, "rb") as f:
-                                pdf_bytes = f.read()
-
-                            st.download_button(
-                                label="Descargar este archivo",
-                                data=pdf_bytes,
-                                file_name=selected_pdf,
-                                mime="application/pdf",
-                                key=f"download_pdf_{row['Número económico']}_{index}"
-                            )
-
-                            try:
-                                os.remove(temp_pdf_path)
-                            except:
-                                pass
-                        else:
-                            st.error("No se pudo descargar el PDF seleccionado")
+                        # Solo se descarga cuando el usuario lo pide, no en cada rerun
+                        boton_pdf(os.path.join(CONFIG.REMOTE['DIR'], selected_pdf), selected_pdf,
+                                  "Descargar este archivo", f"pdf_{row['Número económico']}_{index}")
                 else:
                     st.warning("No se encontraron archivos PDF para este investigador")
 
-                csv = unique_congresos_investigator.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    label="Descargar participación en congresos (CSV)",
-                    data=csv,
-                    file_name=f"congresos_{row['Número económico']}.csv",
-                    mime='text/csv',
-                    key=f"download_csv_{row['Número económico']}_{index}"
-                )
+                boton_csv(unique_congresos_investigator, f"congresos_{row['Número económico']}.csv",
+                          "Descargar participación en congresos (CSV)",
+                          f"csv_{row['Número económico']}_{index}_{version[0]}_{int(version[1])}_{start_date:%Y%m%d}_{end_date:%Y%m%d}")
 
         # =============================================
         # SECCIÓN DE MÉTRICAS DE CALIDAD
@@ -576,24 +709,14 @@ def main():
 
         # Calcular métricas para cada presentación única
         with st.spinner("Calculando métricas de calidad..."):
-            unique_congresos = unique_congresos.assign(
-                IPC=unique_congresos.apply(lambda x: indice_prestigio_congreso(x['titulo_congreso'], x['tipo_congreso']), axis=1),
-                CI=unique_congresos.apply(lambda x: coeficiente_internacionalizacion(x['pais'], x['tipo_congreso']), axis=1),
-                IRT=unique_congresos['linea_investigacion'].apply(indice_relevancia_tematica)
-            )
-            unique_congresos = unique_congresos.assign(
-                PI=0.5 * unique_congresos['IPC'] + 0.3 * unique_congresos['CI'] + 0.2 * unique_congresos['IRT']
-            )
+            unique_congresos = metricas('congresos', unique_congresos)
 
         # Mostrar tabla de resultados por investigador
         st.subheader("Métricas por Investigador")
-        metrics_by_investigator = unique_congresos.groupby('economic_number').agg({
-            'IPC': 'mean',
-            'CI': 'mean',
-            'IRT': 'mean',
-            'PI': 'mean',
-            'titulo_presentacion': 'count'
-        }).reset_index()
+        # Promedios por investigador sumando la rebanada del cubo (no se recalculan por periodo); con el espejo
+        # se arma del periodo ya leído, así sus grupos de casi duplicados son los de las tablas
+        cubo = construir_cubo('congresos', filtered_df, terminos=tablas.get('terminos')) if usar_espejo else cargar_cubo(version)
+        metrics_by_investigator = por_investigador('congresos', cubo, start_date, end_date)
 
         metrics_by_investigator.columns = [
             'Número económico',
@@ -699,23 +822,30 @@ def main():
         col1, col2, col3 = st.columns(3)
 
         with col1:
-            csv_metricas = metricas_df.to_csv(index=False).encode('utf-8')
-            st.download_button(
-                label="Descargar métricas de calidad (CSV)",
-                data=csv_metricas,
-                file_name="metricas_calidad_congresos.csv",
-                mime='text/csv'
+            # Resumen, productividad, métricas, top N y registros del periodo en un solo libro
+            boton_excel(
+                {
+                    'Resumen': hoja_resumen({
+                        'Periodo': f"{start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}",
+                        'Registros encontrados': len(filtered_df),
+                        'Presentaciones únicas': len(unique_congresos),
+                        'Registros duplicados': len(filtered_df) - len(unique_congresos),
+                        'Investigadores': len(investigator_stats),
+                        'Puntaje Integrado (PI) promedio': round(float(unique_congresos['PI'].mean()), 2),
+                    }),
+                    'Por investigador': investigator_stats,
+                    'Métricas por investigador': metrics_by_investigator,
+                    'Métricas por producto': metricas_df,
+                    f'Top {TOP_N}': metricas_df.head(TOP_N),
+                    'Registros': filtered_df,
+                },
+                f"reporte_congresos_{start_date:%Y%m%d}_{end_date:%Y%m%d}.xlsx",
+                "Descargar reporte (Excel)",
+                f"reporte_congresos_{version[0]}_{int(version[1])}_{start_date:%Y%m%d}_{end_date:%Y%m%d}"
             )
 
         with col2:
-            if Path("pro_congresos_total.csv").exists():
-                with open("pro_congresos_total.csv", "rb") as file:
-                    st.download_button(
-                        label="Descargar dataset completo",
-                        data=file,
-                        file_name="pro_congresos_total.csv",
-                        mime="text/csv"
-                    )
+            boton_archivo("pro_congresos_total.csv", "Descargar dataset completo", f"dataset_{version[0]}_{int(version[1])}")
 
         with col3:
             # Botón para descargar todos los PDFs con prefijo CON
@@ -725,9 +855,8 @@ def main():
                     if ssh:
                         try:
                             with ssh.open_sftp() as sftp:
-                                sftp.chdir(CONFIG.REMOTE['DIR'])
                                 pdf_files = []
-                                for filename in sftp.listdir():
+                                for filename in sftp.listdir(CONFIG.REMOTE['DIR']):
                                     if (filename.startswith('CON')) and filename.lower().endswith('.pdf'):
                                         pdf_files.append(filename)
 
@@ -740,11 +869,12 @@ def main():
                                     zip_buffer = io.BytesIO()
                                     with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
                                         for pdf_file in pdf_files:
-                                            temp_path = f"temp_{pdf_file}"
                                             remote_path = os.path.join(CONFIG.REMOTE['DIR'], pdf_file)
-                                            if SSHManager.download_remote_file(remote_path, temp_path):
-                                                zip_file.write(temp_path, pdf_file)
-                                                os.remove(temp_path)
+                                            # Misma conexión y caché: solo se descargan los PDF nuevos o modificados
+                                            try:
+                                                zip_file.write(CONFIG.CACHE.obtener(sftp, remote_path), pdf_file)
+                                            except Exception as e:
+                                                logging.warning(f"No se pudo agregar {pdf_file} al ZIP: {str(e)}")
 
                                     zip_buffer.seek(0)
                                     st.download_button(
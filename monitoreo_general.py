@@ -0,0 +1,359 @@
+import streamlit as st
+import pandas as pd
+import paramiko
+import time
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from esquemas import leer_csv
+from cubo_mensual import CUBOS
+from duplicados import CLAVES_FUERTES, COLUMNA_GRUPO, con_grupos
+from consolidador import consolidar, hay_cambios, quitar_bajas_total, sellar_total, total_vigente, version_descargada
+
+# Configuración de logging
+logging.basicConfig(
+    filename='monitoreo_general.log',
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+# ====================
+# CONFIGURACIÓN INICIAL
+# ====================
+class Config:
+    def __init__(self):
+        self.TIMEOUT_SECONDS = 30
+
+        self.REMOTE = {
+            'HOST': st.secrets["sftp"]["host"],
+            'USER': st.secrets["sftp"]["user"],
+            'PASSWORD': st.secrets["sftp"]["password"],
+            'PORT': st.secrets["sftp"]["port"],
+            'DIR': st.secrets["sftp"]["dir"]
+        }
+
+        # Los cinco totales, con los mismos nombres remotos y locales que sus tableros
+        prefijos = st.secrets['prefixes']
+        self.FUENTES = {
+            'articulos': {
+                'etiqueta': 'Artículos', 'remoto': "pro_productos_total.csv", 'local': "articulos_total.csv",
+                'prefijos': [prefijos.get('productos', 'productos_'), prefijos.get('manual', 'manual_')],
+                'generador': f"{self.REMOTE['DIR']}/{prefijos['generadorarticulos']}",
+            },
+            'tesis': {
+                'etiqueta': 'Tesis', 'remoto': "pro_tesis_total.csv", 'local': "tesis_total.csv",
+                'prefijos': [prefijos.get('tesis', 'tesis_')],
+                'generador': f"{self.REMOTE['DIR']}/{prefijos['generadortesis']}",
+            },
+            'libros': {
+                'etiqueta': 'Libros', 'remoto': "pro_libros_total.csv", 'local': "libros_total.csv",
+                'prefijos': [prefijos.get('libros', 'libros_')],
+                'generador': f"{self.REMOTE['DIR']}/{prefijos['generadorlibros']}",
+            },
+            'capitulos': {
+                'etiqueta': 'Capítulos', 'remoto': "pro_capitulos_total.csv", 'local': "capitulos_total.csv",
+                'prefijos': [prefijos.get('capitulos', 'capitulos_')],
+                'generador': f"{self.REMOTE['DIR']}/{prefijos['generadorcapitulos']}",
+            },
+            'congresos': {
+                'etiqueta': 'Congresos', 'remoto': "pro_congresos_total.csv", 'local': "pro_congresos_total.csv",
+                'prefijos': [prefijos.get('congresos', 'congresos_')],
+                'generador': f"{self.REMOTE['DIR']}/{prefijos['generadorcongresos']}",
+            },
+        }
+
+        # Columna con el nombre del investigador en los tipos que la tienen
+        self.COLUMNAS_NOMBRE = {'articulos': 'investigator_name', 'libros': 'autor_principal', 'capitulos': 'autor_principal'}
+
+        # Configuración de estilo
+        self.LOGO_PATH = "escudo_COLOR.jpg"
+
+        # Consolidación incremental opcional ([consolidador] incremental = true en secrets.toml);
+        # si falla o está desactivada se ejecuta el generador remoto de cada tipo
+        self.CONSOLIDADOR_INCREMENTAL = st.secrets.get("consolidador", {}).get("incremental", False)
+        # Cada cuántos segundos una sesión abierta consulta si algún total cambió ([sincronizacion] revision_segundos)
+        self.REVISION_SEGUNDOS = st.secrets.get("sincronizacion", {}).get("revision_segundos", 300)
+
+CONFIG = Config()
+
+def version_archivo(path: str):
+    """(tamaño, mtime) del archivo, o None si no existe"""
+    try:
+        estado = os.stat(path)
+        return (estado.st_size, estado.st_mtime)
+    except FileNotFoundError:
+        return None
+
+
+# ==================
+# CLASE SSH
+# ==================
+class SSHManager:
+    MAX_RETRIES = 3
+    RETRY_DELAY = 5  # segundos
+
+    @staticmethod
+    def get_connection():
+        """Establece conexión SSH segura con reintentos"""
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
+        for attempt in range(SSHManager.MAX_RETRIES):
+            try:
+                ssh.connect(
+                    hostname=CONFIG.REMOTE['HOST'],
+                    port=CONFIG.REMOTE['PORT'],
+                    username=CONFIG.REMOTE['USER'],
+                    password=CONFIG.REMOTE['PASSWORD'],
+                    timeout=CONFIG.TIMEOUT_SECONDS
+                )
+                logging.info(f"Conexión SSH establecida (intento {attempt + 1})")
+                return ssh
+            except Exception as e:
+                logging.warning(f"Intento {attempt + 1} fallido: {str(e)}")
+                if attempt < SSHManager.MAX_RETRIES - 1:
+                    time.sleep(SSHManager.RETRY_DELAY)
+                else:
+                    logging.error("Fallo definitivo al conectar via SSH")
+                    st.error(f"Error de conexión SSH después de {SSHManager.MAX_RETRIES} intentos: {str(e)}")
+                    return None
+
+# ====================
+# CARGA EN PARALELO SOBRE UN SOLO TRANSPORTE
+# ====================
+# Una conexión SSH para las cinco fuentes: cada hilo abre su propio canal SFTP
+# (y, si hace falta, el del generador) sobre el mismo paramiko.Transport. Los
+# hilos no llaman a Streamlit; devuelven tiempos y estado y la página los
+# muestra al terminar.
+def actualizar_total(ssh, sftp, tipo: str, forzar: bool = False) -> str:
+    """Deja al día el total remoto de un tipo: consolidación incremental o generador, solo si hay fuentes más recientes"""
+    fuente = CONFIG.FUENTES[tipo]
+    if CONFIG.CONSOLIDADOR_INCREMENTAL:
+        try:
+            resumen = consolidar(sftp, CONFIG.REMOTE['DIR'], tipo, prefijos=fuente['prefijos'],
+                                 total=fuente['remoto'], completo=forzar)
+            logging.info(f"Consolidación incremental de {tipo}: {resumen['leidos']} de {resumen['fuentes']} archivos leídos")
+            return "consolidado"
+        except Exception as e:
+            logging.warning(f"Falló la consolidación incremental de {tipo}; se ejecuta el generador: {str(e)}")
+
+    vigente, fuentes_mtime = total_vigente(sftp, CONFIG.REMOTE['DIR'], fuente['prefijos'], fuente['remoto'])
+    if vigente and not forzar:
+        return "al día"
+
+    comando = f"cd {CONFIG.REMOTE['DIR']} && bash {fuente['generador']}"
+    logging.info(f"Ejecutando comando: {comando}")
+    stdin, stdout, stderr = ssh.exec_command(comando)
+    exit_status = stdout.channel.recv_exit_status()
+    if exit_status != 0:
+        error = stderr.read().decode('utf-8').strip()
+        raise RuntimeError(f"{fuente['generador']} terminó con código {exit_status}: {error}")
+    # Falla con FileNotFoundError si el generador no dejó el total
+    sftp.stat(os.path.join(CONFIG.REMOTE['DIR'], fuente['remoto']))
+    sellar_total(sftp, CONFIG.REMOTE['DIR'], fuente['remoto'], fuentes_mtime)
+    return "generado"
+
+def descargar_total(sftp, tipo: str) -> bool:
+    """Baja el total si la copia local no es la versión remota; True si lo descargó"""
+    fuente = CONFIG.FUENTES[tipo]
+    remote_path = os.path.join(CONFIG.REMOTE['DIR'], fuente['remoto'])
+    atributos = sftp.stat(remote_path)
+    # La copia local lleva el tamaño y el mtime del remoto: si coinciden, ya es esa versión
+    if version_descargada(fuente['local']) == (atributos.st_size, atributos.st_mtime):
+        return False
+    temporal = f"{fuente['local']}.descarga"
+    try:
+        sftp.get(remote_path, temporal)
+        if os.path.getsize(temporal) != atributos.st_size:
+            raise IOError(f"Descarga incompleta de {remote_path}")
+        os.utime(temporal, (atributos.st_atime, atributos.st_mtime))
+        os.replace(temporal, fuente['local'])
+    finally:
+        if Path(temporal).exists():
+            os.remove(temporal)
+    # El total del generador trae las filas dadas de baja (lápidas)
+    quitar_bajas_total(sftp, CONFIG.REMOTE['DIR'], fuente['remoto'], tipo, fuente['prefijos'], fuente['local'])
+    logging.info(f"Archivo descargado correctamente: {remote_path} a {fuente['local']}")
+    return True
+
+def sincronizar_fuente(ssh, tipo: str, forzar: bool = False) -> dict:
+    """Paso remoto de una fuente en su propio canal SFTP; tiempos en segundos y estado"""
+    resultado = {'tipo': tipo, 'remoto': 0.0, 'descarga': 0.0, 'estado': ''}
+    inicio = time.perf_counter()
+    try:
+        with ssh.open_sftp() as sftp:
+            resultado['estado'] = actualizar_total(ssh, sftp, tipo, forzar)
+            resultado['remoto'] = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            if descargar_total(sftp, tipo):
+                resultado['estado'] += ", descargado"
+            resultado['descarga'] = time.perf_counter() - inicio
+    except Exception as e:
+        logging.error(f"Error al sincronizar {tipo}: {str(e)}")
+        resultado['estado'] = f"error: {str(e)}"
+    return resultado
+
+def sincronizar_todo(forzar: bool = False):
+    """Las cinco fuentes a la vez sobre una sola conexión; None si no hubo conexión"""
+    ssh = SSHManager.get_connection()
+    if not ssh:
+        return None
+    try:
+        with ThreadPoolExecutor(max_workers=len(CONFIG.FUENTES)) as hilos:
+            return list(hilos.map(lambda tipo: sincronizar_fuente(ssh, tipo, forzar), CONFIG.FUENTES))
+    finally:
+        ssh.close()
+
+def datos_vencidos() -> bool:
+    """True si algún total o sus fuentes cambiaron en el servidor; a lo más una consulta cada REVISION_SEGUNDOS por sesión"""
+    ahora = time.time()
+    if ahora - st.session_state.get('ultima_revision', 0.0) < CONFIG.REVISION_SEGUNDOS:
+        return False
+    st.session_state['ultima_revision'] = ahora
+    ssh = SSHManager.get_connection()
+    if not ssh:
+        return False
+    try:
+        with ssh.open_sftp() as sftp:
+            return any(
+                hay_cambios(sftp, CONFIG.REMOTE['DIR'], fuente['prefijos'], fuente['remoto'], fuente['local'])
+                for fuente in CONFIG.FUENTES.values()
+            )
+    except Exception as e:
+        logging.warning(f"No se pudo consultar la versión remota: {str(e)}")
+        return False
+    finally:
+        ssh.close()
+
+@st.cache_data(show_spinner=False, max_entries=10)
+def cargar_fuente(tipo: str, version: tuple) -> pd.DataFrame:
+    """Filas activas de un total con solo las columnas del perfil y su cluster_id; se cachea por versión (tamaño, mtime) del archivo"""
+    definicion = CUBOS[tipo]
+    seleccion = ['economic_number', 'estado', definicion['titulo'], definicion['fecha']] + CLAVES_FUERTES.get(tipo, [])
+    if tipo in CONFIG.COLUMNAS_NOMBRE:
+        seleccion.append(CONFIG.COLUMNAS_NOMBRE[tipo])
+    df = leer_csv(tipo, CONFIG.FUENTES[tipo]['local'], seleccion=seleccion)
+    return con_grupos(tipo, df[(df['estado'] == 'A') & df[definicion['fecha']].notna()])
+
+# ====================
+# PERFIL POR INVESTIGADOR
+# ====================
+def anios(tipo: str, df: pd.DataFrame) -> pd.Series:
+    """Año de cada fila según la fecha propia del tipo"""
+    fecha = df[CUBOS[tipo]['fecha']]
+    return fecha if CUBOS[tipo].get('periodo') == 'Y' else fecha.dt.year
+
+def perfil_investigadores(datos: dict, desde: int, hasta: int) -> pd.DataFrame:
+    """Productos únicos (por grupo de casi duplicados) de cada tipo y total por número económico, en los años indicados"""
+    conteos = []
+    nombres = []
+    for tipo, df in datos.items():
+        anio = anios(tipo, df)
+        df = df[(anio >= desde) & (anio <= hasta)]
+        conteos.append(
+            df.groupby('economic_number', observed=True)[COLUMNA_GRUPO].nunique().rename(CONFIG.FUENTES[tipo]['etiqueta'])
+        )
+        if tipo in CONFIG.COLUMNAS_NOMBRE:
+            nombres.append(df[['economic_number', CONFIG.COLUMNAS_NOMBRE[tipo]]].set_axis(['economic_number', 'nombre'], axis=1))
+
+    perfil = pd.concat(conteos, axis=1).fillna(0).astype(int)
+    perfil['Total'] = perfil.sum(axis=1)
+    if nombres:
+        # Primer nombre registrado para cada número económico
+        nombre = pd.concat(nombres).dropna().drop_duplicates('economic_number').set_index('economic_number')['nombre']
+        perfil.insert(0, 'Investigador', nombre.reindex(perfil.index).fillna(''))
+    perfil = perfil[perfil['Total'] > 0].sort_values('Total', ascending=False)
+    return perfil.rename_axis('Número económico').reset_index()
+
+# ====================
+# FUNCIÓN MAIN
+# ====================
+def main():
+    st.set_page_config(
+        page_title="Productividad por Investigador",
+        page_icon="📊",
+        layout="wide"
+    )
+
+    # Añadir logo en la parte superior
+    if Path(CONFIG.LOGO_PATH).exists():
+        st.image(CONFIG.LOGO_PATH, width=200)
+
+    st.title("Productividad por Investigador (todos los productos)")
+
+    if st.sidebar.button("🔄 Volver a sincronizar"):
+        st.session_state['datos_sincronizados'] = False
+
+    # Al abrir la sesión y cuando la consulta periódica ve cambios: totales al día y descargados, las cinco fuentes a la vez
+    if not st.session_state.get('datos_sincronizados') or datos_vencidos():
+        with st.spinner("🔄 Sincronizando artículos, tesis, libros, capítulos y congresos..."):
+            resultados = sincronizar_todo()
+        if resultados is None:
+            st.warning("⚠️ Trabajando con copias locales debido a problemas de conexión")
+            resultados = []
+        st.session_state['tiempos_remotos'] = {r['tipo']: r for r in resultados}
+        st.session_state['datos_sincronizados'] = True
+        st.session_state['ultima_revision'] = time.time()
+
+    try:
+        datos = {}
+        tiempos = []
+        for tipo, fuente in CONFIG.FUENTES.items():
+            remoto = st.session_state['tiempos_remotos'].get(tipo, {})
+            fila = {
+                'Fuente': fuente['etiqueta'],
+                'Estado': remoto.get('estado', 'sin conexión'),
+                'Total remoto (s)': remoto.get('remoto', 0.0),
+                'Descarga (s)': remoto.get('descarga', 0.0),
+                'Lectura (s)': 0.0,
+                'Registros activos': 0,
+            }
+            if Path(fuente['local']).exists():
+                inicio = time.perf_counter()
+                datos[tipo] = cargar_fuente(tipo, version_archivo(fuente['local']))
+                fila['Lectura (s)'] = time.perf_counter() - inicio
+                fila['Registros activos'] = len(datos[tipo])
+            else:
+                fila['Estado'] += f" (no se encontró {fuente['local']})"
+            tiempos.append(fila)
+
+        st.header("⏱️ Tiempos de carga por fuente")
+        st.caption("El paso remoto y la descarga corren en paralelo; la lectura sale del caché si el archivo no cambió")
+        st.dataframe(pd.DataFrame(tiempos).round(2), hide_index=True)
+
+        if not any(len(df) for df in datos.values()):
+            st.warning("No hay productos válidos para analizar")
+            return
+
+        # Selector de años común a los cinco tipos
+        todos = pd.concat([anios(tipo, df) for tipo, df in datos.items()]).dropna()
+        min_year, max_year = int(todos.min()), int(todos.max())
+        st.header("📅 Selección de Periodo")
+        col1, col2 = st.columns(2)
+        with col1:
+            start_year = st.selectbox("Año inicio", range(min_year, max_year + 1), index=0)
+        with col2:
+            end_year = st.selectbox("Año término", range(min_year, max_year + 1),
+                                    index=len(range(min_year, max_year + 1)) - 1)
+
+        st.header("🔍 Productividad por investigador")
+        perfil = perfil_investigadores(datos, start_year, end_year)
+        st.markdown(f"**Periodo seleccionado:** {start_year} - {end_year}")
+        st.markdown(f"**Investigadores con productos:** {len(perfil)}")
+        st.dataframe(perfil, hide_index=True)
+
+        st.download_button(
+            label="Descargar perfil de productividad (CSV)",
+            data=perfil.to_csv(index=False).encode('utf-8'),
+            file_name=f"productividad_{start_year}_{end_year}.csv",
+            mime='text/csv'
+        )
+
+    except Exception as e:
+        st.error(f"Error al procesar los archivos: {str(e)}")
+        logging.error(f"Error en main: {str(e)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import re
+import logging
+from datetime import datetime
+
+# ====================
+# PARSER PURO DE ARCHIVOS .NBIB (MEDLINE)
+# ====================
+# Sin dependencias de Streamlit ni de la configuración de la aplicación, para
+# poder medirlo y someterlo a pruebas de robustez (ver banco_nbib.py).
+
+# Campos del registro que entrega parsear_nbib; todos están siempre presentes
+REGISTRO_NBIB = {
+    'corresponding_author': '',
+    'coauthors': '',
+    'article_title': '',
+    'year': '',
+    'pub_date': '',
+    'volume': '0',  # Valor por defecto 0
+    'number': '0',  # Valor por defecto 0
+    'pages': '0',  # Valor por defecto 0
+    'journal_full': '',
+    'journal_abbrev': '',
+    'doi': '',
+    'jcr_group': '',
+    'pmid': '',
+    'investigator_name': '',
+    'economic_number': '',
+    'nombramiento': '',
+    'departamento': '',
+    'participation_key': '',
+    'selected_keywords': [],
+    'sni': '',
+    'sii': '',
+    'pdf_filename': '',
+    'estado': 'A',
+    'extras': {}  # AB/MH/OT/PT: no van al CSV, se guardan en el archivo lateral
+}
+
+# Campos que no van al CSV principal pero alimentan la asignación de líneas:
+# resumen (AB), descriptores MeSH (MH), palabras clave del autor (OT) y
+# tipo de publicación (PT).
+CAMPOS_EXTRA = {
+    'AB': 'abstract',
+    'MH': 'mesh',
+    'OT': 'keywords',
+    'PT': 'publication_types',
+}
+CAMPOS_MULTIPLES = {'MH', 'OT', 'PT'}
+
+# Etiqueta de 2-4 letras al inicio de línea, seguida de guion; las líneas de
+# continuación empiezan con 6 espacios. Sin '\s' en el separador para que una
+# etiqueta vacía no se trague la línea siguiente.
+_CAMPO_NBIB = re.compile(r'^([A-Z]{2,4})[ \t]*-(?:[ \t](.*(?:\n {6}.*)*)|[ \t]*$)', re.MULTILINE)
+_CONTINUACION = re.compile(r'\s*\n\s+')
+
+MESES = {m: i for i, m in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], start=1)}
+ESTACIONES = {'spring': 3, 'summer': 6, 'fall': 9, 'autumn': 9, 'winter': 12}
+
+def decodificar_nbib(datos: bytes) -> str:
+    """Decodifica bytes de un .nbib: UTF-8 (con o sin BOM), después cp1252 y al final latin-1"""
+    if isinstance(datos, str):
+        return datos
+    for codificacion in ('utf-8-sig', 'cp1252'):
+        try:
+            return datos.decode(codificacion)
+        except UnicodeDecodeError:
+            continue
+    logging.warning("Archivo .nbib sin codificación reconocible; se decodifica como latin-1")
+    return datos.decode('latin-1')
+
+def campos_nbib(content: str) -> dict:
+    """Recorre el texto una sola vez y devuelve {etiqueta: [valores]} con las continuaciones unidas"""
+    campos = {}
+    texto = (content or '').replace('\r\n', '\n').replace('\r', '\n')
+    for etiqueta, valor in _CAMPO_NBIB.findall(texto):
+        valor = _CONTINUACION.sub(' ', valor).strip()
+        if valor:
+            campos.setdefault(etiqueta, []).append(valor)
+    return campos
+
+def extras_desde_campos(campos: dict) -> dict:
+    """AB, MH, OT y PT a partir de los campos ya separados"""
+    extras = {'abstract': '', 'mesh': [], 'keywords': [], 'publication_types': []}
+    for etiqueta, clave in CAMPOS_EXTRA.items():
+        valores = campos.get(etiqueta, [])
+        if etiqueta in CAMPOS_MULTIPLES:
+            extras[clave] = list(valores)
+        elif valores:
+            extras[clave] = valores[0]
+    return extras
+
+def extraer_extras(content: str) -> dict:
+    """Extrae AB, MH, OT y PT de un .nbib (las continuaciones se unen con un espacio)"""
+    return extras_desde_campos(campos_nbib(content))
+
+def fecha_publicacion(dp: str) -> tuple:
+    """Interpreta DP ('2021 Mar 3', '2021 Mar-Apr', '2020 Spring', '2019') como (year, pub_date)"""
+    match = re.match(r'\s*(\d{4})(?:\s+([A-Za-z]+))?(?:\s+(\d{1,2}))?', dp or '')
+    if not match:
+        return '', ''
+    year, mes_texto, dia = match.groups()
+    if not mes_texto:
+        return year, year
+    mes_texto = mes_texto.lower()
+    mes = MESES.get(mes_texto[:3]) or ESTACIONES.get(mes_texto)
+    if not mes:
+        return year, year
+    try:
+        # Sin día (mes o estación) se toma el primero del mes
+        return year, datetime(int(year), mes, int(dia or 1)).strftime('%Y-%m-%d')
+    except ValueError:
+        return year, datetime(int(year), mes, 1).strftime('%Y-%m-%d')
+
+def _fecha_electronica(valor: str) -> tuple:
+    """DEP viene como YYYYMMDD"""
+    try:
+        fecha = datetime.strptime(valor[:8], '%Y%m%d')
+        return fecha.strftime('%Y'), fecha.strftime('%Y-%m-%d')
+    except ValueError:
+        return '', ''
+
+def doi_desde_campos(campos: dict) -> str:
+    """DOI desde LID/AID marcados con [doi]; los [pii] y otros identificadores se ignoran"""
+    candidatos = campos.get('LID', []) + campos.get('AID', []) + campos.get('DO', [])
+    for valor in candidatos:
+        if valor.lower().endswith('[doi]'):
+            return valor[:-5].strip()
+    for valor in candidatos:
+        match = re.search(r'(?:doi\.org/)?(10\.\d{4,9}/\S+)', valor)
+        if match and not valor.lower().endswith('[pii]'):
+            return match.group(1)
+    return ''
+
+def _primero(campos: dict, etiqueta: str, token: bool = False) -> str:
+    valores = campos.get(etiqueta)
+    if not valores:
+        return ''
+    return valores[0].split()[0] if token else valores[0]
+
+def parsear_nbib(content: str) -> dict:
+    """Parsea un registro .nbib; nunca lanza excepciones y siempre devuelve todos los campos"""
+    data = {**REGISTRO_NBIB, 'selected_keywords': [], 'extras': extras_desde_campos({})}
+    try:
+        campos = campos_nbib(content)
+
+        data['pmid'] = next((v for v in campos.get('PMID', []) if v.isdigit()), '')
+
+        # Autores: nombre completo (FAU) o abreviado (AU) si no hay FAU
+        authors = campos.get('FAU') or campos.get('AU') or []
+        if authors:
+            data['corresponding_author'] = authors[0]
+            data['coauthors'] = "; ".join(authors[1:])
+
+        data['article_title'] = _primero(campos, 'TI')
+
+        # Fecha: DP y, si no existe o no trae año, la fecha electrónica (DEP)
+        data['year'], data['pub_date'] = fecha_publicacion(_primero(campos, 'DP'))
+        if not data['year'] and campos.get('DEP'):
+            data['year'], data['pub_date'] = _fecha_electronica(_primero(campos, 'DEP'))
+
+        data['volume'] = _primero(campos, 'VI', token=True) or '0'
+        data['number'] = _primero(campos, 'IP', token=True) or '0'
+        data['pages'] = _primero(campos, 'PG', token=True) or '0'
+
+        data['journal_full'] = _primero(campos, 'JT')
+        data['journal_abbrev'] = _primero(campos, 'TA')
+        data['doi'] = doi_desde_campos(campos)
+
+        data['extras'] = extras_desde_campos(campos)
+    except Exception as e:
+        logging.error(f"NBIB Parse Error: {str(e)}")
+
+    return data
+
+def dividir_registros(content: str):
+    """Genera el texto de cada registro de un .nbib con varios artículos (separados por PMID-)"""
+    texto = (content or '').replace('\r\n', '\n').replace('\r', '\n')
+    inicios = [m.start() for m in re.finditer(r'^PMID-', texto, re.MULTILINE)]
+    if not inicios:
+        if texto.strip():
+            yield texto
+        return
+    for inicio, fin in zip(inicios, inicios[1:] + [len(texto)]):
+        yield texto[inicio:fin]
@@ -9,7 +9,15 @@ import paramiko
 import time
 import os
 import logging
+from functools import partial
 from PIL import Image
+from cache_local import cache_desde_secrets
+from esquemas import COLUMNA_ID, columnas, df_vacio, leer_csv
+from transaccion_guardado import ids_registros, leer_csv_texto, leer_lateral, quitar_bajas
+from diario_cambios import ESTADO_CONEXION, Reconciliador, cambios_pendientes, guardar_registros, sincronizar, dar_de_baja
+from extras_nbib import sugerir_lineas_extras, agregar_extras
+from nbib_parser import parsear_nbib, decodificar_nbib
+from indice_autores import IndiceAutores, ALIAS_AUTORES_FILE, actualizar_contenido
 
 # Configuración de logging mejorada
 logging.basicConfig(
@@ -34,6 +42,7 @@ class Config:
         # Configuración SFTP
         self.CSV_PRODUCTOS_PREFIX = "productos_"  # Prefijo para archivos CSV locales
         self.REMOTE_PRODUCTOS_PREFIX = st.secrets["prefixes"]["productos"]
+        self.NBIB_EXTRAS_SUFFIX = "_nbib.jsonl.gz"  # Archivo lateral con AB/MH/OT/PT por PMID
         self.TIMEOUT_SECONDS = 30
         self.LOGO_PATH = "escudo_COLOR.jpg"        
         
@@ -45,6 +54,12 @@ class Config:
             'DIR': st.secrets["sftp"]["dir"]
         }
 
+        # Caché local por contenido para PDF y temporales ([cache] dir y max_mb en secrets.toml)
+        self.CACHE = cache_desde_secrets(st.secrets)
+
+        # Modo sin conexión por omisión ([sincronizacion] sin_conexion = true en secrets.toml)
+        self.SIN_CONEXION = st.secrets.get("sincronizacion", {}).get("sin_conexion", False)
+
 CONFIG = Config()
 
 # ====================
@@ -97,7 +112,14 @@ class SSHManager:
 
     @staticmethod
     def get_connection():
-        """Establece conexión SSH segura con reintentos"""
+        """Conexión SSH, salvo en modo sin conexión o durante la espera tras un fallo (diario_cambios.py)"""
+        if st.session_state.get('sin_conexion', CONFIG.SIN_CONEXION):
+            return None
+        return ESTADO_CONEXION.conectar(SSHManager.conectar_servidor)
+
+    @staticmethod
+    def _intentar_conexion():
+        """(ssh, None) o (None, último error) tras los reintentos; no llama a Streamlit"""
         ssh = paramiko.SSHClient()
         ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
         
@@ -111,15 +133,27 @@ class SSHManager:
                     timeout=CONFIG.TIMEOUT_SECONDS
                 )
                 logging.info(f"Conexión SSH establecida (intento {attempt + 1})")
-                return ssh
+                return ssh, None
             except Exception as e:
                 logging.warning(f"Intento {attempt + 1} fallido: {str(e)}")
                 if attempt < SSHManager.MAX_RETRIES - 1:
                     time.sleep(SSHManager.RETRY_DELAY)
                 else:
                     logging.error("Fallo definitivo al conectar via SSH")
-                    st.error(f"Error de conexión SSH después de {SSHManager.MAX_RETRIES} intentos: {str(e)}")
-                    return None
+                    return None, e
+
+    @staticmethod
+    def conectar_servidor():
+        """Establece conexión SSH segura con reintentos"""
+        ssh, error = SSHManager._intentar_conexion()
+        if ssh is None:
+            st.error(f"Error de conexión SSH después de {SSHManager.MAX_RETRIES} intentos: {str(error)}")
+        return ssh
+
+    @staticmethod
+    def conectar_sin_aviso():
+        """Como conectar_servidor, sin mensajes en pantalla: la usa el reconciliador, que corre fuera de la sesión"""
+        return SSHManager._intentar_conexion()[0]
 
     @staticmethod
     def verify_file_integrity(local_path, remote_path, sftp):
@@ -146,14 +180,7 @@ class SSHManager:
                         sftp.stat(remote_path)
                     except FileNotFoundError:
                         # Crear archivo local con estructura correcta
-                        columns = [
-                            'economic_number', 'nombramiento', 'departamento', 'participation_key', 'investigator_name',
-                            'corresponding_author', 'coauthors', 'article_title', 'year',
-                            'pub_date', 'volume', 'number', 'pages', 'journal_full',
-                            'journal_abbrev', 'doi', 'jcr_group', 'pmid', 'selected_keywords',
-                            'sni', 'sii', 'pdf_filename', 'estado'  # Nuevos campos añadidos
-                        ]
-                        pd.DataFrame(columns=columns).to_csv(local_path, index=False)
+                        df_vacio('articulos').to_csv(local_path, index=False)
                         logging.info(f"Archivo remoto no encontrado, creado local con estructura: {local_path}")
                         return True
                         
@@ -319,84 +346,28 @@ def buscar_grupo_revista(nombre_revista):
     """Busca el grupo de impacto usando cache"""
     return JournalCache().get_journal_group(nombre_revista)
 
-def extract_keywords(title):
-    """Extrae palabras clave del título del artículo"""
-    if not title:
+def extract_keywords(title, extras=None):
+    """Sugiere líneas de investigación a partir del título y de AB/MH/OT (ordenadas por relevancia)"""
+    if not title and not extras:
         return []
-    found_keywords = set()
-    title_lower = title.lower()
-    for category, keywords in KEYWORD_CATEGORIES.items():
-        for keyword in keywords:
-            if keyword.lower() in title_lower:
-                found_keywords.add(category)
-                break
-    return sorted(found_keywords)
+    sugeridas = sugerir_lineas_extras(title, extras, umbral_relativo=0.5)
+    return [c for c in sugeridas if c in KEYWORD_CATEGORIES]
 
 def parse_nbib_file(content: str) -> dict:
     """Parsea el contenido de un archivo .nbib"""
-    data = {
-        'corresponding_author': '',
-        'coauthors': '',
-        'article_title': '',
-        'year': '',
-        'pub_date': '',
-        'volume': '0',  # Valor por defecto 0
-        'number': '0',  # Valor por defecto 0
-        'pages': '0',  # Valor por defecto 0
-        'journal_full': '',
-        'journal_abbrev': '',
-        'doi': '',
-        'jcr_group': '',
-        'pmid': '',
-        'investigator_name': '',
-        'economic_number': '',
-        'nombramiento': '',  # Nuevo campo añadido
-        'departamento': '',  # Nuevo campo añadido
-        'participation_key': '',
-        'selected_keywords': [],
-        'sni': '',  # Nuevo campo SNI
-        'sii': '',   # Nuevo campo SII
-        'pdf_filename': '',
-        'estado': 'A'
-    }
-
-    def extract_field(pattern, multi_line=False):
-        nonlocal content
-        flags = re.DOTALL if multi_line else 0
-        match = re.search(pattern, content, flags)
-        return match.group(1).strip() if match else ''
+    data = parsear_nbib(content)
 
     try:
-        # Extraer PMID
-        data['pmid'] = extract_field(r'PMID-\s+(\d+)')
-
-        # Extraer autores
-        authors = re.findall(r'FAU\s+-\s+(.*?)\n', content)
-        if authors:
-            data['corresponding_author'] = authors[0].strip()
-            data['coauthors'] = "; ".join(a.strip() for a in authors[1:])
-
-        # Extraer título del artículo
-        data['article_title'] = extract_field(r'TI\s+-\s+(.*?)(?:\n[A-Z]{2}\s+-|$)', True)
-
-        # Extraer fecha de publicación
-        pub_date_match = re.search(r'DP\s+-\s+(\d{4}\s+[A-Za-z]{3}\s+\d{1,2})', content)
-        if pub_date_match:
-            try:
-                date_obj = datetime.strptime(pub_date_match.group(1), '%Y %b %d')
-                data['pub_date'] = date_obj.strftime('%Y-%m-%d')
-                data['year'] = date_obj.strftime('%Y')
-            except:
-                data['pub_date'] = pub_date_match.group(1)
-                data['year'] = pub_date_match.group(1).split()[0]
-        else:
-            data['year'] = extract_field(r'DP\s+-\s+(\d{4})')
-            data['pub_date'] = data['year']
+        if data['journal_full'] or data['journal_abbrev']:
+            data['jcr_group'] = buscar_grupo_revista(data['journal_full'] or data['journal_abbrev'])
 
         # Interfaz para fecha de publicación
         st.subheader("📅 Fecha de publicación")
         st.markdown("**Suministre manualmente la fecha de publicación, no siempre PubMed la tiene  registrada**")
-        default_date = f"{data['year']}-01-01" if data['year'] else ""
+        if re.fullmatch(r'\d{4}-\d{2}-\d{2}', data['pub_date']):
+            default_date = data['pub_date']
+        else:
+            default_date = f"{data['year']}-01-01" if data['year'] else ""
         pub_date = st.text_input("Ingrese la fecha de publicación (YYYY-MM-DD):",
                                value=default_date,
                                help="Formato: Año-Mes-Día (ej. 2023-05-15)")
@@ -407,26 +378,6 @@ def parse_nbib_file(content: str) -> dict:
             st.error("Formato de fecha inválido. Por favor use YYYY-MM-DD")
             return None
 
-        # Extraer volumen, número y páginas (con 0 por defecto)
-        data['volume'] = extract_field(r'VI\s+-\s+(\S+)') or '0'
-        data['number'] = extract_field(r'IP\s+-\s+(\S+)') or '0'
-        data['pages'] = extract_field(r'PG\s+-\s+(\S+)') or '0'
-
-        # Extraer información de la revista
-        data['journal_full'] = extract_field(r'JT\s+-\s+(.*?)\n')
-        data['journal_abbrev'] = extract_field(r'TA\s+-\s+(.*?)\n')
-        if data['journal_full'] or data['journal_abbrev']:
-            data['jcr_group'] = buscar_grupo_revista(data['journal_full'] or data['journal_abbrev'])
-
-        # Extraer DOI
-        doi_match = re.search(r'DO\s+-\s+(.*?)\n', content) or \
-                   re.search(r'(?:LID|AID)\s+-\s+(.*?doi\.org/.*?)\s', content) or \
-                   re.search(r'(?:LID|AID)\s+-\s+(10\.\S+)', content)
-        if doi_match:
-            data['doi'] = doi_match.group(1).strip()
-        else:
-            data['doi'] = ''  # Cadena vacía como valor por defecto
-
     except Exception as e:
         st.error(f"Error al procesar archivo .nbib: {str(e)}")
         logging.error(f"NBIB Parse Error: {str(e)}")
@@ -443,48 +394,33 @@ def sync_with_remote(economic_number):
         remote_path = os.path.join(CONFIG.REMOTE['DIR'], remote_filename)
 
         # Intenta descargar el archivo remoto
-        download_success = SSHManager.download_remote_file(remote_path, csv_filename)
+        download_success = sincronizar(SSHManager.get_connection, remote_path, csv_filename)
 
         if not download_success:
             # Si no existe el archivo remoto, crea uno local con estructura correcta
-            columns = [
-                'economic_number', 'nombramiento', 'departamento', 'participation_key', 'investigator_name',
-                'corresponding_author', 'coauthors', 'article_title', 'year',
-                'pub_date', 'volume', 'number', 'pages', 'journal_full',
-                'journal_abbrev', 'doi', 'jcr_group', 'pmid', 'selected_keywords',
-                'sni', 'sii', 'pdf_filename', 'estado'  # Nuevos campos añadidos
-            ]
-
             # Verifica si el archivo local ya existe
             if not Path(csv_filename).exists():
-                pd.DataFrame(columns=columns).to_csv(csv_filename, index=False)
+                df_vacio('articulos').to_csv(csv_filename, index=False)
                 st.info("ℹ️ No se encontró archivo remoto. Se creó uno nuevo localmente con la estructura correcta.")
             else:
                 # Si el archivo local existe pero está vacío o corrupto
                 try:
-                    df = pd.read_csv(csv_filename)
+                    df = leer_csv('articulos', csv_filename, analitico=False)
                     if df.empty:
-                        pd.DataFrame(columns=columns).to_csv(csv_filename, index=False)
+                        df_vacio('articulos').to_csv(csv_filename, index=False)
                 except:
-                    pd.DataFrame(columns=columns).to_csv(csv_filename, index=False)
+                    df_vacio('articulos').to_csv(csv_filename, index=False)
 
             return False
 
         # Verifica que el archivo descargado no esté vacío
         try:
-            df = pd.read_csv(csv_filename)
+            df = leer_csv('articulos', csv_filename, analitico=False)
             if df.empty:
                 st.warning("El archivo remoto está vacío")
         except pd.errors.EmptyDataError:
             st.warning("El archivo remoto está vacío o corrupto")
-            columns = [
-                'economic_number', 'nombramiento', 'departamento', 'participation_key', 'investigator_name',
-                'corresponding_author', 'coauthors', 'article_title', 'year',
-                'pub_date', 'volume', 'number', 'pages', 'journal_full',
-                'journal_abbrev', 'doi', 'jcr_group', 'pmid', 'selected_keywords',
-                'sni', 'sii', 'pdf_filename', 'estado'  # Nuevos campos añadidos
-            ]
-            pd.DataFrame(columns=columns).to_csv(csv_filename, index=False)
+            df_vacio('articulos').to_csv(csv_filename, index=False)
             return False
 
         st.success("✅ Sincronización con servidor remoto completada")
@@ -495,85 +431,85 @@ def sync_with_remote(economic_number):
         logging.error(f"Sync Error: {str(e)}")
         return False
 
-def save_to_csv(data: dict, sni: str, sii: str):
-    """Guarda los datos en el CSV local y remoto, eliminando registros marcados con 'X'"""
+def ruta_indice_autores(economic_number) -> str:
+    return os.path.join(CONFIG.REMOTE['DIR'], ALIAS_AUTORES_FILE.format(economic_number=economic_number))
+
+def load_author_index(economic_number, productos_df=None):
+    """Índice de alias del investigador, leído del servidor una vez por sesión (vacío si aún no existe).
+    Sin alias propios se siembra en memoria con sus registros; el siguiente guardado lo publica sembrado."""
+    clave = f"indice_autores_{economic_number}"
+    if clave not in st.session_state:
+        contenido = leer_lateral(SSHManager.get_connection, ruta_indice_autores(economic_number))
+        if contenido is None:
+            # Sin conexión: índice vacío sin guardarlo en la sesión, se vuelve a leer al recuperarla
+            return IndiceAutores()
+        st.session_state[clave] = IndiceAutores.desde_contenido(contenido)
+    indice = st.session_state[clave]
+    if productos_df is not None and 'investigator_name' in productos_df.columns:
+        indice.sembrar(economic_number, productos_df['investigator_name'].dropna())
+    return indice
+
+def lateral_indice_autores(economic_number, csv_filename, investigator_names) -> tuple:
+    """(ruta remota, actualización) del índice de alias para guardar_registros; manual4.py actualiza el mismo índice"""
     try:
-        economic_number = data['economic_number']
-        csv_filename = f"{CONFIG.CSV_PRODUCTOS_PREFIX}{economic_number}.csv"
-
-        with st.spinner("Sincronizando datos con el servidor..."):
-            if not sync_with_remote(economic_number):
-                st.warning("⚠️ Trabajando con copia local debido a problemas de conexión")
+        semilla = leer_csv('articulos', csv_filename, seleccion=['investigator_name'], analitico=False)['investigator_name'].dropna().tolist()
+    except (OSError, ValueError, KeyError, pd.errors.EmptyDataError):
+        semilla = []
+    return (
+        ruta_indice_autores(economic_number),
+        # partial (no lambda): sin conexión se anota en el diario y se publica al reconciliar
+        partial(actualizar_contenido, economic_number=economic_number, nombres=list(investigator_names), semilla=semilla)
+    )
 
-        columns = [
-            'economic_number', 'nombramiento', 'sni', 'sii', 'departamento', 'participation_key', 'investigator_name',
-            'corresponding_author', 'coauthors', 'article_title', 'year',
-            'pub_date', 'volume', 'number', 'pages', 'journal_full',
-            'journal_abbrev', 'doi', 'jcr_group', 'pmid', 'selected_keywords',
-            'pdf_filename', 'estado'
-        ]
+def registrar_alias_sesion(economic_number, resultado: dict, ruta: str, investigator_names) -> None:
+    """Deja en la sesión el índice publicado; si no se publicó (sin conexión), suma los nombres en memoria"""
+    clave = f"indice_autores_{economic_number}"
+    if ruta in resultado.get('laterales', {}):
+        st.session_state[clave] = IndiceAutores.desde_contenido(resultado['laterales'][ruta])
+    elif clave in st.session_state:
+        for investigator_name in investigator_names:
+            st.session_state[clave].registrar(economic_number, investigator_name)
 
-        # Verificar si el archivo existe y tiene contenido válido
-        if not Path(csv_filename).exists():
-            df_existing = pd.DataFrame(columns=columns)
-        else:
-            try:
-                df_existing = pd.read_csv(
-                    csv_filename,
-                    encoding='utf-8-sig',
-                    dtype={'economic_number': str}
-                )
-                # Verificar si el DataFrame está vacío
-                if df_existing.empty:
-                    df_existing = pd.DataFrame(columns=columns)
-                # Verificar si tiene todas las columnas necesarias
-                missing_cols = set(columns) - set(df_existing.columns)
-                if missing_cols:
-                    for col in missing_cols:
-                        df_existing[col] = ""
-            except (pd.errors.EmptyDataError, pd.errors.ParserError):
-                df_existing = pd.DataFrame(columns=columns)
-
-        # FILTRAR: Eliminar registros con estado 'X' antes de agregar el nuevo
-        df_existing = df_existing[df_existing['estado'] != 'X']
+def save_to_csv(data: dict, sni: str, sii: str):
+    """Guarda el registro en una sola transacción, eliminando registros con estado 'X'"""
+    try:
+        economic_number = data['economic_number']
 
         # Añadir los valores de SNI y SII al diccionario de datos
         data['sni'] = sni
         data['sii'] = sii
+        registros = [data]
+        csv_filename = f"{CONFIG.CSV_PRODUCTOS_PREFIX}{economic_number}.csv"
+        remote_filename = f"{CONFIG.REMOTE_PRODUCTOS_PREFIX}{economic_number}.csv"
+        remote_path = os.path.join(CONFIG.REMOTE['DIR'], remote_filename)
 
-        # Preparar el nuevo registro
-        df_new = pd.DataFrame([data])
-
-        # Limpiar los datos del nuevo registro
-        for col in df_new.columns:
-            if df_new[col].dtype == object:
-                df_new[col] = df_new[col].astype(str).str.replace(r'\r\n|\n|\r', ' ', regex=True).str.strip()
-
-        # Combinar los datos existentes (ya filtrados) con los nuevos
-        df_combined = pd.concat([df_existing, df_new], ignore_index=True)
-
-        # Asegurar que todas las columnas estén presentes
-        for col in columns:
-            if col not in df_combined.columns:
-                df_combined[col] = ""
-
-        # Reordenar columnas según el orden especificado
-        df_combined = df_combined[columns]
-
-        # Guardar localmente
-        df_combined.to_csv(csv_filename, index=False, encoding='utf-8-sig')
-
-        # Intentar subir al servidor remoto
-        with st.spinner("Subiendo datos al servidor remoto..."):
-            remote_filename = f"{CONFIG.REMOTE_PRODUCTOS_PREFIX}{economic_number}.csv"
-            remote_path = os.path.join(CONFIG.REMOTE['DIR'], remote_filename)
-            if SSHManager.upload_remote_file(csv_filename, remote_path):
-                st.success("✅ Registro guardado exitosamente en el servidor remoto!")
-                return True
-            else:
-                st.error("❌ No se pudo subir el archivo al servidor remoto")
-                st.info("ℹ️ Los datos se guardaron localmente y se intentará subir en la próxima sincronización")
-                return False
+        columns = columnas('articulos')
+
+        # Resumen y MeSH van al archivo lateral (no al CSV principal), en la misma conexión
+        laterales = {}
+        if data.get('pmid') and data.get('extras'):
+            extras_path = os.path.join(CONFIG.REMOTE['DIR'], f"{CONFIG.REMOTE_PRODUCTOS_PREFIX}{economic_number}{CONFIG.NBIB_EXTRAS_SUFFIX}")
+            laterales[extras_path] = partial(agregar_extras, pmid=data['pmid'], extras=data['extras'])
+        # Nombre elegido en el índice de alias, también en la misma conexión
+        autores_path, actualizar_autores = lateral_indice_autores(economic_number, csv_filename, [data['investigator_name']])
+        laterales[autores_path] = actualizar_autores
+
+        # Una conexión: consulta la versión remota, descarga solo si cambió, fusiona,
+        # escribe de forma atómica y sube una vez
+        with st.spinner("Guardando datos en el servidor..."):
+            resultado = guardar_registros(SSHManager.get_connection, csv_filename, remote_path, columns, registros,
+                                          laterales=laterales)
+        registrar_alias_sesion(economic_number, resultado, autores_path, [data['investigator_name']])
+
+        if resultado['subido']:
+            st.success("✅ Registro guardado exitosamente en el servidor remoto!")
+            return True
+        if resultado['diario']:
+            # El alta quedó en el diario local; el reconciliador la envía al volver la conexión
+            st.warning("📝 Sin conexión: el registro se guardó localmente y se enviará al servidor al volver la conexión")
+            return True
+        st.error(f"❌ Error al guardar en CSV: {resultado['error']}")
+        return False
 
     except Exception as e:
         st.error(f"❌ Error al guardar en CSV: {str(e)}")
@@ -631,6 +567,16 @@ def main():
 
     st.title("📊 Artículos en PubMed")
 
+    # Modo sin conexión: altas y bajas van al diario local y el reconciliador las envía al volver la conexión
+    Reconciliador().iniciar(SSHManager.conectar_sin_aviso)
+    st.sidebar.toggle("🔌 Trabajar sin conexión", value=CONFIG.SIN_CONEXION, key="sin_conexion")
+    ESTADO_CONEXION.fijar_sin_conexion(st.session_state.sin_conexion)
+    if st.session_state.sin_conexion or not ESTADO_CONEXION.disponible():
+        st.sidebar.warning("Sin conexión: los cambios se guardan en el diario local")
+    pendientes = cambios_pendientes()
+    if pendientes:
+        st.sidebar.info(f"📝 {pendientes} cambio(s) pendiente(s) de enviar al servidor")
+
     # Precargar datos de factores de impacto
     with st.spinner("Cargando base de datos de factores de impacto..."):
         _ = JournalCache()
@@ -695,14 +641,24 @@ def main():
     remote_productos_filename = f"{CONFIG.REMOTE_PRODUCTOS_PREFIX}{economic_number}.csv"
     local_productos_filename = f"{CONFIG.CSV_PRODUCTOS_PREFIX}{economic_number}.csv"
 
+    # Solo se descarga si el remoto cambió desde la última sincronización
     with st.spinner("Sincronizando archivo de productos..."):
-        if not SSHManager.download_remote_file(remote_productos_filename, local_productos_filename):
+        if not sincronizar(
+            SSHManager.get_connection,
+            os.path.join(CONFIG.REMOTE['DIR'], remote_productos_filename),
+            local_productos_filename
+        ):
             st.warning("No se pudo descargar el archivo remoto de productos. Trabajando con versión local.")
 
     # Cargar o inicializar el DataFrame
     if Path(local_productos_filename).exists():
         try:
-            productos_df = pd.read_csv(local_productos_filename, encoding='utf-8-sig', dtype={'economic_number': str})
+            productos_df = leer_csv('articulos', local_productos_filename, analitico=False)
+            # Las filas dadas de baja (lápidas) no se muestran; el índice sigue siendo la posición en el CSV
+            productos_df = quitar_bajas(productos_df, local_productos_filename, columnas('articulos'))
+            # record_id de cada fila (por su posición en el CSV); las capturadas antes de existir la columna usan la huella de su contenido
+            ids = ids_registros(leer_csv_texto(local_productos_filename, columnas('articulos')), columnas('articulos'))
+            productos_df[COLUMNA_ID] = [ids[posicion] for posicion in productos_df.index]
             productos_df['economic_number'] = productos_df['economic_number'].astype(str).str.strip()
 
             # Asegurar que los campos SNI y SII existan y tengan valores
@@ -727,21 +683,9 @@ def main():
                 productos_df['pdf_filename'] = ''
         except Exception as e:
             st.error(f"Error al leer el archivo: {str(e)}")
-            productos_df = pd.DataFrame(columns=[
-                'economic_number', 'nombramiento', 'sni', 'sii', 'departamento', 'participation_key', 'investigator_name',
-                'corresponding_author', 'coauthors', 'article_title', 'year',
-                'pub_date', 'volume', 'number', 'pages', 'journal_full',
-                'journal_abbrev', 'doi', 'jcr_group', 'pmid', 'selected_keywords',
-                'pdf_filename', 'estado'
-            ])
+            productos_df = df_vacio('articulos')
     else:
-        productos_df = pd.DataFrame(columns=[
-            'economic_number', 'nombramiento', 'sni', 'sii', 'departamento', 'participation_key', 'investigator_name',
-            'corresponding_author', 'coauthors', 'article_title', 'year',
-            'pub_date', 'volume', 'number', 'pages', 'journal_full',
-            'journal_abbrev', 'doi', 'jcr_group', 'pmid', 'selected_keywords',
-            'pdf_filename', 'estado'
-        ])
+        productos_df = df_vacio('articulos')
 
     # Mostrar registros existentes si los hay
     if not productos_df.empty:
@@ -777,7 +721,8 @@ def main():
         )
 
         # Verificar si hay cambios en los estados
-        cambios = not edited_df.equals(productos_df[columnas_mostrar])
+        # Solo las filas que el usuario tocó en el editor (fila mostrada -> columnas editadas)
+        cambios = bool(st.session_state.get("editor_tabla", {}).get("edited_rows"))
         registros_marcados = edited_df[edited_df['estado'] == 'X']
 
         # Mostrar botón solo si hay cambios y registros marcados con X
@@ -786,18 +731,16 @@ def main():
                 # Actualizar el estado en el DataFrame original
                 productos_df['estado'] = edited_df['estado']
 
-                # Filtrar solo los registros activos (estado 'A')
-                productos_df = productos_df[productos_df['estado'] == 'A'].copy()
-
-                # Guardar cambios en el archivo
-                productos_df.to_csv(local_productos_filename, index=False, encoding='utf-8-sig')
-
-                # Sincronizar con servidor remoto
+                # Baja con lápidas: no se reescribe ni se vuelve a subir el CSV
+                posiciones = list(productos_df.index[productos_df['estado'] == 'X'])
                 with st.spinner("Eliminando registros del servidor remoto..."):
-                    upload_success = SSHManager.upload_remote_file(
+                    upload_success = dar_de_baja(
+                        SSHManager.get_connection,
                         local_productos_filename,
-                        os.path.join(CONFIG.REMOTE['DIR'], remote_productos_filename)
-                    )
+                        os.path.join(CONFIG.REMOTE['DIR'], remote_productos_filename),
+                        posiciones,
+                        columnas('articulos')
+                    )['aplicada']
 
                 if upload_success:
                     st.success("✅ Registros eliminados exitosamente!")
@@ -836,7 +779,7 @@ def main():
 
         if uploaded_file:
             try:
-                content = uploaded_file.read().decode("utf-8")
+                content = decodificar_nbib(uploaded_file.read())
                 data = parse_nbib_file(content)
 
                 if data:
@@ -852,7 +795,7 @@ def main():
                     selected_categories = st.multiselect(
                         "Seleccione al menos 1 línea de investigación:",
                         options=list(KEYWORD_CATEGORIES.keys()),
-                        default=extract_keywords(data['article_title'])[:1],
+                        default=extract_keywords(data['article_title'], data['extras'])[:3],
                         max_selections=3
                     )
 
@@ -870,7 +813,14 @@ def main():
                     if data['coauthors']:
                         authors_list.extend(data['coauthors'].split("; "))
 
-                    investigator_name = st.selectbox("Seleccione su nombre:", authors_list)
+                    # Preselección con los nombres usados en registros anteriores
+                    indice_autores = load_author_index(economic_number, productos_df)
+                    posicion_sugerida = indice_autores.sugerir(economic_number, authors_list)
+                    investigator_name = st.selectbox(
+                        "Seleccione su nombre:",
+                        authors_list,
+                        index=posicion_sugerida if posicion_sugerida is not None else 0
+                    )
                     data['investigator_name'] = investigator_name
                     data['economic_number'] = economic_number
                     data['participation_key'] = "CA" if investigator_name == data['corresponding_author'] else f"{authors_list.index(investigator_name)}C"
@@ -896,13 +846,12 @@ def main():
                             except:
                                 pass  # Si no puede verificar, continuar
 
-                            # Guardar temporalmente el archivo localmente
-                            with open(pdf_filename, "wb") as f:
-                                f.write(articulo_pdf.getbuffer())
+                            # Copia local en el caché (por contenido), no en el directorio de trabajo
+                            pdf_local = CONFIG.CACHE.guardar_bytes(pdf_remote_path, articulo_pdf.getvalue())
 
                             # Subir al servidor remoto
                             with st.spinner("Subiendo documento del artículo..."):
-                                upload_success = SSHManager.upload_remote_file(pdf_filename, pdf_remote_path)
+                                upload_success = SSHManager.upload_remote_file(pdf_local, pdf_remote_path)
 
                             if upload_success:
                                 st.success(f"✅ Documento subido correctamente: {pdf_filename}")
@@ -927,15 +876,6 @@ def main():
                                 st.balloons()
                                 st.success("✅ Registro guardado exitosamente!")
 
-                                # Intentar subir el archivo actualizado al servidor remoto
-                                with st.spinner("Sincronizando con servidor remoto..."):
-                                    upload_success = SSHManager.upload_remote_file(
-                                        local_productos_filename,
-                                        os.path.join(CONFIG.REMOTE['DIR'], remote_productos_filename)
-                                    )
-                                    if not upload_success:
-                                        st.warning("No se pudo sincronizar con el servidor remoto. Los datos se guardaron localmente.")
-
             except Exception as e:
                 st.error(f"❌ Error: {str(e)}")
                 logging.error(f"Main App Error: {str(e)}")
@@ -0,0 +1,114 @@
+import os
+import time
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.utils import get_column_letter
+
+# ====================
+# REPORTE EXCEL EN MODO STREAMING
+# ====================
+# Un solo libro con el resumen del periodo, la productividad y las métricas por
+# investigador, las métricas por producto, el top N y los registros del
+# periodo. Se escribe con Workbook(write_only=True): cada fila se serializa al
+# archivo temporal de openpyxl en cuanto se agrega, y los DataFrames se recorren
+# en bloques de FILAS_POR_BLOQUE, así que la memoria no crece con el número de
+# registros. El libro se deja en disco (escritura atómica con os.replace) y el
+# tablero solo lo genera cuando el usuario lo pide; los reportes de más de
+# HORAS_REPORTE horas se borran al generar uno nuevo.
+
+MIME_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+FILAS_POR_BLOQUE = 5_000
+# Filas de datos por hoja (1,048,576 de Excel menos el encabezado); el resto sigue en "<hoja> (2)", ...
+MAX_FILAS_HOJA = 1_048_575
+TOP_N = 20
+_ANCHO_MAXIMO = 60
+PREFIJO_REPORTE = 'reporte_'
+HORAS_REPORTE = 6
+
+def nombre_hoja(nombre: str, usados: set) -> str:
+    """Nombre válido para Excel (≤ 31 caracteres, sin []:*?/\\) y no repetido en el libro"""
+    limpio = ''.join('_' if c in '[]:*?/\\' else c for c in str(nombre))[:31] or 'Hoja'
+    candidato, n = limpio, 2
+    while candidato.lower() in usados:
+        sufijo = f" ({n})"
+        candidato, n = limpio[:31 - len(sufijo)] + sufijo, n + 1
+    usados.add(candidato.lower())
+    return candidato
+
+def _filas(bloque: pd.DataFrame):
+    """Tuplas de celdas de un bloque: nulos como vacío y texto sin caracteres de control"""
+    bloque = bloque.astype(object).where(bloque.notna(), None)
+    for columna in bloque.columns:
+        if pd.api.types.is_object_dtype(bloque[columna]):
+            bloque[columna] = bloque[columna].map(
+                lambda v: ILLEGAL_CHARACTERS_RE.sub('', v) if isinstance(v, str) else v
+            )
+    return bloque.itertuples(index=False, name=None)
+
+def _nueva_hoja(libro: Workbook, nombre: str, df: pd.DataFrame, usados: set):
+    hoja = libro.create_sheet(nombre_hoja(nombre, usados))
+    # En modo write-only el ancho y el panel fijo se definen antes de la primera fila
+    for k, columna in enumerate(df.columns, start=1):
+        hoja.column_dimensions[get_column_letter(k)].width = min(max(len(str(columna)) + 2, 12), _ANCHO_MAXIMO)
+    hoja.freeze_panes = 'A2'
+    hoja.append([str(c) for c in df.columns])
+    return hoja
+
+def escribir_hoja(libro: Workbook, nombre: str, df: pd.DataFrame, usados: set) -> int:
+    """Agrega df al libro por bloques, en varias hojas si excede MAX_FILAS_HOJA; devuelve las filas escritas"""
+    hoja = _nueva_hoja(libro, nombre, df, usados)
+    en_hoja = 0
+    for inicio in range(0, len(df), FILAS_POR_BLOQUE):
+        for fila in _filas(df.iloc[inicio:inicio + FILAS_POR_BLOQUE]):
+            if en_hoja == MAX_FILAS_HOJA:
+                hoja, en_hoja = _nueva_hoja(libro, nombre, df, usados), 0
+            hoja.append(fila)
+            en_hoja += 1
+    return len(df)
+
+def hoja_resumen(indicadores: dict) -> pd.DataFrame:
+    """Tabla (Indicador, Valor) para la hoja de resumen"""
+    return pd.DataFrame({'Indicador': list(indicadores), 'Valor': list(indicadores.values())})
+
+def generar_reporte(hojas: dict, destino) -> Path:
+    """Escribe {nombre de hoja: DataFrame} en un .xlsx en modo streaming y lo deja en destino"""
+    destino = Path(destino)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    libro = Workbook(write_only=True)
+    usados = set()
+    for nombre, df in hojas.items():
+        if df is not None:
+            escribir_hoja(libro, nombre, df, usados)
+    if not usados:
+        libro.create_sheet('Reporte')
+
+    # Archivo temporal en el mismo directorio: otra sesión nunca ve un libro a medias
+    descriptor, temporal = tempfile.mkstemp(dir=destino.parent, prefix=f"{destino.stem}.", suffix='.xlsx.tmp')
+    os.close(descriptor)
+    try:
+        libro.save(temporal)
+        os.replace(temporal, destino)
+    except Exception:
+        Path(temporal).unlink(missing_ok=True)
+        raise
+    return destino
+
+def limpiar_reportes(directorio, horas: float = HORAS_REPORTE) -> int:
+    """Borra los reporte_*.xlsx (y temporales abandonados) con más de 'horas' horas; devuelve cuántos borró"""
+    limite = time.time() - horas * 3600
+    borrados = 0
+    for ruta in Path(directorio).glob(f"{PREFIJO_REPORTE}*.xlsx*"):
+        if not (ruta.name.endswith('.xlsx') or ruta.name.endswith('.xlsx.tmp')):
+            continue
+        try:
+            if ruta.stat().st_mtime < limite:
+                ruta.unlink()
+                borrados += 1
+        except FileNotFoundError:
+            # Otra sesión lo borró o lo reemplazó entretanto
+            continue
+    return borrados
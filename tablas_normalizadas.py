@@ -0,0 +1,107 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from esquemas import COLUMNA_ID
+
+# ====================
+# TABLAS NORMALIZADAS DE PALABRAS CLAVE Y AUTORES
+# ====================
+# selected_keywords se guarda como lista de Python en texto ("['a', 'b']") y
+# coauthors como 'A; B; C'. En lugar de volver a partirlos en cada render, el
+# cargador de cada tablero produce una vez por versión del total las tablas
+# explotadas (registro, palabra) y (registro, autor), con la palabra/autor como
+# categoría. El índice de cada tabla es la etiqueta de fila del DataFrame de
+# origen (se repite una vez por palabra), así que se cruzan con cualquier
+# subconjunto filtrado por índice; record_id acompaña si el total lo trae.
+
+# Coma separadora fuera de comillas simples (listas "['a, b', 'c']")
+SEPARADOR_LISTA = re.compile(r",\s*(?=(?:[^']*'[^']*')*[^']*$)")
+
+def partir_palabras(texto: str) -> list:
+    """Palabras clave de "['a', 'b']" o 'a, b', igual que la tabla resumen de los tableros"""
+    texto = str(texto).strip()
+    if texto.startswith('[') and texto.endswith(']'):
+        partes = SEPARADOR_LISTA.split(texto[1:-1])
+        return [p.strip().strip("'\"") for p in partes if p.strip()]
+    return [p.strip() for p in texto.split(",") if p.strip()]
+
+def partir_terminos(texto: str) -> list:
+    """Palabras clave partidas en cada coma, también dentro de las comillas, como las
+    funciones de relevancia temática (IRT) originales de los tableros"""
+    texto = str(texto).strip()
+    if texto.startswith('[') and texto.endswith(']'):
+        return [p.strip().strip("'\"") for p in texto[1:-1].split(",") if p.strip()]
+    return [p.strip() for p in texto.split(",") if p.strip()]
+
+def partir_lineas(texto: str) -> list:
+    """Líneas de 'a, b' (linea_investigacion de congresos, sin formato de lista)"""
+    return [p.strip() for p in str(texto).split(",") if p.strip()]
+
+def partir_autores(texto: str) -> list:
+    """Autores de 'A; B; C'"""
+    return [a.strip() for a in str(texto).split(";") if a.strip()]
+
+# {tabla: (columna de origen, función de partición, nombre de la columna explotada)}
+# 'palabras' alimenta la tabla resumen; 'terminos' (partida en cada coma) el IRT
+TABLAS_POR_TIPO = {
+    'articulos': {
+        'palabras': ('selected_keywords', partir_palabras, 'palabra'),
+        'terminos': ('selected_keywords', partir_terminos, 'palabra'),
+        'autores': ('coauthors', partir_autores, 'autor'),
+    },
+    'tesis': {
+        'palabras': ('selected_keywords', partir_palabras, 'palabra'),
+        'terminos': ('selected_keywords', partir_terminos, 'palabra'),
+    },
+    'libros': {
+        'palabras': ('selected_keywords', partir_palabras, 'palabra'),
+        'terminos': ('selected_keywords', partir_terminos, 'palabra'),
+    },
+    'capitulos': {
+        'palabras': ('selected_keywords', partir_palabras, 'palabra'),
+        'terminos': ('selected_keywords', partir_terminos, 'palabra'),
+    },
+    'congresos': {'palabras': ('linea_investigacion', partir_lineas, 'palabra')},
+}
+
+def explotar(df: pd.DataFrame, columna: str, partir, nombre: str) -> pd.DataFrame:
+    """Tabla (record_id, nombre) con una fila por parte; cada valor distinto de la columna se parte una sola vez"""
+    codigos, valores = pd.factorize(df[columna].astype(object), use_na_sentinel=True)
+    listas = [partir(v) for v in valores]
+    largos = np.array([len(l) for l in listas], dtype=np.int64)
+    inicio = np.cumsum(largos) - largos
+    # Códigos de categoría de todas las partes, en el orden de los valores distintos
+    codigos_parte, categorias = pd.factorize(pd.Series([p for l in listas for p in l], dtype=object))
+
+    presentes = np.flatnonzero(codigos >= 0)
+    por_fila = largos[codigos[presentes]]
+    filas = np.repeat(presentes, por_fila)
+    # Posición de cada parte dentro de su valor: 0..largo-1 por fila
+    desplazamiento = np.arange(len(filas)) - np.repeat(np.cumsum(por_fila) - por_fila, por_fila)
+    partes = np.repeat(inicio[codigos[presentes]], por_fila) + desplazamiento
+
+    tabla = pd.DataFrame(
+        {nombre: pd.Categorical.from_codes(codigos_parte[partes], categories=pd.Index(categorias, dtype=object))},
+        index=df.index[filas]
+    )
+    if COLUMNA_ID in df.columns:
+        tabla.insert(0, COLUMNA_ID, df[COLUMNA_ID].to_numpy()[filas])
+    return tabla
+
+def tablas_laterales(tipo: str, df: pd.DataFrame) -> dict:
+    """{'palabras': ..., 'terminos': ..., 'autores': ...} del tipo de producto, con las columnas que traiga df"""
+    return {
+        tabla: explotar(df, columna, partir, nombre)
+        for tabla, (columna, partir, nombre) in TABLAS_POR_TIPO[tipo].items()
+        if columna in df.columns
+    }
+
+def de_filas(tabla: pd.DataFrame, filas: pd.Index) -> pd.DataFrame:
+    """Partes de las filas indicadas (etiquetas de índice del DataFrame de origen)"""
+    return tabla[tabla.index.isin(filas)]
+
+def distintos(tabla: pd.DataFrame, filas: pd.Index) -> int:
+    """Número de valores distintos entre las partes de las filas indicadas"""
+    return int(de_filas(tabla, filas).iloc[:, -1].nunique())
@@ -0,0 +1,66 @@
+import random
+
+import pandas as pd
+import pytest
+
+from banco_metricas import NOMBRES, PALABRAS, TIPOS_TESIS
+from cubo_mensual import CUBOS, construir_cubo, por_investigador
+from duplicados import COLUMNA_GRUPO, con_grupos
+from indice_periodo import IndicePeriodo
+from metricas_vectorizadas import metricas
+
+
+def _tesis(n: int, semilla: int = 0) -> pd.DataFrame:
+    """Tesis con títulos repetidos entre años (capturas de varios coautores)"""
+    rng = random.Random(semilla)
+    titulos = [f"Tesis sobre el tema {k} en pacientes" for k in range(n // 3)]
+    return pd.DataFrame({
+        'titulo_tesis': [rng.choice(titulos) for _ in range(n)],
+        'year': [rng.randint(2015, 2024) for _ in range(n)],
+        'economic_number': [str(rng.randint(1, 6)) for _ in range(n)],
+        'departamento': [rng.choice(['A', 'B']) for _ in range(n)],
+        'tipo_tesis': [rng.choice(TIPOS_TESIS) for _ in range(n)],
+        'directores': [rng.choice(NOMBRES) for _ in range(n)],
+        'coautores': [rng.choice(NOMBRES) for _ in range(n)],
+        'selected_keywords': [", ".join(rng.sample(PALABRAS, 3)) for _ in range(n)],
+    })
+
+
+def _articulos(n: int, semilla: int = 0) -> pd.DataFrame:
+    rng = random.Random(semilla)
+    titulos = [f"Arterial stiffness study number {k}" for k in range(n // 3)]
+    return pd.DataFrame({
+        'article_title': [rng.choice(titulos) for _ in range(n)],
+        'pub_date': pd.to_datetime([f"2022-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" for _ in range(n)]),
+        'investigator_name': [rng.choice(['García J', 'López M', 'Smith A']) for _ in range(n)],
+        'departamento': [rng.choice(['A', 'B']) for _ in range(n)],
+        'journal_abbrev': [rng.choice(['Nature', 'JAMA', 'PLoS One', 'Arch Cardiol Mex']) for _ in range(n)],
+        'jcr_group': [rng.choice(['Q1 5.2', 'Q2 2.5', 'Q3 1.1']) for _ in range(n)],
+        'coauthors': [rng.choice(NOMBRES) for _ in range(n)],
+        'selected_keywords': [", ".join(rng.sample(PALABRAS, 3)) for _ in range(n)],
+    })
+
+
+def _por_tabla(tipo: str, df: pd.DataFrame, desde, hasta) -> pd.DataFrame:
+    """Lo que hacían los tableros: cortar el periodo, deduplicar y promediar por investigador"""
+    definicion = CUBOS[tipo]
+    corte = IndicePeriodo(df, definicion['fecha'], definicion['investigador']).periodo(desde, hasta)
+    unicos = metricas(tipo, corte.drop_duplicates(subset=[COLUMNA_GRUPO]))
+    agrupado = unicos.groupby(definicion['investigador'], observed=True)
+    resultado = agrupado[definicion['metricas']].mean()
+    resultado[definicion['titulo']] = agrupado.size()
+    return resultado.reset_index()
+
+
+@pytest.mark.parametrize('tipo, generar, desde, hasta', [
+    ('tesis', _tesis, 2018, 2021),
+    ('tesis', _tesis, 2015, 2024),
+    ('articulos', _articulos, '2022-04-01', '2022-08-31'),
+    ('articulos', _articulos, '2022-03-01', '2022-03-31'),
+])
+def test_cubo_igual_a_la_tabla_en_un_periodo_intermedio(tipo, generar, desde, hasta):
+    df = con_grupos(tipo, generar(600))
+    investigador = CUBOS[tipo]['investigador']
+    cubo = por_investigador(tipo, construir_cubo(tipo, df), desde, hasta).set_index(investigador).sort_index()
+    tabla = _por_tabla(tipo, df, desde, hasta).set_index(investigador).sort_index()
+    pd.testing.assert_frame_equal(cubo, tabla, check_dtype=False)
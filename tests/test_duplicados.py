@@ -0,0 +1,44 @@
+import pandas as pd
+
+from duplicados import COLUMNA_GRUPO, con_grupos
+
+
+def _grupos(titulos, **columnas):
+    df = pd.DataFrame({'article_title': titulos, **columnas})
+    return con_grupos('articulos', df)[COLUMNA_GRUPO].tolist()
+
+
+def test_ediciones_de_distinto_anio_no_se_unen():
+    grupos = _grupos([
+        'Hypertension in Mexico: 2019 update',
+        'Hypertension in Mexico: 2020 update',
+        'Hypertension in Mexico: 2021 update',
+    ])
+    assert len(set(grupos)) == 3
+
+
+def test_variantes_del_mismo_titulo_se_unen():
+    grupos = _grupos([
+        'Hypertension in Mexico: 2019 update',
+        'HYPERTENSION IN MÉXICO. 2019 Update',
+        'Hypertension in Mexico - 2019 update.',
+        'Prevalence of atrial fibrillation in a Mexican cohort',
+    ])
+    assert grupos[0] == grupos[1] == grupos[2] != grupos[3]
+
+
+def test_truncado_se_une_y_distinto_no():
+    grupos = _grupos([
+        'Left ventricular hypertrophy and arterial stiffness in young adults with type 2 diabetes',
+        'Left ventricular hypertrophy and arterial stiffness in young adults with type 2 diabetes mellitus',
+        'Right ventricular hypertrophy and pulmonary stiffness in older adults with type 1 diabetes',
+    ])
+    assert grupos[0] == grupos[1] != grupos[2]
+
+
+def test_claves_fuertes_unen_aunque_el_titulo_difiera():
+    grupos = _grupos(
+        ['Hypertension in Mexico: 2019 update', 'Actualización 2019 de la hipertensión en México'],
+        doi=['10.1000/xyz', 'https://doi.org/10.1000/XYZ'],
+    )
+    assert grupos[0] == grupos[1]
@@ -0,0 +1,54 @@
+import csv
+
+import pandas as pd
+
+from esquemas import COLUMNA_ID, columnas, encabezado_csv, leer_csv, nombres_completos
+
+
+def _fila(tipo: str, n: int, con_id: bool) -> list:
+    valores = {
+        'economic_number': f"10{n}", 'titulo_tesis': f"Tesis {n}", 'tipo_tesis': 'Doctorado',
+        'year': str(2020 + n), 'estado': 'A', COLUMNA_ID: f"id{n}",
+    }
+    nombres = columnas(tipo) if con_id else columnas(tipo)[:-1]
+    return [valores.get(c, '') for c in nombres]
+
+
+def _escribir(ruta, encabezado: list, filas: list) -> None:
+    with open(ruta, 'w', encoding='utf-8', newline='') as f:
+        escritor = csv.writer(f)
+        escritor.writerow(encabezado)
+        escritor.writerows(filas)
+
+
+def test_encabezado_corto_con_filas_largas(tmp_path):
+    # Total de generador*.sh cuyo primer archivo era anterior a record_id
+    ruta = tmp_path / 'tesis_total.csv'
+    _escribir(ruta, columnas('tesis')[:-1], [_fila('tesis', 1, False), _fila('tesis', 2, True), _fila('tesis', 3, False)])
+    assert nombres_completos('tesis', ruta) == columnas('tesis')
+    df = leer_csv('tesis', ruta)
+    assert df['titulo_tesis'].tolist() == ['Tesis 1', 'Tesis 2', 'Tesis 3']
+    assert df['year'].tolist() == [2021, 2022, 2023]
+    assert df[COLUMNA_ID].isna().tolist() == [True, False, True]
+    assert df.loc[1, COLUMNA_ID] == 'id2'
+
+
+def test_encabezado_largo_con_filas_cortas(tmp_path):
+    ruta = tmp_path / 'tesis_total.csv'
+    _escribir(ruta, columnas('tesis'), [_fila('tesis', 1, True), _fila('tesis', 2, False)])
+    assert nombres_completos('tesis', ruta) is None
+    df = leer_csv('tesis', ruta, analitico=False)
+    assert df['economic_number'].tolist() == ['101', '102']
+    assert df['estado'].tolist() == ['A', 'A']
+    assert df.loc[0, COLUMNA_ID] == 'id1' and pd.isna(df.loc[1, COLUMNA_ID])
+
+
+def test_encabezado_de_otro_esquema_no_se_reemplaza(tmp_path):
+    ruta = tmp_path / 'otro.csv'
+    _escribir(ruta, ['a', 'b'], [['1', '2']])
+    assert nombres_completos('tesis', ruta) is None
+
+
+def test_encabezado_csv_es_el_esquema_completo():
+    assert encabezado_csv('articulos').split(',') == columnas('articulos')
+    assert encabezado_csv('articulos').endswith(COLUMNA_ID)
@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+from banco_metricas import KEYWORD_CATEGORIES, TIPOS, diferencias, metricas_fila_por_fila
+from metricas_vectorizadas import metricas
+from tablas_normalizadas import tablas_laterales
+
+
+@pytest.mark.parametrize('tipo', TIPOS)
+@pytest.mark.parametrize('semilla', [0, 1, 2])
+def test_igual_a_las_funciones_fila_por_fila(tipo, semilla):
+    assert not any(diferencias(tipo, 3000, semilla).values())
+
+
+def test_categoria_con_comas_en_tesis():
+    df = pd.DataFrame({
+        'tipo_tesis': ['Doctorado'],
+        'directores': ['García J'],
+        'coautores': ['López M'],
+        'selected_keywords': ["['Sistemas biológicos: celular, molecular y producción de energía', 'Nefropatías']"],
+    })
+    nueva = metricas('tesis', df)
+    assert nueva['IRT'].iloc[0] == pytest.approx(2 / 3)
+    assert nueva['PI'].iloc[0] == pytest.approx(0.7533, abs=1e-4)
+    assert nueva['IRT'].iloc[0] == metricas_fila_por_fila('tesis', df)['IRT'].iloc[0]
+
+
+def test_tabla_terminos_del_cargador():
+    df = pd.DataFrame({
+        'journal_abbrev': ['Nature', 'JAMA'],
+        'jcr_group': ['Q1 5.2', 'Q2 2.5'],
+        'coauthors': ['A; B', 'C'],
+        'selected_keywords': ["['Arritmia, isquemia, ictus', 'Alzheimer']", 'ictus, otro tema'],
+    })
+    tablas = tablas_laterales('articulos', df)
+    # La tabla resumen cuenta la categoría una vez; el IRT la parte en cada coma
+    assert len(tablas['palabras'].loc[0]) == 2
+    assert len(tablas['terminos'].loc[0]) == 4
+    con_tabla = metricas('articulos', df, categorias=KEYWORD_CATEGORIES, terminos=tablas['terminos'])
+    anterior = metricas_fila_por_fila('articulos', df)
+    assert con_tabla['IRT'].tolist() == anterior['IRT'].tolist()
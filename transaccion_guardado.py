@@ -0,0 +1,518 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+from esquemas import COLUMNA_ID
+from lapidas import (
+    UMBRAL_COMPACTACION, agregar_pendientes, leer_lapidas, posiciones_con_lapida,
+    proporcion_lapidas, retirar_lapidas, sincronizar_lapidas
+)
+
+# ====================
+# TRANSACCIÓN DE GUARDADO
+# ====================
+# Un guardado usa una sola conexión SSH: consulta la versión remota (stat), la
+# descarga solo si cambió desde la última vez, fusiona, escribe el CSV local de
+# forma atómica y lo sube una vez. Las aplicaciones pasan su propia función de
+# conexión (SSHManager.get_connection) y sus columnas.
+#
+# Concurrencia optimista: junto a cada CSV se guarda la versión remota leída
+# (.version.json) y una copia de ese contenido (.base). Si al subir el remoto ya
+# no es esa versión, otra sesión escribió entretanto: se descarga, se fusiona a
+# tres vías por registro (base, local, remoto) y se reintenta, sin candados.
+#
+# Las bajas no reescriben el CSV: se registran como lápidas (lapidas.py) y el
+# guardado compacta el archivo cuando su proporción supera el umbral.
+VERSION_SUFFIX = ".version.json"
+BASE_SUFFIX = ".base"
+MAX_INTENTOS_SUBIDA = 3
+
+def _ruta_version(local_path: str) -> str:
+    return f"{local_path}{VERSION_SUFFIX}"
+
+def _ruta_base(local_path: str) -> str:
+    return f"{local_path}{BASE_SUFFIX}"
+
+def leer_version(local_path: str) -> dict:
+    """Versión remota (tamaño y mtime) de la última descarga o subida de este archivo"""
+    try:
+        with open(_ruta_version(local_path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def escribir_version(local_path: str, atributos) -> None:
+    """Guarda la versión remota a partir de un SFTPAttributes"""
+    version = {'size': atributos.st_size, 'mtime': atributos.st_mtime}
+    try:
+        with open(_ruta_version(local_path), 'w', encoding='utf-8') as f:
+            json.dump(version, f)
+    except OSError as e:
+        logging.warning(f"No se pudo escribir la versión de {local_path}: {str(e)}")
+
+def coincide_version(atributos, version: dict) -> bool:
+    """Compara un SFTPAttributes (o None si el remoto no existe) con una versión guardada"""
+    if atributos is None:
+        return True
+    return version.get('size') == atributos.st_size and version.get('mtime') == atributos.st_mtime
+
+def misma_version(local_path: str, atributos) -> bool:
+    """True si el remoto no cambió desde la última sincronización y la copia local existe"""
+    version = leer_version(local_path)
+    return (
+        Path(local_path).exists()
+        and version.get('size') == atributos.st_size
+        and version.get('mtime') == atributos.st_mtime
+    )
+
+def escribir_atomico(df: pd.DataFrame, local_path: str) -> None:
+    """Escribe en un temporal del mismo directorio y lo reemplaza: nunca queda un CSV a medias"""
+    temporal = f"{local_path}.tmp"
+    df.to_csv(temporal, index=False, encoding='utf-8-sig')
+    os.replace(temporal, local_path)
+
+def leer_csv_texto(local_path: str, columns: list = None) -> pd.DataFrame:
+    """Lee el CSV local como texto (sin convertir años o PMID a flotantes) con todas las columnas"""
+    columns = columns or []
+    if not Path(local_path).exists():
+        return pd.DataFrame(columns=columns)
+    try:
+        df = pd.read_csv(local_path, encoding='utf-8-sig', dtype=str, keep_default_na=False)
+    except (pd.errors.EmptyDataError, pd.errors.ParserError):
+        return pd.DataFrame(columns=columns)
+    for col in columns:
+        if col not in df.columns:
+            df[col] = ""
+    return df
+
+# ====================
+# FUSIÓN A TRES VÍAS
+# ====================
+def huellas_filas(df: pd.DataFrame, columns: list) -> list:
+    """Huella (sha1) del contenido de cada fila, sin 'estado' ni record_id"""
+    columnas_huella = [c for c in columns if c != 'estado' and c != COLUMNA_ID]
+    return [
+        hashlib.sha1('\x1f'.join(str(v).strip() for v in fila).encode('utf-8')).hexdigest()
+        for fila in df[columnas_huella].itertuples(index=False, name=None)
+    ]
+
+def ids_registros(df: pd.DataFrame, columns: list) -> list:
+    """record_id de cada fila; las capturadas antes de existir la columna usan la huella de su contenido"""
+    huellas = huellas_filas(df, columns)
+    if COLUMNA_ID not in df.columns:
+        return huellas
+    return [
+        str(identificador).strip() or huella
+        for identificador, huella in zip(df[COLUMNA_ID].fillna(''), huellas)
+    ]
+
+def con_ids(registros: list) -> list:
+    """Copia de los registros nuevos con record_id asignado (uuid4) a los que no lo traen"""
+    return [{**registro, COLUMNA_ID: registro.get(COLUMNA_ID) or uuid.uuid4().hex} for registro in registros]
+
+def claves_filas(df: pd.DataFrame, columns: list) -> list:
+    """Clave estable por fila: su record_id (o la huella del contenido si no lo tiene).
+    Se agrega el número de aparición para distinguir filas repetidas."""
+    vistas = {}
+    claves = []
+    for base in ids_registros(df, columns):
+        vistas[base] = vistas.get(base, 0) + 1
+        claves.append((base, vistas[base]))
+    return claves
+
+def claves_columnas(df: pd.DataFrame, columns: list) -> list:
+    """claves_filas sobre exactamente 'columns' (las demás columnas del archivo no cuentan)"""
+    return claves_filas(df.reindex(columns=columns, fill_value=''), columns)
+
+def _filas_por_clave(df: pd.DataFrame, columns: list) -> dict:
+    df = df.reindex(columns=columns, fill_value='')
+    filas = [tuple(str(v).strip() for v in fila) for fila in df.itertuples(index=False, name=None)]
+    return dict(zip(claves_filas(df, columns), filas))
+
+def fusion_tres_vias(base: pd.DataFrame, ours: pd.DataFrame, theirs: pd.DataFrame, columns: list = None) -> tuple:
+    """Fusiona por registro los cambios locales (ours) y remotos (theirs) respecto a la base común.
+    Devuelve (DataFrame, conflictos); en un conflicto real prevalece la sesión que está guardando."""
+    if not columns:
+        columns = list(dict.fromkeys(list(theirs.columns) + list(ours.columns)))
+    b = _filas_por_clave(base, columns)
+    o = _filas_por_clave(ours, columns)
+    t = _filas_por_clave(theirs, columns)
+    filas, conflictos = [], 0
+
+    # Primero el orden remoto
+    for clave, fila_t in t.items():
+        if clave in o:
+            fila_o = o[clave]
+            if fila_o == fila_t or b.get(clave) == fila_o:
+                filas.append(fila_t)
+            elif b.get(clave) == fila_t:
+                filas.append(fila_o)
+            else:
+                conflictos += 1
+                filas.append(fila_o)
+        elif clave in b:
+            # La borramos localmente; se conserva solo si el remoto la modificó
+            if fila_t != b[clave]:
+                conflictos += 1
+                filas.append(fila_t)
+        else:
+            filas.append(fila_t)
+
+    # Después las filas locales que el remoto no tiene
+    for clave, fila_o in o.items():
+        if clave in t:
+            continue
+        if clave in b:
+            # Borrada en el remoto; se conserva solo si la modificamos localmente
+            if fila_o != b[clave]:
+                conflictos += 1
+                filas.append(fila_o)
+        else:
+            filas.append(fila_o)
+
+    if conflictos:
+        logging.warning(f"Fusión a tres vías con {conflictos} conflicto(s); se conservaron los cambios locales")
+    return pd.DataFrame(filas, columns=columns), conflictos
+
+def _copiar_atomico(origen: str, destino: str) -> None:
+    temporal = f"{destino}.tmp"
+    shutil.copyfile(origen, temporal)
+    os.replace(temporal, destino)
+
+def _cambios_locales(local_path: str) -> bool:
+    """True si la copia local difiere del último contenido remoto conocido (.base)"""
+    base_path = _ruta_base(local_path)
+    if not (Path(local_path).exists() and Path(base_path).exists()):
+        return False
+    with open(local_path, 'rb') as a, open(base_path, 'rb') as b:
+        return a.read() != b.read()
+
+def leer_base(local_path: str, columns: list = None) -> pd.DataFrame:
+    """Último contenido remoto conocido (.base) como texto; vacío si no hay base"""
+    return leer_csv_texto(_ruta_base(local_path), columns)
+
+def descartar_cambios_locales(local_path: str) -> None:
+    """Vuelve la copia local al último contenido remoto conocido (.base); sin base, la borra para forzar la descarga"""
+    base_path = _ruta_base(local_path)
+    if Path(base_path).exists():
+        _copiar_atomico(base_path, local_path)
+        return
+    for ruta in (local_path, _ruta_version(local_path)):
+        if Path(ruta).exists():
+            os.remove(ruta)
+
+def fusionar(df_existing: pd.DataFrame, registros: list, columns: list) -> pd.DataFrame:
+    """Quita los registros con estado 'X', agrega los nuevos (sin saltos de línea) y ordena columnas.
+    Con record_id en las columnas, los nuevos reciben uno y los anteriores que no lo tienen, el de su huella."""
+    if 'estado' in df_existing.columns:
+        df_existing = df_existing[df_existing['estado'] != 'X']
+    if COLUMNA_ID in columns:
+        df_existing = df_existing.copy()
+        df_existing[COLUMNA_ID] = ids_registros(df_existing.reindex(columns=columns, fill_value=''), columns)
+        registros = con_ids(registros)
+    df_new = pd.DataFrame(registros)
+    for col in df_new.columns:
+        if df_new[col].dtype == object:
+            df_new[col] = df_new[col].astype(str).str.replace(r'\r\n|\n|\r', ' ', regex=True).str.strip()
+    df_combined = pd.concat([df_existing, df_new], ignore_index=True) if not df_new.empty else df_existing.copy()
+    for col in columns:
+        if col not in df_combined.columns:
+            df_combined[col] = ""
+    return df_combined[columns]
+
+def traer_si_cambio(sftp, remote_path: str, local_path: str, columns: list = None) -> str:
+    """Descarga el remoto solo si cambió; devuelve 'descargado', 'sin_cambios' o 'sin_remoto'"""
+    try:
+        atributos = sftp.stat(remote_path)
+    except FileNotFoundError:
+        if columns is not None and not Path(local_path).exists():
+            pd.DataFrame(columns=columns).to_csv(local_path, index=False, encoding='utf-8-sig')
+        return 'sin_remoto'
+    if misma_version(local_path, atributos):
+        return 'sin_cambios'
+    temporal = f"{local_path}.descarga"
+    sftp.get(remote_path, temporal)
+    if os.path.getsize(temporal) != atributos.st_size:
+        os.remove(temporal)
+        raise IOError(f"Descarga incompleta de {remote_path}")
+
+    if _cambios_locales(local_path):
+        # Hay cambios locales sin subir: no se sobrescriben, se fusionan
+        df, _ = fusion_tres_vias(
+            leer_csv_texto(_ruta_base(local_path)),
+            leer_csv_texto(local_path),
+            leer_csv_texto(temporal),
+            columns
+        )
+        escribir_atomico(df, local_path)
+        os.replace(temporal, _ruta_base(local_path))
+        escribir_version(local_path, atributos)
+        return 'fusionado'
+
+    _copiar_atomico(temporal, local_path)
+    os.replace(temporal, _ruta_base(local_path))
+    escribir_version(local_path, atributos)
+    return 'descargado'
+
+def _stat_remoto(sftp, remote_path: str):
+    try:
+        return sftp.stat(remote_path)
+    except FileNotFoundError:
+        return None
+
+def _renombrar_remoto(sftp, origen: str, destino: str) -> None:
+    try:
+        sftp.posix_rename(origen, destino)
+    except IOError:
+        # Servidores sin la extensión posix-rename
+        try:
+            sftp.remove(destino)
+        except FileNotFoundError:
+            pass
+        sftp.rename(origen, destino)
+
+def subir_atomico(sftp, local_path: str, remote_path: str, version_esperada: dict = None) -> bool:
+    """Sube a un temporal remoto y lo renombra, para que nadie lea un archivo a medio escribir.
+    Con version_esperada, no renombra (y devuelve False) si el remoto cambió durante la subida."""
+    temporal = f"{remote_path}.tmp"
+    sftp.put(local_path, temporal, confirm=True)
+    if version_esperada is not None and not coincide_version(_stat_remoto(sftp, remote_path), version_esperada):
+        sftp.remove(temporal)
+        return False
+    _renombrar_remoto(sftp, temporal, remote_path)
+    escribir_version(local_path, sftp.stat(remote_path))
+    _copiar_atomico(local_path, _ruta_base(local_path))
+    return True
+
+def subir_con_version(sftp, local_path: str, remote_path: str, columns: list = None,
+                      intentos: int = MAX_INTENTOS_SUBIDA) -> int:
+    """Sube solo si el remoto sigue en la versión leída; si otra sesión escribió, fusiona y reintenta.
+    Devuelve el número de fusiones realizadas."""
+    fusiones = 0
+    for intento in range(intentos):
+        if not coincide_version(_stat_remoto(sftp, remote_path), leer_version(local_path)):
+            logging.info(f"Versión remota cambió antes de subir {remote_path} (intento {intento + 1}); fusionando")
+            if traer_si_cambio(sftp, remote_path, local_path, columns) == 'fusionado':
+                fusiones += 1
+            continue
+        if subir_atomico(sftp, local_path, remote_path, leer_version(local_path)):
+            return fusiones
+    raise IOError(f"El archivo remoto cambió en cada uno de {intentos} intentos: {remote_path}")
+
+# ====================
+# ARCHIVOS LATERALES
+# ====================
+# Archivos pequeños junto al CSV (extras del nbib, índice de alias) que varias
+# sesiones actualizan: se leen con un get directo (si no existen, contenido
+# vacío) y se publican leyendo, aplicando la actualización y renombrando solo si
+# nadie cambió el archivo entretanto; si cambió, la actualización se vuelve a
+# aplicar sobre el contenido nuevo.
+def _misma_version_remota(a, b) -> bool:
+    if a is None or b is None:
+        return a is None and b is None
+    return a.st_size == b.st_size and a.st_mtime == b.st_mtime
+
+def leer_remoto(sftp, remote_path: str) -> tuple:
+    """(contenido, atributos) del archivo remoto; (b'', None) si no existe"""
+    atributos = _stat_remoto(sftp, remote_path)
+    if atributos is None:
+        return b'', None
+    try:
+        with sftp.open(remote_path, 'rb') as f:
+            return f.read(), atributos
+    except FileNotFoundError:
+        return b'', None
+
+def actualizar_remoto(sftp, remote_path: str, actualizar, intentos: int = MAX_INTENTOS_SUBIDA) -> bytes:
+    """Publica actualizar(contenido vigente) con control de versión; devuelve el contenido publicado"""
+    for intento in range(intentos):
+        contenido, atributos = leer_remoto(sftp, remote_path)
+        nuevo = actualizar(contenido)
+        if nuevo == contenido:
+            return contenido
+        # Temporal propio de esta sesión: dos sesiones no escriben el mismo
+        temporal = f"{remote_path}.{uuid.uuid4().hex[:8]}.tmp"
+        with sftp.open(temporal, 'wb') as f:
+            f.write(nuevo)
+        if not _misma_version_remota(_stat_remoto(sftp, remote_path), atributos):
+            sftp.remove(temporal)
+            logging.info(f"{remote_path} cambió durante la actualización (intento {intento + 1}); se reaplica")
+            continue
+        _renombrar_remoto(sftp, temporal, remote_path)
+        return nuevo
+    raise IOError(f"El archivo remoto cambió en cada uno de {intentos} intentos: {remote_path}")
+
+def leer_lateral(conectar, remote_path: str):
+    """Contenido de un archivo lateral con una conexión; b'' si no existe, None si no hubo conexión"""
+    ssh = conectar()
+    if not ssh:
+        return None
+    try:
+        with ssh.open_sftp() as sftp:
+            return leer_remoto(sftp, remote_path)[0]
+    except Exception as e:
+        logging.error(f"Error al leer {remote_path}: {str(e)}")
+        return None
+    finally:
+        ssh.close()
+
+def sincronizar(conectar, remote_path: str, local_path: str, columns: list = None) -> bool:
+    """Actualiza la copia local con una conexión; False si no hubo conexión, falló la descarga o no hay copia"""
+    ssh = conectar()
+    if not ssh:
+        return False
+    try:
+        with ssh.open_sftp() as sftp:
+            estado = traer_si_cambio(sftp, remote_path, local_path, columns)
+            sincronizar_lapidas(sftp, remote_path, local_path)
+        logging.info(f"Sincronización {remote_path}: {estado}")
+        return estado != 'sin_remoto' or Path(local_path).exists()
+    except Exception as e:
+        logging.error(f"Error de sincronización {remote_path}: {str(e)}")
+        return False
+    finally:
+        ssh.close()
+
+def guardar_registros(conectar, local_path: str, remote_path: str, columns: list, registros: list,
+                      umbral: float = UMBRAL_COMPACTACION, laterales: dict = None) -> dict:
+    """Trae (si cambió), fusiona, escribe y sube en una sola conexión; reporta tiempos por fase.
+    Si las lápidas superan el umbral, el archivo se escribe ya sin esas filas (compactación).
+    laterales: {ruta remota: actualizar(contenido) -> contenido}, publicados en la misma conexión
+    después del CSV; resultado['laterales'] trae el contenido publicado de cada uno."""
+    resultado = {
+        'escrito': False, 'subido': False, 'descarga': None, 'fusiones': 0, 'filas': 0,
+        'compactadas': 0, 'laterales': {}, 'tiempos': {}, 'error': ''
+    }
+    tiempos = resultado['tiempos']
+    inicio = marca = time.perf_counter()
+
+    def fase(nombre):
+        nonlocal marca
+        ahora = time.perf_counter()
+        tiempos[nombre] = round(ahora - marca, 4)
+        marca = ahora
+
+    ssh = conectar()
+    fase('conexion')
+    sftp = None
+    try:
+        if ssh:
+            try:
+                sftp = ssh.open_sftp()
+                resultado['descarga'] = traer_si_cambio(sftp, remote_path, local_path, columns)
+                sincronizar_lapidas(sftp, remote_path, local_path)
+            except Exception as e:
+                resultado['error'] = f"descarga: {str(e)}"
+                logging.error(f"Error al traer {remote_path}: {str(e)}")
+        fase('descarga')
+
+        df = fusionar(leer_csv_texto(local_path, columns), registros, columns)
+        lapidas = leer_lapidas(local_path)
+        claves = claves_columnas(df, columns)
+        aplicadas = set()
+        if proporcion_lapidas(claves, lapidas) > umbral:
+            bajas = posiciones_con_lapida(claves, lapidas)
+            df = df.drop(index=list(bajas)).reset_index(drop=True)
+            resultado['compactadas'] = len(bajas)
+            aplicadas = lapidas
+        resultado['filas'] = len(df)
+        fase('fusion')
+
+        escribir_atomico(df, local_path)
+        resultado['escrito'] = True
+        fase('escritura')
+
+        # Sin conexión o con descarga fallida no se sube: se sobrescribirían cambios remotos
+        if sftp and not resultado['error']:
+            try:
+                resultado['fusiones'] = subir_con_version(sftp, local_path, remote_path, columns)
+                resultado['subido'] = True
+                if aplicadas:
+                    # Las filas ya no están en el archivo: sus lápidas sobran
+                    retirar_lapidas(sftp, remote_path, local_path, aplicadas)
+            except Exception as e:
+                resultado['error'] = f"subida: {str(e)}"
+                logging.error(f"Error al subir {remote_path}: {str(e)}")
+        fase('subida')
+
+        if resultado['subido']:
+            for ruta, actualizar in (laterales or {}).items():
+                # Un lateral que falla no invalida el guardado del registro
+                try:
+                    resultado['laterales'][ruta] = actualizar_remoto(sftp, ruta, actualizar)
+                except Exception as e:
+                    logging.error(f"Error al publicar {ruta}: {str(e)}")
+        fase('laterales')
+    except Exception as e:
+        resultado['error'] = str(e)
+        logging.error(f"Error en transacción de guardado {local_path}: {str(e)}")
+    finally:
+        if sftp:
+            sftp.close()
+        if ssh:
+            ssh.close()
+
+    tiempos['total'] = round(time.perf_counter() - inicio, 4)
+    logging.info(
+        f"Guardado {local_path}: descarga={resultado['descarga']} fusiones={resultado['fusiones']} "
+        f"filas={resultado['filas']} compactadas={resultado['compactadas']} tiempos={tiempos}"
+    )
+    return resultado
+
+def dar_de_baja(conectar, local_path: str, remote_path: str, posiciones, columns: list = None) -> dict:
+    """Registra lápidas para las filas indicadas (posición en el CSV local) y las publica; el CSV no se
+    reescribe ni se sube. Antes de publicar se trae el remoto y solo se dan de baja los registros que siguen
+    en él. Sin conexión quedan pendientes (ya rigen en la copia local) y se publican en la siguiente sincronización."""
+    df = leer_csv_texto(local_path, columns)
+    columns = columns or list(df.columns)
+    claves = claves_columnas(df, columns)
+    nuevas = {claves[p] for p in posiciones if 0 <= p < len(claves)}
+    resultado = {'lapidas': len(nuevas), 'faltantes': 0, 'subido': False, 'proporcion': 0.0, 'error': ''}
+
+    ssh = conectar()
+    sftp = None
+    try:
+        if ssh:
+            sftp = ssh.open_sftp()
+            traer_si_cambio(sftp, remote_path, local_path, columns)
+            claves = claves_columnas(leer_csv_texto(local_path, columns), columns)
+            # Otra sesión pudo borrar el registro entretanto: su lápida no se publica
+            resultado['faltantes'] = len(nuevas - set(claves))
+            nuevas &= set(claves)
+            resultado['lapidas'] = len(nuevas)
+        else:
+            resultado['error'] = "sin conexión"
+        if nuevas:
+            agregar_pendientes(local_path, nuevas)
+        resultado['proporcion'] = proporcion_lapidas(claves, leer_lapidas(local_path))
+        if sftp:
+            resultado['subido'] = sincronizar_lapidas(sftp, remote_path, local_path)
+    except Exception as e:
+        resultado['error'] = str(e)
+        logging.error(f"Error al publicar las lápidas de {remote_path}: {str(e)}")
+        if nuevas:
+            # La baja rige en la copia local y se vuelve a intentar en la siguiente sincronización
+            agregar_pendientes(local_path, nuevas)
+    finally:
+        if sftp:
+            sftp.close()
+        if ssh:
+            ssh.close()
+    logging.info(f"Baja en {local_path}: {len(nuevas)} lápida(s), proporción {resultado['proporcion']:.2f}")
+    return resultado
+
+def quitar_bajas(df: pd.DataFrame, local_path: str, columns: list) -> pd.DataFrame:
+    """Filas de df (leído del CSV local, en su orden) sin las que tienen lápida.
+    Conserva el índice, que sigue siendo la posición en el CSV para dar_de_baja."""
+    lapidas = leer_lapidas(local_path)
+    if not lapidas or df.empty:
+        return df
+    claves = claves_columnas(leer_csv_texto(local_path, columns), columns)
+    return df[~df.index.isin(posiciones_con_lapida(claves, lapidas))]